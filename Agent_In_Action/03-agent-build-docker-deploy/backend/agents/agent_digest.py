@@ -0,0 +1,103 @@
+"""
+智能体输出摘要（digest）
+
+协调员原先在每次决策的系统提示词中嵌入 `json.dumps(agent_outputs, indent=2)`：
+每个专业智能体的完整回复都会在之后每一次协调员调用中重复发送（中文还会被转义成 \\uXXXX，体积再翻几倍），
+提示词随规划进度不断变长，整个规划的 token 消耗接近平方增长。
+
+这里在专业智能体完成时为它生成一份简短摘要，保存在状态的 agent_digests 中，协调员只看摘要：
+- status: 完成状态（completed / timeout）
+- summary: 回复的第一句有效内容（截断到 AGENT_DIGEST_SUMMARY_CHARS 个字符）
+- key_facts: 若干条列表项形式的要点（最多 AGENT_DIGEST_MAX_FACTS 条）
+
+format_digests 把摘要渲染为提示词文本，超出 token 预算时依次减少要点、缩短摘要，
+保证协调员提示词的大小基本不随已完成智能体的数量增长。
+
+适用于大模型技术初级用户：
+多智能体系统中，"把所有历史原样塞进提示词"最简单，但成本和延迟会随对话变长而快速上升；
+给负责调度的智能体只提供它做决策所需的摘要，是控制上下文长度的常用方法。
+"""
+
+import math
+import re
+from typing import Any, Dict, List, Optional
+
+# 列表项开头：-、*、•、1.、1)、一、 等
+_LIST_ITEM = re.compile(r"^(?:[-*•·]|\d+[.)、]|[一二三四五六七八九十]+[、.])\s*")
+# Markdown 标题与强调符号
+_MARKDOWN = re.compile(r"^#+\s*|\*\*|__")
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的 token 数：中日韩字符约 1 个 token，其余字符约 4 个字符 1 个 token
+
+    只用于比较提示词大小与预算控制，不需要与模型的分词器完全一致，也不需要下载分词词表。
+    """
+    wide = sum(1 for char in text if char >= "⺀")
+    return wide + math.ceil((len(text) - wide) / 4)
+
+
+def truncate_text(text: str, max_chars: int) -> str:
+    """截断到 max_chars 个字符，被截断时以省略号结尾"""
+    return text if len(text) <= max_chars else text[:max(0, max_chars - 1)] + "…"
+
+
+def build_digest(response: str, status: str = "completed", summary_chars: int = 120,
+                 max_facts: int = 3, fact_chars: int = 60) -> Dict[str, Any]:
+    """从智能体的完整回复中提取摘要"""
+    lines = [_MARKDOWN.sub("", line).strip() for line in response.splitlines()]
+    lines = [line for line in lines if line]
+
+    summary = ""
+    key_facts: List[str] = []
+    for line in lines:
+        is_item = bool(_LIST_ITEM.match(line))
+        content = _LIST_ITEM.sub("", line).strip()
+        if not content:
+            continue
+        if not summary and not is_item:
+            summary = truncate_text(content, summary_chars)
+        elif is_item and len(key_facts) < max_facts:
+            key_facts.append(truncate_text(content, fact_chars))
+    if not summary and lines:
+        summary = truncate_text(_LIST_ITEM.sub("", lines[0]).strip(), summary_chars)
+
+    return {"status": status, "summary": summary, "key_facts": key_facts}
+
+
+def _render(digests: Dict[str, Dict[str, Any]], summary_chars: Optional[int], max_facts: int) -> str:
+    lines = []
+    for agent_name, digest in digests.items():
+        line = f"- {agent_name} [{digest.get('status', '')}]"
+        if summary_chars is None or summary_chars > 0:
+            summary = digest.get("summary", "")
+            if summary_chars is not None:
+                summary = truncate_text(summary, summary_chars)
+            if summary:
+                line += f": {summary}"
+        facts = digest.get("key_facts", [])[:max_facts]
+        if facts:
+            line += f"（要点: {'; '.join(facts)}）"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def format_digests(digests: Optional[Dict[str, Dict[str, Any]]], token_budget: int) -> str:
+    """
+    把各智能体的摘要渲染为提示词文本，尽量不超过 token_budget
+
+    超出预算时按以下顺序压缩，直到满足预算：减少要点条数 → 缩短摘要 → 只保留状态。
+    """
+    if not digests:
+        return "（暂无智能体输出）"
+    max_facts = max((len(digest.get("key_facts", [])) for digest in digests.values()), default=0)
+    for facts in range(max_facts, -1, -1):
+        text = _render(digests, None, facts)
+        if estimate_tokens(text) <= token_budget:
+            return text
+    for summary_chars in (60, 30, 0):
+        text = _render(digests, summary_chars, 0)
+        if estimate_tokens(text) <= token_budget:
+            return text
+    return text
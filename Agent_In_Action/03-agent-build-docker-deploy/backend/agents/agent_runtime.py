@@ -0,0 +1,107 @@
+"""
+共享的智能体运行时
+
+原先每个规划任务都会新建一个 `LangGraphTravelAgents`（重新创建 ChatOpenAI 客户端、重新编译两张 StateGraph），
+`/simple-plan` 每次新建 `SimpleTravelAgent`，`/chat` 每次新建一个解析意图用的 ChatOpenAI。
+这些对象本身不保存任何任务状态——每次规划的全部状态都通过图的输入（TravelPlanState）传递，
+因此一个进程只需要创建一次，所有任务共享：
+
+- 编译好的工作流图可以被多个协程/线程同时执行，每次 invoke / astream 使用各自独立的状态
+- ChatOpenAI 内部的 HTTP 客户端带连接池，共享同一个实例可以复用已建立的 HTTPS 连接，
+  不必每个任务重新握手
+
+服务启动时在后台线程中调用 `warm_up()` 提前完成导入与图编译，第一个规划任务也不用等待初始化。
+
+适用于大模型技术初级用户：
+"无状态对象只创建一次、请求数据通过参数传递"是 Web 服务中最常见的性能优化之一，
+数据库连接池、HTTP 客户端都是同样的思路。
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional
+
+runtime_logger = logging.getLogger('api_server')
+
+
+class AgentRuntime:
+    """
+    进程内共享的智能体实例（线程安全的惰性创建）
+
+    - langgraph_agents(): 共享的 LangGraphTravelAgents（ChatOpenAI 客户端 + 编译好的同步/异步图）
+    - simple_agent(): 共享的 SimpleTravelAgent
+    - intent_llm(): /chat 解析用户意图使用的 ChatOpenAI
+    - warm_up(): 提前创建以上实例，失败时只记录日志，之后第一次使用时再重试
+
+    智能体模块依赖 LangChain / LangGraph，导入较慢，因此都在方法内导入，
+    导入本模块本身不会拖慢 api_server 的启动。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._langgraph_agents = None
+        self._simple_agent = None
+        self._intent_llm = None
+        self.warm_up_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        """多智能体实例是否已创建（已创建时获取实例不会阻塞）"""
+        return self._langgraph_agents is not None
+
+    def langgraph_agents(self):
+        if self._langgraph_agents is None:
+            with self._lock:
+                if self._langgraph_agents is None:
+                    from agents.langgraph_agents import LangGraphTravelAgents
+                    self._langgraph_agents = LangGraphTravelAgents()
+        return self._langgraph_agents
+
+    def simple_agent(self):
+        if self._simple_agent is None:
+            with self._lock:
+                if self._simple_agent is None:
+                    from agents.simple_travel_agent import SimpleTravelAgent
+                    self._simple_agent = SimpleTravelAgent()
+        return self._simple_agent
+
+    def intent_llm(self):
+        if self._intent_llm is None:
+            with self._lock:
+                if self._intent_llm is None:
+                    from langchain_openai import ChatOpenAI
+                    from config.langgraph_config import langgraph_config as config
+                    self._intent_llm = ChatOpenAI(
+                        model=config.OPENAI_MODEL,
+                        api_key=config.OPENAI_API_KEY,
+                        base_url=config.OPENAI_BASE_URL,
+                        temperature=0.3
+                    )
+        return self._intent_llm
+
+    def warm_up(self, include_agents: bool = True):
+        """
+        预先创建共享实例（同步函数，需在线程池中执行）
+
+        include_agents=False 时只创建 /chat 使用的模型客户端（worker 模式下的 API 进程不执行规划）。
+        """
+        started = time.perf_counter()
+        try:
+            self.intent_llm()
+            if include_agents:
+                self.langgraph_agents()
+                self.simple_agent()
+        except Exception as e:
+            runtime_logger.warning(f"智能体预热失败，将在第一次使用时重试: {e}")
+            return
+        self.warm_up_seconds = time.perf_counter() - started
+        runtime_logger.info(f"智能体运行时预热完成，耗时 {self.warm_up_seconds:.2f} 秒")
+
+    def stats(self) -> Dict[str, Any]:
+        """运行时状态，用于健康检查"""
+        return {
+            "langgraph_ready": self._langgraph_agents is not None,
+            "simple_ready": self._simple_agent is not None,
+            "warm_up_seconds": round(self.warm_up_seconds, 2) if self.warm_up_seconds is not None else None
+        }
@@ -8,7 +8,22 @@ LangGraph旅行规划智能体系统
 主要组件：
 1. TravelPlanState - 定义智能体间共享的状态结构
 2. LangGraphTravelAgents - 主要的多智能体系统类
-3. 各种专业智能体方法 - 每个智能体负责特定的规划任务
+3. 各种专业智能体方法 - 每个智能体负责特定的规划任务（同时提供同步与 async 版本）
+
+工作流有两种执行模式（配置 AGENT_EXECUTION_MODE）：
+- sequential（默认）：由协调员逐个调度专业智能体，协调员根据各智能体输出的摘要决定下一步
+- parallel（需显式开启）：四个互不依赖的专业智能体同时执行，再由行程规划师汇总；
+  不经过协调员，耗时更短，但协调员无法根据中间结果调整流程
+
+每次规划都带有一个截止时间（utils/deadline.py 的 Deadline，保存在状态的 deadline 字段中）：
+模型与工具调用的超时不超过剩余时间，剩余时间不多时协调员跳过可选的专业智能体，
+规划会在截止时间前结束并返回已完成部分，而不是被外层超时直接取消。
+
+入口方法：
+- run_travel_planning: 同步执行（graph.invoke），适合脚本或线程池中调用
+- arun_travel_planning: 异步执行（graph.astream_events + llm.ainvoke），适合在 FastAPI 等事件循环中直接 await，
+  可传入 on_progress 回调，在每个节点开始/结束时获得真实的规划进度；
+  传入 on_token 回调时还能逐个收到各智能体回复的 token，用于流式推送给前端
 
 适用于大模型技术初级用户：
 - LangGraph是一个用于构建多智能体系统的框架
@@ -17,12 +32,15 @@ LangGraph旅行规划智能体系统
 - 智能体通过共享状态进行通信和协作
 """
 
-from typing import Dict, Any, List, Optional, TypedDict, Annotated
+from typing import Dict, Any, List, Optional, TypedDict, Annotated, Callable
+import asyncio
 import logging
+import operator
 from pathlib import Path
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from langchain_openai import ChatOpenAI
-from langgraph.graph import StateGraph, END
+from openai import APITimeoutError
+from langgraph.graph import StateGraph, START, END
 from langgraph.graph.message import add_messages
 import json
 from datetime import datetime
@@ -33,6 +51,8 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from config.langgraph_config import langgraph_config as config
+from agents.agent_digest import build_digest, estimate_tokens, format_digests, truncate_text
+from utils.deadline import Deadline, use_deadline
 
 # --------------------------- 日志配置 ---------------------------
 def setup_agents_logger():
@@ -51,7 +71,48 @@ def setup_agents_logger():
 
 agents_logger = setup_agents_logger()
 
-# 定义多智能体系统的状态结构
+# 协调员依次调度的专业智能体；全部完成即规划结束，因此也用来计算规划进度
+SPECIALIST_AGENTS = ["travel_advisor", "weather_analyst", "budget_optimizer", "local_expert", "itinerary_planner"]
+
+# 模型调用超时时可能抛出的异常：asyncio.wait_for 超时，或同步调用时 OpenAI 客户端的请求超时
+LLM_TIMEOUT_ERRORS = (TimeoutError, APITimeoutError)
+
+# 剩余时间不足时仍要完成的专业智能体（其余为可选，时间不够时跳过）
+REQUIRED_AGENTS = ["travel_advisor", "itinerary_planner"]
+
+# 并行模式下同时执行的专业智能体（彼此不依赖），全部完成后再由行程规划师汇总
+PARALLEL_AGENTS = ["travel_advisor", "weather_analyst", "budget_optimizer", "local_expert"]
+
+EXECUTION_MODES = ("parallel", "sequential")
+COORDINATOR_POLICIES = ("rules", "llm")
+
+# rules 策略下所有专业智能体都已完成时的决策：由协调员模型综合一次最终建议后结束
+FINAL_SYNTHESIS = "final_synthesis"
+
+# 工具节点写入消息历史的结果消息使用的 name，用来区分搜索结果与智能体的回复
+TOOL_MESSAGE_NAME = "tools"
+
+# 工作流节点的中文显示名称，用于向前端展示当前执行的智能体
+AGENT_DISPLAY_NAMES = {
+    "coordinator": "协调员",
+    "travel_advisor": "旅行顾问",
+    "weather_analyst": "天气分析师",
+    "budget_optimizer": "预算优化师",
+    "local_expert": "当地专家",
+    "itinerary_planner": "行程规划师",
+    "tools": "工具执行器"
+}
+
+def merge_agent_outputs(left: Dict[str, Any], right: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    agent_outputs 的合并函数（reducer）：按智能体名称合并，而不是整体覆盖
+
+    并行模式下多个专业智能体在同一步中各自只返回自己的那一项输出，LangGraph 用这个函数把它们合并到一起；
+    顺序模式的节点返回完整的字典，合并结果与直接覆盖相同。
+    """
+    return {**(left or {}), **(right or {})}
+
+# 定义多智能体系统的状态结构（带 Annotated 合并函数的字段由 LangGraph 把节点返回的增量合并进状态）
 class TravelPlanState(TypedDict):
     """
     旅行规划状态类
@@ -68,9 +129,18 @@ class TravelPlanState(TypedDict):
     - group_size: 团队人数
     - travel_dates: 旅行日期
     - current_agent: 当前活跃的智能体
-    - agent_outputs: 各智能体的输出结果
+    - agent_outputs: 各智能体的输出结果（通过 merge_agent_outputs 合并）
+    - agent_digests: 各智能体输出的简短摘要，协调员的提示词只使用摘要
     - final_plan: 最终的旅行计划
     - iteration_count: 迭代次数
+
+    节点只返回发生变化的字段（见 StateUpdate）：messages 由 add_messages 追加，
+    agent_outputs / agent_digests 由 merge_agent_outputs 按智能体合并，coordinator_prompt_tokens 由列表相加合并，
+    其余字段直接覆盖。节点不需要复制整个状态，并行分支同时写这些字段也是安全的。
+    - deadline: 本次规划的截止时间，节点据此计算模型/工具调用的超时
+    - next_agent: 协调员按规则确定的下一步（未调用模型时设置，为空表示按协调员回复路由）
+    - coordinator_prompt_tokens: 每次调用协调员模型时提示词的估算 token 数，用于观察上下文大小
+    - final_synthesis: 协调员在所有专业智能体完成后综合的最终建议，作为最终计划的摘要
     """
     messages: Annotated[List[HumanMessage | AIMessage | SystemMessage], add_messages]
     destination: str
@@ -80,9 +150,17 @@ class TravelPlanState(TypedDict):
     group_size: int
     travel_dates: str
     current_agent: str
-    agent_outputs: Dict[str, Any]
+    agent_outputs: Annotated[Dict[str, Any], merge_agent_outputs]
+    agent_digests: Annotated[Dict[str, Any], merge_agent_outputs]
     final_plan: Dict[str, Any]
     iteration_count: int
+    deadline: Optional[Deadline]
+    next_agent: str
+    coordinator_prompt_tokens: Annotated[List[int], operator.add]
+    final_synthesis: str
+
+# 节点的返回值：只包含需要更新的字段
+StateUpdate = Dict[str, Any]
 
 class LangGraphTravelAgents:
     """
@@ -99,20 +177,33 @@ class LangGraphTravelAgents:
     多智能体系统，每个智能体都有专门的职责。
     """
 
-    def __init__(self):
+    def __init__(self, execution_mode: Optional[str] = None, coordinator_policy: Optional[str] = None):
         """
         初始化LangGraph旅行智能体系统
 
         配置 OpenAI 兼容大语言模型并创建智能体工作流图
+
+        参数：
+        - execution_mode: "parallel" 或 "sequential"，默认使用配置 AGENT_EXECUTION_MODE
+        - coordinator_policy: "rules" 或 "llm"（仅 sequential 模式），默认使用配置 COORDINATOR_POLICY
         """
+        self.execution_mode = execution_mode or config.AGENT_EXECUTION_MODE
+        if self.execution_mode not in EXECUTION_MODES:
+            raise ValueError(f"AGENT_EXECUTION_MODE 只能是 {' / '.join(EXECUTION_MODES)}，当前为: {self.execution_mode}")
+        self.coordinator_policy = coordinator_policy or config.COORDINATOR_POLICY
+        if self.coordinator_policy not in COORDINATOR_POLICIES:
+            raise ValueError(f"COORDINATOR_POLICY 只能是 {' / '.join(COORDINATOR_POLICIES)}，当前为: {self.coordinator_policy}")
+
         # 初始化 OpenAI 兼容大语言模型
         llm_config = config.get_llm_config()
         self.llm = ChatOpenAI(**llm_config)
 
-        # 初始化智能体工作流图
+        # 初始化智能体工作流图：同步图供 run_travel_planning 使用，
+        # 异步图（节点均为协程）供 arun_travel_planning 使用，多个规划可共享同一个事件循环
         self.graph = self._create_agent_graph()
+        self.async_graph = self._create_agent_graph(use_async=True)
 
-    def _create_agent_graph(self) -> StateGraph:
+    def _create_agent_graph(self, use_async: bool = False) -> StateGraph:
         """
         创建LangGraph多智能体工作流图
 
@@ -126,20 +217,26 @@ class LangGraphTravelAgents:
         2. 智能体间的连接关系
         3. 工作流的执行顺序
 
+        参数：
+        - use_async: 为 True 时使用各节点的异步版本（llm.ainvoke / tool.ainvoke），图需通过 ainvoke 执行
+
         返回：配置好的StateGraph工作流对象
         """
+        if self.execution_mode == "parallel":
+            return self._create_parallel_graph(use_async)
 
         # 定义工作流图
         workflow = StateGraph(TravelPlanState)
 
-        # 添加智能体节点
-        workflow.add_node("travel_advisor", self._travel_advisor_agent)    # 旅行顾问
-        workflow.add_node("weather_analyst", self._weather_analyst_agent)  # 天气分析师
-        workflow.add_node("budget_optimizer", self._budget_optimizer_agent) # 预算优化师
-        workflow.add_node("local_expert", self._local_expert_agent)        # 当地专家
-        workflow.add_node("itinerary_planner", self._itinerary_planner_agent) # 行程规划师
-        workflow.add_node("coordinator", self._coordinator_agent)             # 协调员
-        workflow.add_node("tools", self._tool_executor_node)                  # 工具执行器
+        # 添加智能体节点（同步/异步版本的提示词、路由与状态处理完全一致，只是模型调用方式不同）
+        prefix = "_a" if use_async else "_"
+        workflow.add_node("travel_advisor", getattr(self, f"{prefix}travel_advisor_agent"))       # 旅行顾问
+        workflow.add_node("weather_analyst", getattr(self, f"{prefix}weather_analyst_agent"))     # 天气分析师
+        workflow.add_node("budget_optimizer", getattr(self, f"{prefix}budget_optimizer_agent"))   # 预算优化师
+        workflow.add_node("local_expert", getattr(self, f"{prefix}local_expert_agent"))           # 当地专家
+        workflow.add_node("itinerary_planner", getattr(self, f"{prefix}itinerary_planner_agent")) # 行程规划师
+        workflow.add_node("coordinator", getattr(self, f"{prefix}coordinator_agent"))             # 协调员
+        workflow.add_node("tools", getattr(self, f"{prefix}tool_executor_node"))                  # 工具执行器
 
         # 定义工作流边缘（智能体间的连接）
         workflow.set_entry_point("coordinator")  # 设置协调员为入口点
@@ -177,23 +274,115 @@ class LangGraphTravelAgents:
         # 编译并返回工作流
         return workflow.compile()
 
-    def _coordinator_agent(self, state: TravelPlanState) -> TravelPlanState:
+    def _create_parallel_graph(self, use_async: bool = False) -> StateGraph:
         """
-        协调员智能体 - 编排多智能体工作流
+        创建并行模式的工作流图
 
-        协调员是整个系统的"大脑"，负责：
-        1. 分析当前状态和需求
-        2. 决定下一步需要哪个智能体工作
-        3. 综合各智能体的输出
-        4. 判断是否需要更多信息或可以结束
+        旅行顾问、天气分析师、预算优化师、当地专家互不依赖，不再经由协调员逐个调度，
+        而是从入口同时分出 4 个并行分支（同一个 superstep 中执行），
+        各分支只返回自己的输出，由 `merge_agent_outputs` 合并；全部完成后再执行行程规划师：
 
-        参数：
-        - state: 当前的旅行规划状态
+            START ──┬─ travel_advisor ───┐
+                    ├─ weather_analyst ──┤
+                    ├─ budget_optimizer ─┼─→ itinerary_planner → END
+                    └─ local_expert ─────┘
+
+        每个分支需要搜索时在分支内部完成（见 `_run_branch`），不经过共享的工具节点。
+        规划耗时约为"最慢的一个专业智能体 + 行程规划师"，而不是所有智能体与协调员调用之和。
+
+        适用于大模型技术初级用户：
+        LangGraph 中一个节点有多条出边时，目标节点会在下一步并行执行（异步图中并发等待模型响应，
+        同步图中放入线程池执行）；并行节点写同一个状态字段时，需要为该字段指定合并函数（reducer）。
+        """
+        workflow = StateGraph(TravelPlanState)
+
+        for agent in PARALLEL_AGENTS + ["itinerary_planner"]:
+            workflow.add_node(agent, self._branch_node(agent, use_async))
+
+        # 入口处决定要并行执行的分支（剩余时间不足时只保留必需的智能体）
+        workflow.add_conditional_edges(START, self._fan_out_router, PARALLEL_AGENTS)
+        # 所有分支都在同一步中执行，下一步行程规划师只会执行一次，此时各分支的输出都已合并进状态
+        for agent in PARALLEL_AGENTS:
+            workflow.add_edge(agent, "itinerary_planner")
+        workflow.add_edge("itinerary_planner", END)
+
+        return workflow.compile()
+
+    def _fan_out_router(self, state: TravelPlanState) -> List[str]:
+        """并行模式的入口路由：返回需要同时执行的专业智能体列表"""
+        if self._short_on_time(state):
+            agents = [agent for agent in PARALLEL_AGENTS if agent in REQUIRED_AGENTS]
+            agents_logger.info(f"[FanOut] 剩余时间不足，跳过可选智能体，只执行: {agents}")
+            return agents
+        agents_logger.info(f"[FanOut] 并行执行: {PARALLEL_AGENTS}")
+        return list(PARALLEL_AGENTS)
+
+    def _branch_node(self, agent_name: str, use_async: bool) -> Callable:
+        """生成并行模式下某个专业智能体的节点函数"""
+        if use_async:
+            async def node(state: TravelPlanState) -> StateUpdate:
+                return await self._arun_branch(agent_name, state)
+        else:
+            def node(state: TravelPlanState) -> StateUpdate:
+                return self._run_branch(agent_name, state)
+        node.__name__ = f"{agent_name}_branch"
+        return node
+
+    def _branch_messages(self, agent_name: str, state: TravelPlanState) -> List[Any]:
+        """
+        并行分支的输入消息
+
+        行程规划师在所有分支完成后执行，需要看到完整的消息历史（原始需求 + 各专业智能体的最终回复，
+        并行模式下历史中只有这些）；其余分支只需要原始需求。
+        """
+        recent = None if agent_name == "itinerary_planner" else 2
+        return self._specialist_messages(agent_name, state, recent)
+
+    @staticmethod
+    def _search_results_message(search_result: str) -> HumanMessage:
+        """分支内搜索完成后交给模型的消息：附上搜索结果，要求直接给出分析"""
+        return HumanMessage(content=f"{search_result}\n\n请基于以上搜索结果完成您的分析，不要再请求搜索。")
 
-        返回：更新后的状态
+    def _run_branch(self, agent_name: str, state: TravelPlanState) -> StateUpdate:
         """
+        执行并行模式下的一个专业智能体分支
 
-        system_prompt = f"""您是多智能体旅行规划系统的协调员智能体。
+        智能体回复 'NEED_SEARCH:' 时在分支内直接执行搜索（剩余时间充足时），
+        再把搜索结果交给模型生成最终分析；只有最终回复写入共享的消息历史。
+        """
+        state = {**state, "current_agent": agent_name}  # 工具选择需要知道是哪个智能体在搜索
+        messages = self._branch_messages(agent_name, state)
+        try:
+            response = self.llm.invoke(messages, timeout=self._llm_timeout(state))
+            search_query = self._parse_search_query(response.content)
+            if search_query is not None and not self._short_on_time(state):
+                search_result = self._execute_tool(state, search_query)
+                messages = messages + [response, self._search_results_message(search_result)]
+                response = self.llm.invoke(messages, timeout=self._llm_timeout(state))
+        except LLM_TIMEOUT_ERRORS:
+            agents_logger.warning(f"[{agent_name}] 模型调用超时，跳过该智能体")
+            return self._record_specialist_output(agent_name, self._timeout_message(agent_name), status="timeout")
+        return self._record_specialist_output(agent_name, response)
+
+    async def _arun_branch(self, agent_name: str, state: TravelPlanState) -> StateUpdate:
+        """_run_branch 的异步版本"""
+        state = {**state, "current_agent": agent_name}
+        messages = self._branch_messages(agent_name, state)
+        try:
+            response = await self._ainvoke_llm(messages, state)
+            search_query = self._parse_search_query(response.content)
+            if search_query is not None and not self._short_on_time(state):
+                search_result = await self._aexecute_tool(state, search_query)
+                messages = messages + [response, self._search_results_message(search_result)]
+                response = await self._ainvoke_llm(messages, state)
+        except LLM_TIMEOUT_ERRORS:
+            agents_logger.warning(f"[{agent_name}] 模型调用超时，跳过该智能体")
+            return self._record_specialist_output(agent_name, self._timeout_message(agent_name), status="timeout")
+        return self._record_specialist_output(agent_name, response)
+
+    def _coordinator_prompt(self, state: TravelPlanState) -> str:
+        """协调员智能体的系统提示词（同步与异步节点共用）"""
+        return f"""您是多智能体旅行规划系统的协调员智能体。
 
 您的职责是：
 1. 分析旅行规划请求
@@ -216,7 +405,8 @@ class LangGraphTravelAgents:
 - local_expert: 本地洞察和文化贴士
 - itinerary_planner: 日程优化和物流安排
 
-目前智能体输出: {json.dumps(state.get('agent_outputs', {}), indent=2)}
+目前智能体输出摘要:
+{format_digests(state.get('agent_digests'), config.COORDINATOR_DIGEST_TOKEN_BUDGET)}
 
 根据当前状态，决定下一步行动：
 1. 如果需要更多信息，指定下一个应该工作的智能体
@@ -228,30 +418,254 @@ class LangGraphTravelAgents:
 - 'FINAL_PLAN' 如果准备创建综合旅行计划
 - 'SEARCH' 如果需要先搜索信息
 """
-        
-        messages = [SystemMessage(content=system_prompt)]
-        if state.get("messages"):
-            messages.extend(state["messages"][-3:])  # Keep recent context
-        
-        response = self.llm.invoke(messages)
-        
-        # Update state
-        new_state = state.copy()
-        new_state["messages"] = state.get("messages", []) + [response]
-        new_state["current_agent"] = "coordinator"
-        new_state["iteration_count"] = state.get("iteration_count", 0) + 1
-        
-        return new_state
-    
-    def _travel_advisor_agent(self, state: TravelPlanState) -> TravelPlanState:
+
+    def _coordinator_messages(self, state: TravelPlanState) -> List[Any]:
         """
-        旅行顾问智能体，具有目的地专业知识
+        构造协调员的输入消息：系统提示词（含各智能体摘要）+ 最近的上下文
 
-        这个智能体专门负责提供目的地相关的专业建议，
-        包括景点推荐、文化洞察等。
+        最近的消息只保留前 COORDINATOR_RECENT_MESSAGE_CHARS 个字符：协调员只需要知道刚发生了什么
+        （例如搜索结果已返回），完整内容由专业智能体自己使用。这样提示词大小不随规划进度增长。
+        """
+        messages = [SystemMessage(content=self._coordinator_prompt(state))]
+        for message in self._message_window(state, 3):  # Keep recent context
+            content = truncate_text(message.content, config.COORDINATOR_RECENT_MESSAGE_CHARS)
+            messages.append(message if content == message.content else message.model_copy(update={"content": content}))
+        return messages
+
+    @staticmethod
+    def _prompt_tokens(messages: List[Any]) -> int:
+        return sum(estimate_tokens(message.content) for message in messages)
+
+    def _record_coordinator_output(self, state: TravelPlanState, response: Optional[AIMessage],
+                                   next_agent: str = "", prompt_tokens: Optional[int] = None) -> StateUpdate:
+        """
+        协调员决策的状态增量
+
+        调用了模型时 response 为协调员的回复，由路由器解析；
+        按规则决定时 response 为 None（不写入消息历史），下一步直接记录在 next_agent 中。
+        """
+        update: StateUpdate = {
+            "current_agent": "coordinator",
+            "next_agent": next_agent,
+            "iteration_count": state.get("iteration_count", 0) + 1
+        }
+        if response is not None:
+            update["messages"] = [response]
+        if prompt_tokens is not None:
+            update["coordinator_prompt_tokens"] = [prompt_tokens]
+            agents_logger.info(f"[Coordinator] 第 {len(state.get('coordinator_prompt_tokens', [])) + 1} 次模型决策，"
+                               f"提示词约 {prompt_tokens} tokens")
+        return update
+
+    def _rule_based_decision(self, state: TravelPlanState) -> Optional[str]:
+        """
+        不需要协调员模型就能确定的下一步，返回 None 表示需要模型决策
+
+        原先协调员每一步都调用一次模型（提示词包含所有智能体的输出），但路由器最终大多落到
+        "调用下一个尚未执行的智能体"这一默认规则上。rules 策略下这类确定的步骤直接在本地决定：
+        - 剩余时间不足：交给路由器只完成必需的智能体（见 `_required_agent_or_end`）
+        - 上一条消息是搜索结果：需要判断是否让发起搜索的智能体基于结果重新分析，调用模型
+        - 否则：按 SPECIALIST_AGENTS 顺序调用下一个尚未执行的智能体；全部完成后返回 FINAL_SYNTHESIS，
+          由协调员模型根据各智能体的摘要综合一次最终建议（见 `_final_synthesis_messages`）再结束
+
+        一次规划的模型调用次数因此从"专业智能体数 × 2"左右降到专业智能体数加上一次综合和少量真正的决策。
         """
+        if self._short_on_time(state):
+            return ""  # 由路由器的剩余时间检查决定
+        if self.coordinator_policy != "rules":
+            return None
+        last_message = self._last_message(state)
+        if last_message is not None and getattr(last_message, "name", None) == TOOL_MESSAGE_NAME:
+            return None
+        agent_outputs = state.get("agent_outputs", {})
+        for agent in SPECIALIST_AGENTS:
+            if agent not in agent_outputs:
+                return agent
+        return FINAL_SYNTHESIS
 
-        system_prompt = f"""您是旅行顾问智能体，专门从事目的地专业知识和推荐服务。
+    def _final_synthesis_messages(self, state: TravelPlanState) -> List[Any]:
+        """
+        协调员综合最终建议的输入消息
+
+        与调度决策使用同一份提示词（需求 + 各智能体摘要），不附带完整回复，提示词大小同样受摘要预算限制。
+        """
+        return [
+            SystemMessage(content=self._coordinator_prompt(state)),
+            HumanMessage(content="所有专业智能体都已完成。请综合以上各智能体的摘要，"
+                                 "用几句话给出这次旅行的最终建议（行程亮点、天气与预算上的注意事项），不要再指定智能体。")
+        ]
+
+    def _record_final_synthesis(self, state: TravelPlanState, response: Optional[AIMessage],
+                                prompt_tokens: int) -> StateUpdate:
+        """综合结果的状态增量：写入 final_synthesis 并结束流程；模型超时时 response 为 None，最终计划使用默认摘要"""
+        update = self._record_coordinator_output(state, response, next_agent="end", prompt_tokens=prompt_tokens)
+        if response is not None:
+            update["final_synthesis"] = response.content
+        return update
+
+    def _coordinator_agent(self, state: TravelPlanState) -> StateUpdate:
+        """
+        协调员智能体 - 编排多智能体工作流
+
+        协调员是整个系统的"大脑"，负责：
+        1. 分析当前状态和需求
+        2. 决定下一步需要哪个智能体工作
+        3. 综合各智能体的输出
+        4. 判断是否需要更多信息或可以结束
+
+        参数：
+        - state: 当前的旅行规划状态
+
+        返回：状态增量（只包含发生变化的字段）
+        """
+        decision = self._rule_based_decision(state)
+        if decision == FINAL_SYNTHESIS:
+            messages = self._final_synthesis_messages(state)
+            try:
+                response = self.llm.invoke(messages, timeout=self._llm_timeout(state))
+            except LLM_TIMEOUT_ERRORS:
+                agents_logger.warning("[Coordinator] 综合最终建议超时，使用默认摘要")
+                response = None
+            return self._record_final_synthesis(state, response, self._prompt_tokens(messages))
+        if decision is not None:
+            return self._record_coordinator_output(state, None, next_agent=decision)
+        messages = self._coordinator_messages(state)
+        try:
+            response = self.llm.invoke(messages, timeout=self._llm_timeout(state))
+        except LLM_TIMEOUT_ERRORS:
+            agents_logger.warning("[Coordinator] 模型调用超时，按默认顺序继续")
+            response = AIMessage(content="协调员决策超时，按默认顺序继续")
+        return self._record_coordinator_output(state, response, prompt_tokens=self._prompt_tokens(messages))
+
+    async def _acoordinator_agent(self, state: TravelPlanState) -> StateUpdate:
+        """协调员智能体的异步版本：通过 llm.ainvoke 调用模型，等待期间不占用线程"""
+        decision = self._rule_based_decision(state)
+        if decision == FINAL_SYNTHESIS:
+            messages = self._final_synthesis_messages(state)
+            try:
+                response = await self._ainvoke_llm(messages, state)
+            except LLM_TIMEOUT_ERRORS:
+                agents_logger.warning("[Coordinator] 综合最终建议超时，使用默认摘要")
+                response = None
+            return self._record_final_synthesis(state, response, self._prompt_tokens(messages))
+        if decision is not None:
+            return self._record_coordinator_output(state, None, next_agent=decision)
+        messages = self._coordinator_messages(state)
+        try:
+            response = await self._ainvoke_llm(messages, state)
+        except LLM_TIMEOUT_ERRORS:
+            agents_logger.warning("[Coordinator] 模型调用超时，按默认顺序继续")
+            response = AIMessage(content="协调员决策超时，按默认顺序继续")
+        return self._record_coordinator_output(state, response, prompt_tokens=self._prompt_tokens(messages))
+
+    @staticmethod
+    def _llm_timeout(state: TravelPlanState) -> float:
+        """单次模型调用的超时：AGENT_LLM_TIMEOUT_SECONDS 与剩余时间中较小的一个；已到截止时间时直接抛出 TimeoutError"""
+        deadline = state.get("deadline")
+        timeout = deadline.timeout(config.AGENT_LLM_TIMEOUT_SECONDS) if deadline else config.AGENT_LLM_TIMEOUT_SECONDS
+        if timeout <= 0:
+            raise TimeoutError("已到规划截止时间")
+        return timeout
+
+    async def _ainvoke_llm(self, messages: List[Any], state: TravelPlanState) -> AIMessage:
+        """
+        异步调用模型，超时不超过 `_llm_timeout`
+
+        先计算超时再创建请求：已到截止时间时直接抛出 TimeoutError，不会发出模型请求。
+        asyncio.wait_for 到时会直接取消进行中的请求。
+        """
+        timeout = self._llm_timeout(state)
+        return await asyncio.wait_for(self.llm.ainvoke(messages), timeout=timeout)
+
+    @staticmethod
+    def _short_on_time(state: TravelPlanState) -> bool:
+        """剩余时间是否已不足以运行可选的专业智能体"""
+        deadline = state.get("deadline")
+        return deadline is not None and deadline.remaining() < config.AGENT_OPTIONAL_MIN_SECONDS
+
+    def _run_specialist(self, agent_name: str, state: TravelPlanState) -> StateUpdate:
+        """调用专业智能体的模型并记录输出；超时时记录为未完成，规划继续进行"""
+        try:
+            response = self.llm.invoke(self._specialist_messages(agent_name, state), timeout=self._llm_timeout(state))
+        except LLM_TIMEOUT_ERRORS:
+            return self._record_specialist_timeout(agent_name)
+        return self._record_specialist_output(agent_name, response)
+
+    async def _arun_specialist(self, agent_name: str, state: TravelPlanState) -> StateUpdate:
+        """_run_specialist 的异步版本：asyncio.wait_for 到时会直接取消进行中的模型请求"""
+        try:
+            response = await self._ainvoke_llm(self._specialist_messages(agent_name, state), state)
+        except LLM_TIMEOUT_ERRORS:
+            return self._record_specialist_timeout(agent_name)
+        return self._record_specialist_output(agent_name, response)
+
+    @staticmethod
+    def _timeout_message(agent_name: str) -> AIMessage:
+        return AIMessage(content=f"{AGENT_DISPLAY_NAMES[agent_name]}未能在规划时限内完成分析")
+
+    def _record_specialist_timeout(self, agent_name: str) -> StateUpdate:
+        """专业智能体未能在时限内完成：记录 status=timeout，最终计划中列为已跳过"""
+        agents_logger.warning(f"[{agent_name}] 模型调用超时，跳过该智能体")
+        return self._record_specialist_output(agent_name, self._timeout_message(agent_name), status="timeout")
+
+    def _specialist_messages(self, agent_name: str, state: TravelPlanState,
+                             recent: Optional[int] = 2) -> List[Any]:
+        """构造专业智能体的输入消息：该智能体的系统提示词 + 最近 recent 条消息（None 表示全部）"""
+        prompt_builder = getattr(self, f"_{agent_name}_prompt")
+        return [SystemMessage(content=prompt_builder(state))] + self._message_window(state, recent)
+
+    @staticmethod
+    def _message_window(state: TravelPlanState, size: Optional[int]) -> List[Any]:
+        """
+        消息历史的窗口视图：最近 size 条消息（None 表示全部）
+
+        提示词只需要最近的上下文，切片只复制窗口内的几条消息的引用，与历史总长度无关。
+        """
+        messages = state.get("messages") or []
+        return list(messages) if size is None else messages[-size:]
+
+    @staticmethod
+    def _last_message(state: TravelPlanState) -> Optional[Any]:
+        messages = state.get("messages")
+        return messages[-1] if messages else None
+
+    @staticmethod
+    def _agent_output_entry(response: AIMessage, status: str = "completed") -> Dict[str, Any]:
+        """agent_outputs 中一个智能体的输出记录"""
+        return {
+            "response": response.content,
+            "timestamp": datetime.now().isoformat(),
+            "status": status
+        }
+
+    @staticmethod
+    def _agent_digest(response: AIMessage, status: str = "completed") -> Dict[str, Any]:
+        """agent_digests 中一个智能体的摘要（在智能体完成时生成一次，之后每次协调员决策直接使用）"""
+        return build_digest(response.content, status, summary_chars=config.AGENT_DIGEST_SUMMARY_CHARS,
+                            max_facts=config.AGENT_DIGEST_MAX_FACTS)
+
+    def _record_specialist_output(self, agent_name: str, response: AIMessage,
+                                  status: str = "completed") -> StateUpdate:
+        """
+        专业智能体完成后的状态增量：新回复、该智能体的输出记录与摘要
+
+        消息由 add_messages 追加，agent_outputs / agent_digests 由 merge_agent_outputs 合并，
+        节点不再复制整个消息列表和输出字典。
+        并行模式下多个专业智能体在同一步中执行，不能同时写 current_agent 这类只允许一个值的字段，
+        因此只有行程规划师（单独一步执行）会更新 current_agent。
+        """
+        update: StateUpdate = {
+            "messages": [response],
+            "agent_outputs": {agent_name: self._agent_output_entry(response, status)},
+            "agent_digests": {agent_name: self._agent_digest(response, status)}
+        }
+        if self.execution_mode == "sequential" or agent_name not in PARALLEL_AGENTS:
+            update["current_agent"] = agent_name
+        return update
+    
+    def _travel_advisor_prompt(self, state: TravelPlanState) -> str:
+        """旅行顾问智能体的系统提示词（同步与异步节点共用）"""
+        return f"""您是旅行顾问智能体，专门从事目的地专业知识和推荐服务。
 
 您的专业领域包括：
 - 目的地知识和亮点
@@ -274,37 +688,23 @@ class LangGraphTravelAgents:
 如果您需要搜索关于目的地的当前信息，请回复 'NEED_SEARCH: [搜索查询]'
 否则，请基于您的知识提供专家建议。
 """
-        
-        messages = [SystemMessage(content=system_prompt)]
-        if state.get("messages"):
-            messages.extend(state["messages"][-2:])
-        
-        response = self.llm.invoke(messages)
-        
-        # Store agent output
-        agent_outputs = state.get("agent_outputs", {})
-        agent_outputs["travel_advisor"] = {
-            "response": response.content,
-            "timestamp": datetime.now().isoformat(),
-            "status": "completed"
-        }
-        
-        new_state = state.copy()
-        new_state["messages"] = state.get("messages", []) + [response]
-        new_state["current_agent"] = "travel_advisor"
-        new_state["agent_outputs"] = agent_outputs
-        
-        return new_state
-    
-    def _weather_analyst_agent(self, state: TravelPlanState) -> TravelPlanState:
+
+    def _travel_advisor_agent(self, state: TravelPlanState) -> StateUpdate:
         """
-        天气分析师智能体，专门进行气候和天气规划
+        旅行顾问智能体，具有目的地专业知识
 
-        这个智能体专门负责天气情报分析和基于气候的
-        活动规划建议。
+        这个智能体专门负责提供目的地相关的专业建议，
+        包括景点推荐、文化洞察等。
         """
+        return self._run_specialist("travel_advisor", state)
 
-        system_prompt = f"""您是天气分析师智能体，专门从事天气情报和气候感知规划。
+    async def _atravel_advisor_agent(self, state: TravelPlanState) -> StateUpdate:
+        """旅行顾问智能体的异步版本：通过 llm.ainvoke 调用模型，等待期间不占用线程"""
+        return await self._arun_specialist("travel_advisor", state)
+    
+    def _weather_analyst_prompt(self, state: TravelPlanState) -> str:
+        """天气分析师智能体的系统提示词（同步与异步节点共用）"""
+        return f"""您是天气分析师智能体，专门从事天气情报和气候感知规划。
 
         您的专业领域包括：
         - 天气模式分析
@@ -331,37 +731,23 @@ class LangGraphTravelAgents:
 
         注意：必须先获取实时天气数据，不要仅凭经验或历史气候知识进行推测。
         """
-        
-        messages = [SystemMessage(content=system_prompt)]
-        if state.get("messages"):
-            messages.extend(state["messages"][-2:])
-        
-        response = self.llm.invoke(messages)
-        
-        # Store agent output
-        agent_outputs = state.get("agent_outputs", {})
-        agent_outputs["weather_analyst"] = {
-            "response": response.content,
-            "timestamp": datetime.now().isoformat(),
-            "status": "completed"
-        }
-        
-        new_state = state.copy()
-        new_state["messages"] = state.get("messages", []) + [response]
-        new_state["current_agent"] = "weather_analyst"
-        new_state["agent_outputs"] = agent_outputs
-        
-        return new_state
-    
-    def _budget_optimizer_agent(self, state: TravelPlanState) -> TravelPlanState:
+
+    def _weather_analyst_agent(self, state: TravelPlanState) -> StateUpdate:
         """
-        预算优化师智能体，专门进行成本分析和优化
+        天气分析师智能体，专门进行气候和天气规划
 
-        这个智能体专门负责旅行预算的分析和优化，
-        提供省钱策略和成本效益建议。
+        这个智能体专门负责天气情报分析和基于气候的
+        活动规划建议。
         """
+        return self._run_specialist("weather_analyst", state)
 
-        system_prompt = f"""您是预算优化师智能体，专门从事成本分析和省钱策略。
+    async def _aweather_analyst_agent(self, state: TravelPlanState) -> StateUpdate:
+        """天气分析师智能体的异步版本：通过 llm.ainvoke 调用模型，等待期间不占用线程"""
+        return await self._arun_specialist("weather_analyst", state)
+    
+    def _budget_optimizer_prompt(self, state: TravelPlanState) -> str:
+        """预算优化师智能体的系统提示词（同步与异步节点共用）"""
+        return f"""您是预算优化师智能体，专门从事成本分析和省钱策略。
 
 您的专业领域包括：
 - 旅行成本分析和预算制定
@@ -384,37 +770,23 @@ class LangGraphTravelAgents:
 如果您需要当前价格信息，请回复 'NEED_SEARCH: [预算搜索查询]'
 否则，请提供您的预算分析和建议。
 """
-        
-        messages = [SystemMessage(content=system_prompt)]
-        if state.get("messages"):
-            messages.extend(state["messages"][-2:])
-        
-        response = self.llm.invoke(messages)
-        
-        # Store agent output
-        agent_outputs = state.get("agent_outputs", {})
-        agent_outputs["budget_optimizer"] = {
-            "response": response.content,
-            "timestamp": datetime.now().isoformat(),
-            "status": "completed"
-        }
-        
-        new_state = state.copy()
-        new_state["messages"] = state.get("messages", []) + [response]
-        new_state["current_agent"] = "budget_optimizer"
-        new_state["agent_outputs"] = agent_outputs
-        
-        return new_state
-    
-    def _local_expert_agent(self, state: TravelPlanState) -> TravelPlanState:
+
+    def _budget_optimizer_agent(self, state: TravelPlanState) -> StateUpdate:
         """
-        当地专家智能体，具有内部知识和本地洞察
+        预算优化师智能体，专门进行成本分析和优化
 
-        这个智能体专门提供只有当地人才知道的内部信息，
-        包括小众景点、文化习俗和实用贴士。
+        这个智能体专门负责旅行预算的分析和优化，
+        提供省钱策略和成本效益建议。
         """
+        return self._run_specialist("budget_optimizer", state)
 
-        system_prompt = f"""您是当地专家智能体，专门从事内部知识和本地洞察。
+    async def _abudget_optimizer_agent(self, state: TravelPlanState) -> StateUpdate:
+        """预算优化师智能体的异步版本：通过 llm.ainvoke 调用模型，等待期间不占用线程"""
+        return await self._arun_specialist("budget_optimizer", state)
+    
+    def _local_expert_prompt(self, state: TravelPlanState) -> str:
+        """当地专家智能体的系统提示词（同步与异步节点共用）"""
+        return f"""您是当地专家智能体，专门从事内部知识和本地洞察。
 
 您的专业领域包括：
 - 当地习俗和文化细节
@@ -436,37 +808,23 @@ class LangGraphTravelAgents:
 如果您需要当前本地信息，请回复 'NEED_SEARCH: [本地贴士搜索查询]'
 否则，请提供您的本地专业知识和洞察。
 """
-        
-        messages = [SystemMessage(content=system_prompt)]
-        if state.get("messages"):
-            messages.extend(state["messages"][-2:])
-        
-        response = self.llm.invoke(messages)
-        
-        # Store agent output
-        agent_outputs = state.get("agent_outputs", {})
-        agent_outputs["local_expert"] = {
-            "response": response.content,
-            "timestamp": datetime.now().isoformat(),
-            "status": "completed"
-        }
-        
-        new_state = state.copy()
-        new_state["messages"] = state.get("messages", []) + [response]
-        new_state["current_agent"] = "local_expert"
-        new_state["agent_outputs"] = agent_outputs
-        
-        return new_state
-    
-    def _itinerary_planner_agent(self, state: TravelPlanState) -> TravelPlanState:
+
+    def _local_expert_agent(self, state: TravelPlanState) -> StateUpdate:
         """
-        行程规划师智能体，专门进行日程优化和物流安排
+        当地专家智能体，具有内部知识和本地洞察
 
-        这个智能体专门负责创建优化的日程安排，
-        协调交通和活动的时间安排。
+        这个智能体专门提供只有当地人才知道的内部信息，
+        包括小众景点、文化习俗和实用贴士。
         """
+        return self._run_specialist("local_expert", state)
 
-        system_prompt = f"""您是行程规划师智能体，专门从事日程优化和物流安排。
+    async def _alocal_expert_agent(self, state: TravelPlanState) -> StateUpdate:
+        """当地专家智能体的异步版本：通过 llm.ainvoke 调用模型，等待期间不占用线程"""
+        return await self._arun_specialist("local_expert", state)
+    
+    def _itinerary_planner_prompt(self, state: TravelPlanState) -> str:
+        """行程规划师智能体的系统提示词（同步与异步节点共用）"""
+        return f"""您是行程规划师智能体，专门从事日程优化和物流安排。
 
 您的专业领域包括：
 - 每日行程规划和优化
@@ -489,136 +847,174 @@ class LangGraphTravelAgents:
 在创建行程时请考虑其他智能体的建议。
 提供结构化的每日计划，最大化旅行体验。
 """
-        
-        messages = [SystemMessage(content=system_prompt)]
-        if state.get("messages"):
-            messages.extend(state["messages"][-2:])
-        
-        response = self.llm.invoke(messages)
-        
-        # Store agent output
-        agent_outputs = state.get("agent_outputs", {})
-        agent_outputs["itinerary_planner"] = {
-            "response": response.content,
-            "timestamp": datetime.now().isoformat(),
-            "status": "completed"
-        }
-        
-        new_state = state.copy()
-        new_state["messages"] = state.get("messages", []) + [response]
-        new_state["current_agent"] = "itinerary_planner"
-        new_state["agent_outputs"] = agent_outputs
-        
-        return new_state
-    
-    def _tool_executor_node(self, state: TravelPlanState) -> TravelPlanState:
+
+    def _itinerary_planner_agent(self, state: TravelPlanState) -> StateUpdate:
         """
-        工具执行节点，根据智能体请求执行工具
+        行程规划师智能体，专门进行日程优化和物流安排
 
-        这个节点负责解析智能体的工具请求，
-        并执行相应的搜索工具来获取实时信息。
+        这个智能体专门负责创建优化的日程安排，
+        协调交通和活动的时间安排。
         """
+        return self._run_specialist("itinerary_planner", state)
 
-        last_message = state["messages"][-1] if state.get("messages") else None
-        if not last_message:
-            return state
+    async def _aitinerary_planner_agent(self, state: TravelPlanState) -> StateUpdate:
+        """行程规划师智能体的异步版本：通过 llm.ainvoke 调用模型，等待期间不占用线程"""
+        return await self._arun_specialist("itinerary_planner", state)
+    
+    def _select_tool(self, state: TravelPlanState, search_query: str):
+        """
+        智能工具选择：根据查询内容和当前智能体选择最合适的搜索工具
 
-        # 检查最后一条消息是否请求搜索
-        content = last_message.content
-        if "NEED_SEARCH:" in content:
-            search_query = content.split("NEED_SEARCH:")[-1].strip()
+        返回：(工具名称, 工具对象, 调用参数)；同步与异步工具节点共用
+        """
+        from tools import travel_tools
+
+        current_agent = state.get("current_agent", "")
+        query = search_query.lower()
+        destination = state.get("destination", "")
+
+        if "weather" in query or "天气" in search_query or current_agent == "weather_analyst":
+            # 天气相关查询：使用天气信息搜索工具
+            return "search_weather_info", travel_tools.search_weather_info, {
+                "destination": destination, "dates": state.get("travel_dates", "")}
+        if "attraction" in query or "activity" in query or "景点" in search_query or "活动" in search_query:
+            # 景点活动查询：使用景点搜索工具
+            return "search_attractions", travel_tools.search_attractions, {
+                "destination": destination, "interests": " ".join(state.get("interests", []))}
+        if "budget" in query or "cost" in query or "预算" in search_query or "费用" in search_query:
+            # 预算费用查询：使用预算信息搜索工具
+            return "search_budget_info", travel_tools.search_budget_info, {
+                "destination": destination, "duration": str(state.get("duration", ""))}
+        if "hotel" in query or "accommodation" in query or "酒店" in search_query or "住宿" in search_query:
+            # 住宿查询：使用酒店搜索工具
+            return "search_hotels", travel_tools.search_hotels, {
+                "destination": destination, "budget": state.get("budget_range", "mid-range")}
+        if "restaurant" in query or "food" in query or "餐厅" in search_query or "美食" in search_query:
+            # 餐饮查询：使用餐厅搜索工具
+            return "search_restaurants", travel_tools.search_restaurants, {"destination": destination}
+        if "local" in query or "tip" in query or "本地" in search_query or "贴士" in search_query:
+            # 本地贴士查询：使用本地贴士搜索工具
+            return "search_local_tips", travel_tools.search_local_tips, {"destination": destination}
+        # 默认选择：使用目的地信息搜索工具
+        return "search_destination_info", travel_tools.search_destination_info, {"query": destination}
+
+    @staticmethod
+    def _parse_search_query(content: str) -> Optional[str]:
+        """从智能体回复中解析 'NEED_SEARCH:' 搜索请求，没有请求时返回 None"""
+        if "NEED_SEARCH:" not in content:
+            return None
+        return content.split("NEED_SEARCH:")[-1].strip()
+
+    @classmethod
+    def _search_query(cls, state: TravelPlanState) -> Optional[str]:
+        """从最后一条消息中解析搜索请求"""
+        last_message = cls._last_message(state)
+        return cls._parse_search_query(last_message.content) if last_message else None
+
+    @staticmethod
+    def _record_tool_output(content: str) -> StateUpdate:
+        """将工具执行结果（或错误信息）追加到消息历史中"""
+        return {"messages": [AIMessage(content=content, name=TOOL_MESSAGE_NAME)]}
+
+    @staticmethod
+    def _tool_deadline(state: TravelPlanState) -> Deadline:
+        """
+        单次工具调用的截止时间：AGENT_TOOL_TIMEOUT_SECONDS 与任务截止时间中较早的一个
 
-            # 根据当前智能体和查询确定使用哪个工具
-            current_agent = state.get("current_agent", "")
-            agents_logger.info(f"[ToolExecutor] 解析到搜索需求 | 当前智能体: {current_agent} | 查询: {search_query}")
-            
-            try:
-                # 智能工具选择：根据查询内容和当前智能体选择最合适的搜索工具
-                selected_tool = ""
-                if "weather" in search_query.lower() or "天气" in search_query or current_agent == "weather_analyst":
-                    selected_tool = "search_weather_info"
-                    # 天气相关查询：使用天气信息搜索工具
-                    from tools.travel_tools import search_weather_info
-                    tool_params = {"destination": state.get("destination", ""),
-                                   "dates": state.get("travel_dates", "")}
-                    agents_logger.info(f"[ToolExecutor] 调用工具: {selected_tool} | 参数: {tool_params}")
-                    # 该工具为异步工具，需使用 ainvoke 在独立事件循环中执行
-                    import asyncio
+        已到任务截止时间时直接抛出 TimeoutError，不再发起工具调用：
+        同步工具一旦开始就无法中途打断，超时为 0 的 asyncio.wait_for 也可能已经把请求发出去了。
+        """
+        deadline = state.get("deadline")
+        if deadline is None:
+            return Deadline.after(config.AGENT_TOOL_TIMEOUT_SECONDS)
+        if deadline.expired:
+            raise TimeoutError("已到规划截止时间")
+        return deadline.sooner(config.AGENT_TOOL_TIMEOUT_SECONDS)
+
+    def _execute_tool(self, state: TravelPlanState, search_query: str) -> str:
+        """
+        同步执行一次搜索，返回要写入消息历史的文本（搜索结果、超时提示或错误信息）
+
+        工具节点与并行模式下的专业智能体分支共用。
+        """
+        agents_logger.info(f"[ToolExecutor] 解析到搜索需求 | 当前智能体: {state.get('current_agent', '')} | 查询: {search_query}")
+        try:
+            tool_deadline = self._tool_deadline(state)
+            selected_tool, tool, tool_params = self._select_tool(state, search_query)
+            agents_logger.info(f"[ToolExecutor] 调用工具: {selected_tool} | 参数: {tool_params}")
+            # 工具内部通过 remaining_timeout 读取这次调用剩余的时间，作为各自请求的超时
+            with use_deadline(tool_deadline):
+                if tool.coroutine is not None:
+                    # 异步工具（如天气查询）在同步流程中需使用 ainvoke 在独立事件循环中执行
                     loop = asyncio.new_event_loop()
                     try:
                         asyncio.set_event_loop(loop)
-                        tool_result = loop.run_until_complete(search_weather_info.ainvoke(tool_params))
+                        tool_result = loop.run_until_complete(
+                            asyncio.wait_for(tool.ainvoke(tool_params), timeout=tool_deadline.remaining()))
                     finally:
                         loop.close()
                         try:
                             asyncio.set_event_loop(None)
                         except Exception:
                             pass
-                elif "attraction" in search_query.lower() or "activity" in search_query.lower() or "景点" in search_query or "活动" in search_query:
-                    selected_tool = "search_attractions"
-                    # 景点活动查询：使用景点搜索工具
-                    from tools.travel_tools import search_attractions
-                    tool_params = {"destination": state.get("destination", ""),
-                                   "interests": " ".join(state.get("interests", []))}
-                    agents_logger.info(f"[ToolExecutor] 调用工具: {selected_tool} | 参数: {tool_params}")
-                    tool_result = search_attractions.invoke(tool_params)
-                elif "budget" in search_query.lower() or "cost" in search_query.lower() or "预算" in search_query or "费用" in search_query:
-                    selected_tool = "search_budget_info"
-                     # 预算费用查询：使用预算信息搜索工具
-                    from tools.travel_tools import search_budget_info
-                    tool_params = {"destination": state.get("destination", ""),
-                                   "duration": str(state.get("duration", ""))}
-                    agents_logger.info(f"[ToolExecutor] 调用工具: {selected_tool} | 参数: {tool_params}")
-                    tool_result = search_budget_info.invoke(tool_params)
-                elif "hotel" in search_query.lower() or "accommodation" in search_query.lower() or "酒店" in search_query or "住宿" in search_query:
-                    selected_tool = "search_hotels"
-                    # 住宿查询：使用酒店搜索工具
-                    from tools.travel_tools import search_hotels
-                    tool_params = {"destination": state.get("destination", ""),
-                                   "budget": state.get("budget_range", "mid-range")}
-                    agents_logger.info(f"[ToolExecutor] 调用工具: {selected_tool} | 参数: {tool_params}")
-                    tool_result = search_hotels.invoke(tool_params)
-                elif "restaurant" in search_query.lower() or "food" in search_query.lower() or "餐厅" in search_query or "美食" in search_query:
-                    selected_tool = "search_restaurants"
-                     # 餐饮查询：使用餐厅搜索工具
-                    from tools.travel_tools import search_restaurants
-                    tool_params = {"destination": state.get("destination", "")}
-                    agents_logger.info(f"[ToolExecutor] 调用工具: {selected_tool} | 参数: {tool_params}")
-                    tool_result = search_restaurants.invoke(tool_params)
-                elif "local" in search_query.lower() or "tip" in search_query.lower() or "本地" in search_query or "贴士" in search_query:
-                    selected_tool = "search_local_tips"
-                    # 本地贴士查询：使用本地贴士搜索工具
-                    from tools.travel_tools import search_local_tips
-                    tool_params = {"destination": state.get("destination", "")}
-                    agents_logger.info(f"[ToolExecutor] 调用工具: {selected_tool} | 参数: {tool_params}")
-                    tool_result = search_local_tips.invoke(tool_params)
                 else:
-                    selected_tool = "search_destination_info"
-                    # 默认选择：使用目的地信息搜索工具
-                    from tools.travel_tools import search_destination_info
-                    tool_params = {"query": state.get("destination", "")}
-                    agents_logger.info(f"[ToolExecutor] 调用工具: {selected_tool} | 参数: {tool_params}")
-                    tool_result = search_destination_info.invoke(tool_params)
-
-                # 记录工具返回结果大小（避免日志过大）
-                result_str = str(tool_result)
-                agents_logger.info(f"[ToolExecutor] 工具返回: {selected_tool} | 长度: {len(result_str)} 字符")
-
-                # 将工具执行结果添加到消息历史中
-                tool_message = AIMessage(content=f"搜索结果: {tool_result}")
-                new_state = state.copy()
-                new_state["messages"] = state.get("messages", []) + [tool_message]
-                return new_state
+                    tool_result = tool.invoke(tool_params)
 
-            except Exception as e:
-                agents_logger.error(f"[ToolExecutor] 工具执行错误: {str(e)}")
-                # 工具执行失败时添加错误消息
-                error_message = AIMessage(content=f"工具执行错误: {str(e)}")
-                new_state = state.copy()
-                new_state["messages"] = state.get("messages", []) + [error_message]
-                return new_state
+            # 记录工具返回结果大小（避免日志过大）
+            agents_logger.info(f"[ToolExecutor] 工具返回: {selected_tool} | 长度: {len(str(tool_result))} 字符")
+            return f"搜索结果: {tool_result}"
+
+        except TimeoutError:
+            agents_logger.warning(f"[ToolExecutor] 工具调用超时（{config.AGENT_TOOL_TIMEOUT_SECONDS} 秒或已到规划截止时间）")
+            return "工具执行超时，未获取到搜索结果"
+        except Exception as e:
+            agents_logger.error(f"[ToolExecutor] 工具执行错误: {str(e)}")
+            # 工具执行失败时返回错误消息
+            return f"工具执行错误: {str(e)}"
+
+    async def _aexecute_tool(self, state: TravelPlanState, search_query: str) -> str:
+        """
+        _execute_tool 的异步版本
 
-        return state
+        所有工具统一通过 `ainvoke` 调用：天气工具本身是协程，直接在当前事件循环中执行；
+        基于 DDGS 的同步搜索工具由 LangChain 放到默认线程池中执行，不会阻塞事件循环。
+        等待时间不超过 `_tool_deadline`，超时后返回一条提示，智能体不依赖搜索结果继续工作。
+        """
+        agents_logger.info(f"[ToolExecutor] 解析到搜索需求 | 当前智能体: {state.get('current_agent', '')} | 查询: {search_query}")
+        try:
+            tool_deadline = self._tool_deadline(state)
+            selected_tool, tool, tool_params = self._select_tool(state, search_query)
+            agents_logger.info(f"[ToolExecutor] 异步调用工具: {selected_tool} | 参数: {tool_params}")
+            with use_deadline(tool_deadline):
+                tool_result = await asyncio.wait_for(tool.ainvoke(tool_params), timeout=tool_deadline.remaining())
+            agents_logger.info(f"[ToolExecutor] 工具返回: {selected_tool} | 长度: {len(str(tool_result))} 字符")
+            return f"搜索结果: {tool_result}"
+
+        except TimeoutError:
+            agents_logger.warning(f"[ToolExecutor] 工具调用超时（{config.AGENT_TOOL_TIMEOUT_SECONDS} 秒或已到规划截止时间）")
+            return "工具执行超时，未获取到搜索结果"
+        except Exception as e:
+            agents_logger.error(f"[ToolExecutor] 工具执行错误: {str(e)}")
+            return f"工具执行错误: {str(e)}"
+
+    def _tool_executor_node(self, state: TravelPlanState) -> StateUpdate:
+        """
+        工具执行节点，根据智能体请求执行工具
+
+        这个节点负责解析智能体的工具请求，
+        并执行相应的搜索工具来获取实时信息。
+        """
+        search_query = self._search_query(state)
+        if search_query is None:
+            return {}
+        return self._record_tool_output(self._execute_tool(state, search_query))
+
+    async def _atool_executor_node(self, state: TravelPlanState) -> StateUpdate:
+        """工具执行节点的异步版本（见 `_aexecute_tool`）"""
+        search_query = self._search_query(state)
+        if search_query is None:
+            return {}
+        return self._record_tool_output(await self._aexecute_tool(state, search_query))
 
     def _coordinator_router(self, state: TravelPlanState) -> str:
         """
@@ -637,11 +1033,20 @@ class LangGraphTravelAgents:
         根据上下文动态选择下一步的执行路径。
         """
 
-        last_message = state.get("messages", [])[-1] if state.get("messages") else None
+        last_message = self._last_message(state)
         if not last_message:
             agents_logger.info("[CoordinatorRouter] 无最近消息，结束流程")
             return "end"
 
+        if self._short_on_time(state):
+            # 剩余时间不足：不再听从协调员的安排，只完成尚未执行的必需智能体
+            return self._required_agent_or_end(state)
+
+        if state.get("next_agent"):
+            # 协调员已按规则确定下一步（未调用模型）
+            agents_logger.info(f"[CoordinatorRouter] 规则调度: {state['next_agent']}")
+            return state["next_agent"]
+
         content = last_message.content.lower()
 
         # 路由决策逻辑：根据协调员的输出内容决定下一步行动
@@ -674,10 +1079,9 @@ class LangGraphTravelAgents:
 
         # 默认策略：检查哪些智能体还没有参与工作
         agent_outputs = state.get("agent_outputs", {})
-        required_agents = ["travel_advisor", "weather_analyst", "budget_optimizer", "local_expert", "itinerary_planner"]
 
         # 按优先级顺序调用尚未参与的智能体
-        for agent in required_agents:
+        for agent in SPECIALIST_AGENTS:
             if agent not in agent_outputs:
                 agents_logger.info(f"[CoordinatorRouter] 决策: 跳转 {agent} (尚未参与)")
                 return agent
@@ -685,6 +1089,20 @@ class LangGraphTravelAgents:
         # 如果所有智能体都已参与，结束流程
         agents_logger.info("[CoordinatorRouter] 决策: 所有智能体已参与，结束流程")
         return "end"
+
+    def _required_agent_or_end(self, state: TravelPlanState) -> str:
+        """剩余时间不足时的路由：依次完成 REQUIRED_AGENTS 中尚未执行的智能体，已到截止时间则直接结束"""
+        deadline = state.get("deadline")
+        if deadline is not None and deadline.expired:
+            agents_logger.info("[CoordinatorRouter] 已到规划截止时间，结束流程")
+            return "end"
+        agent_outputs = state.get("agent_outputs", {})
+        for agent in REQUIRED_AGENTS:
+            if agent not in agent_outputs:
+                agents_logger.info(f"[CoordinatorRouter] 剩余时间不足，跳过可选智能体，跳转 {agent}")
+                return agent
+        agents_logger.info("[CoordinatorRouter] 剩余时间不足，必需智能体已完成，结束流程")
+        return "end"
     
     def _agent_router(self, state: TravelPlanState) -> str:
         """
@@ -703,7 +1121,7 @@ class LangGraphTravelAgents:
         智能体可以请求更多信息或将控制权交还给协调员。
         """
 
-        last_message = state.get("messages", [])[-1] if state.get("messages") else None
+        last_message = self._last_message(state)
         if not last_message:
             agents_logger.info("[AgentRouter] 无最近消息，返回协调员")
             return "coordinator"
@@ -712,6 +1130,9 @@ class LangGraphTravelAgents:
 
         # 检查智能体是否需要搜索更多信息
         if "NEED_SEARCH:" in content:
+            if self._short_on_time(state):
+                agents_logger.info("[AgentRouter] 剩余时间不足，跳过搜索，返回协调员")
+                return "coordinator"
             agents_logger.info("[AgentRouter] 检测到搜索需求，跳转工具节点")
             return "tools"
 
@@ -719,7 +1140,54 @@ class LangGraphTravelAgents:
         agents_logger.info("[AgentRouter] 返回协调员继续决策")
         return "coordinator"
     
-    def run_travel_planning(self, travel_request: Dict[str, Any]) -> Dict[str, Any]:
+    def _initial_state(self, travel_request: Dict[str, Any], deadline: Optional[Deadline] = None) -> TravelPlanState:
+        """根据旅行需求初始化系统状态；未指定截止时间时使用 PLANNING_DEADLINE_SECONDS"""
+        return TravelPlanState(
+            messages=[HumanMessage(content=f"根据以下需求规划旅行: {json.dumps(travel_request, ensure_ascii=False)}")],
+            destination=travel_request.get("destination", ""),
+            duration=travel_request.get("duration", 3),
+            budget_range=travel_request.get("budget_range", "中等预算"),
+            interests=travel_request.get("interests", []),
+            group_size=travel_request.get("group_size", 1),
+            travel_dates=travel_request.get("travel_dates", ""),
+            current_agent="",
+            agent_outputs={},
+            agent_digests={},
+            final_plan={},
+            iteration_count=0,
+            next_agent="",
+            coordinator_prompt_tokens=[],
+            final_synthesis="",
+            deadline=deadline or Deadline.after(config.PLANNING_DEADLINE_SECONDS)
+        )
+
+    def _planning_success(self, final_state: TravelPlanState) -> Dict[str, Any]:
+        """把工作流的最终状态整理为成功结果"""
+        # 编译最终的旅行计划
+        final_plan = self._compile_final_plan(final_state)
+
+        return {
+            "success": True,                                           # 执行成功标志
+            "travel_plan": final_plan,                                # 完整的旅行计划
+            "agent_outputs": final_state.get("agent_outputs", {}),   # 各智能体的输出
+            "total_iterations": final_state.get("iteration_count", 0), # 总迭代次数
+            "planning_complete": True                                  # 规划完成标志
+        }
+
+    @staticmethod
+    def _planning_failure(error: Exception) -> Dict[str, Any]:
+        """错误处理：返回失败结果和错误信息"""
+        return {
+            "success": False,                    # 执行失败标志
+            "error": f"规划过程中出现错误: {str(error)}", # 错误信息
+            "travel_plan": {},                   # 空的旅行计划
+            "agent_outputs": {},                 # 空的智能体输出
+            "total_iterations": 0,               # 迭代次数为0
+            "planning_complete": False           # 规划未完成
+        }
+
+    def run_travel_planning(self, travel_request: Dict[str, Any],
+                            deadline: Optional[Deadline] = None) -> Dict[str, Any]:
         """
         运行完整的多智能体旅行规划工作流
 
@@ -728,6 +1196,7 @@ class LangGraphTravelAgents:
 
         参数：
         - travel_request: 包含旅行需求的字典
+        - deadline: 可选的截止时间，默认从现在起 PLANNING_DEADLINE_SECONDS 秒
 
         返回：包含旅行计划和执行结果的字典
 
@@ -735,50 +1204,101 @@ class LangGraphTravelAgents:
         这个方法展示了如何将复杂的AI系统封装成简单的API，
         用户只需提供需求，系统就能自动协调多个智能体完成规划。
         """
-
-        # 初始化系统状态
-        initial_state = TravelPlanState(
-            messages=[HumanMessage(content=f"根据以下需求规划旅行: {json.dumps(travel_request, ensure_ascii=False)}")],
-            destination=travel_request.get("destination", ""),
-            duration=travel_request.get("duration", 3),
-            budget_range=travel_request.get("budget_range", "中等预算"),
-            interests=travel_request.get("interests", []),
-            group_size=travel_request.get("group_size", 1),
-            travel_dates=travel_request.get("travel_dates", ""),
-            current_agent="",
-            agent_outputs={},
-            final_plan={},
-            iteration_count=0
-        )
-
-        # 执行多智能体工作流
         try:
             # 调用LangGraph工作流图，开始多智能体协作
-            final_state = self.graph.invoke(initial_state)
-
-            # 编译最终的旅行计划
-            final_plan = self._compile_final_plan(final_state)
-
-            # 返回成功结果
-            return {
-                "success": True,                                           # 执行成功标志
-                "travel_plan": final_plan,                                # 完整的旅行计划
-                "agent_outputs": final_state.get("agent_outputs", {}),   # 各智能体的输出
-                "total_iterations": final_state.get("iteration_count", 0), # 总迭代次数
-                "planning_complete": True                                  # 规划完成标志
-            }
+            final_state = self.graph.invoke(self._initial_state(travel_request, deadline))
+            return self._planning_success(final_state)
+        except Exception as e:
+            return self._planning_failure(e)
+
+    @staticmethod
+    def _progress_event(node: str, phase: str, completed_agents: int) -> Dict[str, Any]:
+        """根据节点事件生成进度事件：已完成的专业智能体数 / 专业智能体总数"""
+        return {
+            "node": node,                                            # 工作流节点名称
+            "agent": AGENT_DISPLAY_NAMES.get(node, node),            # 中文显示名称
+            "phase": phase,                                          # start：节点开始执行；end：节点执行完毕
+            "completed_agents": completed_agents,
+            "total_agents": len(SPECIALIST_AGENTS)
+        }
+
+    @staticmethod
+    def _token_event(node: str, message_id: str, text: str) -> Dict[str, Any]:
+        """模型流式输出的一个片段"""
+        return {
+            "node": node,                                            # 正在生成内容的节点
+            "agent": AGENT_DISPLAY_NAMES.get(node, node),            # 中文显示名称
+            "message_id": message_id,                                # 同一次模型调用的片段 message_id 相同
+            "text": text                                             # 新生成的文本片段
+        }
 
+    async def arun_travel_planning(self, travel_request: Dict[str, Any],
+                                   on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                   deadline: Optional[Deadline] = None,
+                                   on_token: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        异步运行完整的多智能体旅行规划工作流
+
+        与 `run_travel_planning` 的输入输出完全相同，但通过 `async_graph.astream_events` 执行，
+        各节点使用 `llm.ainvoke` / `tool.ainvoke`：等待模型响应时让出事件循环，
+        不需要为每个进行中的规划占用一个线程，并发规划数增加时线程数保持不变。
+        任务被取消（例如超时）时会在当前等待点立即停止，而不是让后台线程继续运行。
+
+        参数：
+        - travel_request: 包含旅行需求的字典
+        - on_progress: 可选的进度回调，每个节点开始（phase=start）和结束（phase=end）时
+          以 `_progress_event` 生成的字典调用一次，回调出错不影响规划
+        - deadline: 可选的截止时间，默认从现在起 PLANNING_DEADLINE_SECONDS 秒；
+          调用方的外层超时应略晚于它，让图有机会在截止时间前自行收尾
+        - on_token: 可选的流式输出回调，模型每生成一个片段就以 `_token_event` 生成的字典调用一次，
+          用于把各智能体的回复边生成边推送给前端；同一节点内的第二次模型调用（例如搜索后重新回答）
+          使用新的 message_id，接收方应以新内容替换该节点之前的片段
+
+        适用于大模型技术初级用户：
+        在 FastAPI 等异步框架中应优先使用这个方法，直接 `await` 即可。
+        astream_events 会把图内部的事件逐个交给调用方：节点（chain）开始/结束、模型每生成一个 token
+        （on_chat_model_stream）。节点内的 `llm.ainvoke` 不需要改成 astream——有事件流在监听时，
+        LangChain 会自动以流式方式请求模型，并把完整回复照常返回给节点。
+        """
+        def emit(callback: Optional[Callable[[Dict[str, Any]], None]], event: Dict[str, Any]):
+            if callback is None:
+                return
+            try:
+                callback(event)
+            except Exception as e:
+                agents_logger.warning(f"进度回调执行失败: {e}")
+
+        try:
+            final_state = None
+            completed = set()
+            async for event in self.async_graph.astream_events(
+                self._initial_state(travel_request, deadline), version="v2"
+            ):
+                kind = event["event"]
+                node = event.get("metadata", {}).get("langgraph_node")
+                if kind == "on_chat_model_stream" and node:
+                    text = event["data"]["chunk"].content
+                    if on_token is not None and isinstance(text, str) and text:
+                        emit(on_token, self._token_event(node, event["run_id"], text))
+                elif kind in ("on_chain_start", "on_chain_end") and node not in (None, START) and event["name"] == node:
+                    # 节点本身的事件（节点内部的路由函数、状态写入等子步骤名称不同，忽略；START 是图的输入步骤）
+                    if kind == "on_chain_start":
+                        emit(on_progress, self._progress_event(node, "start", len(completed)))
+                        continue
+                    # 节点的输出是它返回的状态增量，新写入的 agent_outputs 即刚完成的智能体
+                    output = event["data"].get("output")
+                    if isinstance(output, dict):
+                        completed.update(
+                            agent for agent in output.get("agent_outputs") or {} if agent in SPECIALIST_AGENTS
+                        )
+                    emit(on_progress, self._progress_event(node, "end", len(completed)))
+                elif kind == "on_chain_end" and not event.get("parent_ids"):
+                    # 整张图的结束事件，输出为合并后的最终状态
+                    final_state = event["data"].get("output")
+            return self._planning_success(final_state)
         except Exception as e:
-            # 错误处理：返回失败结果和错误信息
-            return {
-                "success": False,                    # 执行失败标志
-                "error": f"规划过程中出现错误: {str(e)}", # 错误信息
-                "travel_plan": {},                   # 空的旅行计划
-                "agent_outputs": {},                 # 空的智能体输出
-                "total_iterations": 0,               # 迭代次数为0
-                "planning_complete": False           # 规划未完成
-            }
-    
+            return self._planning_failure(e)
+
     def _compile_final_plan(self, state: TravelPlanState) -> Dict[str, Any]:
         """
         从所有智能体输出编译最终旅行计划
@@ -808,8 +1328,10 @@ class LangGraphTravelAgents:
             "interests": state.get("interests"),                         # 兴趣爱好
             "planning_method": "LangGraph多智能体协作",                   # 规划方法
             "agent_contributions": {},                                    # 智能体贡献
+            "skipped_agents": [],                                         # 因时间不足跳过或超时的智能体
             "recommendations": {},                                        # 推荐建议
-            "summary": "使用LangGraph框架的多智能体协作生成的旅行计划"      # 计划摘要
+            # 计划摘要：协调员综合的最终建议，没有时（并行模式、llm 策略或综合超时）使用默认描述
+            "summary": state.get("final_synthesis") or "使用LangGraph框架的多智能体协作生成的旅行计划"
         }
 
         # 从每个智能体提取关键信息
@@ -828,6 +1350,12 @@ class LangGraphTravelAgents:
                 "status": output.get("status", "")                       # 执行状态
             }
 
+        # 截止时间前未能完成的智能体（未执行或模型调用超时），方便前端提示方案不完整
+        final_plan["skipped_agents"] = [
+            AGENT_DISPLAY_NAMES[agent] for agent in SPECIALIST_AGENTS
+            if agent_outputs.get(agent, {}).get("status") != "completed"
+        ]
+
         # 生成总结性推荐
         if agent_outputs:
             final_plan["recommendations"] = {
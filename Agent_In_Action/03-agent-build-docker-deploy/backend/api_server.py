@@ -12,27 +12,60 @@ AI旅行规划智能体 - FastAPI后端服务
 4. 提供文件下载服务
 """
 
+import time
+
+# 记录模块导入开始时间，用于检查启动导入耗时是否超出预算
+_IMPORT_STARTED = time.perf_counter()
+
 import sys
 import os
 import asyncio
+import concurrent.futures
 import json
+import math
 import uuid
+from urllib.parse import quote
 from datetime import datetime, timedelta
 import logging
 from pathlib import Path
-from typing import Dict, Any, Optional
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from typing import Dict, Any, List, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from pydantic import BaseModel
 import uvicorn
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from agents.langgraph_agents import LangGraphTravelAgents
-from agents.simple_travel_agent import SimpleTravelAgent, MockTravelAgent
+# 智能体模块依赖 LangChain / LangGraph / OpenAI SDK，导入耗时占服务启动的大部分，
+# 因此在第一次创建规划任务时才导入（见各处函数内的 import），服务可以更快开始接收请求
 from config.langgraph_config import langgraph_config as config
+from config.app_config import (
+    TASK_STORE_BACKEND, TASKS_DB_FILE, TASKS_SNAPSHOT_FILE, TASKS_JOURNAL_FILE, TASKS_JOURNAL_COMPACT_THRESHOLD,
+    CACHE_DURATION_HOURS, MAX_CACHE_SIZE, RESULTS_DIRECTORY, PERSISTENCE_FLUSH_INTERVAL_SECONDS,
+    API_WORKERS, IMPORT_TIME_BUDGET_SECONDS, RESULTS_GZIP_LEVEL,
+    PLANNING_THREAD_POOL_SIZE, LANGGRAPH_TIMEOUT_SECONDS, LANGGRAPH_DEADLINE_GRACE_SECONDS, PLANNING_TASK_TIMEOUT_SECONDS,
+    PLANNING_HEDGE_ENABLED, PLANNING_HEDGE_PERCENTILE, PLANNING_HEDGE_WINDOW_SIZE, PLANNING_HEDGE_MIN_SAMPLES,
+    PLANNING_HEDGE_DEFAULT_SECONDS, PLANNING_HEDGE_MIN_SECONDS,
+    PLANNING_MAX_CONCURRENCY, PLANNING_QUEUE_MAX_SIZE, PLANNING_ESTIMATED_TASK_SECONDS,
+    PLANNING_ABANDON_TIMEOUT_SECONDS, PLANNING_ABANDON_CHECK_INTERVAL_SECONDS,
+    PLANNING_EXECUTION_MODE, PLANNING_JOB_QUEUE_BACKEND, PLANNING_JOBS_DB_FILE, PLANNING_WORKER_PROCESSES,
+    AGENT_WARMUP_ON_STARTUP,
+    PLANNING_STREAM_QUEUE_SIZE, PLANNING_STREAM_POLL_SECONDS, PLANNING_STREAM_HEARTBEAT_SECONDS
+)
+from agents.agent_runtime import AgentRuntime
+from data.job_queue import create_job_queue
+from data.persistence import PersistenceWriter
+from data.result_store import ResultStore
+from data.task_store import (
+    create_task_repository, CachedTaskRepository, TaskQuery, task_version, changed_since, TERMINAL_STATUSES
+)
+from utils.deadline import Deadline
+from utils.hedging import LatencyTracker, hedged_call
+from utils.planning_events import PlanningEventBroker, next_event
+from utils.planning_scheduler import PlanningScheduler, PlanningQueueFull
+from utils.single_flight import SingleFlightGroup, request_fingerprint
 
 # --------------------------- 日志配置 ---------------------------
 def setup_api_logger():
@@ -51,6 +84,18 @@ def setup_api_logger():
 
 api_logger = setup_api_logger()
 
+# --------------------------- 导入耗时预算 ---------------------------
+# 以上是模块的全部导入：智能体依赖推迟到第一次使用时导入，这里的耗时应远低于预算，
+# tests/test_import_time.py 会检查预算，并确认导入本模块时没有加载 LangGraph / LangChain OpenAI
+IMPORT_DURATION_SECONDS = time.perf_counter() - _IMPORT_STARTED
+if IMPORT_DURATION_SECONDS > IMPORT_TIME_BUDGET_SECONDS:
+    api_logger.warning(
+        f"api_server 导入耗时 {IMPORT_DURATION_SECONDS:.3f} 秒，超出预算 {IMPORT_TIME_BUDGET_SECONDS} 秒，"
+        f"请检查是否在模块顶层引入了较重的依赖"
+    )
+else:
+    api_logger.info(f"api_server 导入耗时 {IMPORT_DURATION_SECONDS:.3f} 秒（预算 {IMPORT_TIME_BUDGET_SECONDS} 秒）")
+
 # --------------------------- 应用初始化与全局配置 ---------------------------
 # 创建FastAPI应用，定义对外暴露的基础信息（标题、描述、版本等）
 app = FastAPI(
@@ -68,37 +113,353 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# 全局字典，用于缓存当前所有规划任务的实时状态
-planning_tasks: Dict[str, Dict[str, Any]] = {}
-
-# 任务状态持久化文件路径，重启服务后可恢复未完成/历史任务状态
-TASKS_FILE = "tasks_state.json"
+# 后台持久化写线程：任务状态与结果文件都在这里落盘，按任务合并突发的连续更新，
+# 异步处理函数只需提交写入，不会被磁盘 I/O 阻塞
+persistence_writer = PersistenceWriter(flush_interval=PERSISTENCE_FLUSH_INTERVAL_SECONDS)
+
+# 规划结果文件存储，完成任务的完整结果只保存在 results/ 目录中
+result_store = ResultStore(RESULTS_DIRECTORY, compress_level=RESULTS_GZIP_LEVEL)
+
+# 任务仓库，保存所有规划任务的实时状态；每次更新只写入变化的任务并持久化，
+# 重启服务后可恢复未完成/历史任务状态。后端由 TASK_STORE_BACKEND 配置（sqlite / journal），
+# 外层是大小与存活时间有上限的 LRU 热缓存，结果按需从 results/ 文件懒加载。
+# 多 worker 部署（API_WORKERS > 1）时各进程共用 SQLite 数据库，缓存以 shared 模式运行，
+# 任一 worker 都能查询到其他 worker 创建和更新的任务；journal 后端的数据只在单个进程内存中，不能共享。
+# worker 执行模式（PLANNING_EXECUTION_MODE=worker）下任务由独立的规划 worker 进程执行并更新，同样需要共享
+if PLANNING_EXECUTION_MODE not in ("inprocess", "worker"):
+    raise RuntimeError(f"未知的规划任务执行模式: {PLANNING_EXECUTION_MODE}（可选 inprocess / worker）")
+WORKER_MODE = PLANNING_EXECUTION_MODE == "worker"
+# 本进程是否执行规划任务：inprocess 模式下的 API 进程、worker 模式下的规划 worker 进程执行任务，
+# worker 模式下的 API 进程只创建任务（规划 worker 在导入本模块前设置 PLANNING_PROCESS_ROLE=worker）
+EXECUTES_PLANNING = not WORKER_MODE or os.getenv("PLANNING_PROCESS_ROLE") == "worker"
+
+if (API_WORKERS > 1 or WORKER_MODE) and TASK_STORE_BACKEND != "sqlite":
+    raise RuntimeError("API_WORKERS > 1 或 worker 执行模式下必须使用 sqlite 任务存储后端（TASK_STORE_BACKEND=sqlite）")
+
+task_repo = CachedTaskRepository(
+    create_task_repository(
+        backend=TASK_STORE_BACKEND,
+        db_path=TASKS_DB_FILE,
+        snapshot_path=TASKS_SNAPSHOT_FILE,
+        journal_path=TASKS_JOURNAL_FILE,
+        compact_threshold=TASKS_JOURNAL_COMPACT_THRESHOLD
+    ),
+    result_store,
+    max_size=MAX_CACHE_SIZE,
+    ttl_seconds=CACHE_DURATION_HOURS * 3600,
+    writer=persistence_writer,
+    shared=API_WORKERS > 1 or WORKER_MODE,
+    executes_tasks=EXECUTES_PLANNING
+)
 
 # --------------------------- 任务状态持久化工具函数 ---------------------------
-def save_tasks_state():
-    """保存任务状态到文件"""
+def load_tasks_state():
+    """初始化任务仓库并恢复历史任务状态"""
     try:
-        with open(TASKS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(planning_tasks, f, ensure_ascii=False, indent=2, default=str)
+        task_repo.load()
+        api_logger.info(f"任务仓库({TASK_STORE_BACKEND})已加载 {task_repo.count()} 个任务状态")
     except Exception as e:
-        api_logger.error(f"保存任务状态失败: {e}")
+        api_logger.error(f"加载任务状态失败: {e}")
+
+# 规划线程池：同步的智能体初始化与推理调用在这里执行，事件循环通过 await 等待结果，
+# 因此规划运行期间 /health、/status、/chat 等接口不会被阻塞。整个进程共用一个线程池，
+# 不再为每个任务临时创建线程池（`with ThreadPoolExecutor()` 退出时会同步等待线程结束）
+planning_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=PLANNING_THREAD_POOL_SIZE,
+    thread_name_prefix="planning"
+)
+
+async def run_in_planning_executor(func, *args):
+    """在规划线程池中执行同步函数，并在事件循环中异步等待其返回"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(planning_executor, func, *args)
+
+# 进程内共享的智能体运行时：多智能体系统（模型客户端 + 编译好的工作流图）、简化智能体与 /chat 的模型客户端
+# 只创建一次，所有任务复用；每个任务的状态只通过图的输入传递。服务启动时在后台线程中预热
+agent_runtime = AgentRuntime()
+
+async def get_langgraph_agents():
+    """获取共享的 LangGraph 多智能体系统；尚未创建时（导入依赖、编译工作流图）在线程池中完成，不阻塞事件循环"""
+    if not agent_runtime.ready:
+        await run_in_planning_executor(agent_runtime.langgraph_agents)
+    return agent_runtime.langgraph_agents()
+
+def run_simple_agent(travel_request: Dict[str, Any]) -> Dict[str, Any]:
+    """使用共享的简化智能体执行规划（同步函数，需在线程池中执行）"""
+    return agent_runtime.simple_agent().run_travel_planning(travel_request)
+
+# 规划任务调度器：/plan、/simple-plan、/chat 创建的任务都在这里排队，
+# 同时最多执行 PLANNING_MAX_CONCURRENCY 个，排队已满时接口返回 429，调用方按 Retry-After 稍后重试
+planning_scheduler = PlanningScheduler(
+    workers=PLANNING_MAX_CONCURRENCY,
+    max_queue=PLANNING_QUEUE_MAX_SIZE,
+    estimated_job_seconds=PLANNING_ESTIMATED_TASK_SECONDS
+)
+
+def queue_full_error(retry_after: int) -> HTTPException:
+    """规划队列已满时返回给客户端的 429 错误"""
+    return HTTPException(
+        status_code=429,
+        detail=f"规划任务较多，请 {retry_after} 秒后重试",
+        headers={"Retry-After": str(retry_after)}
+    )
+
+# worker 执行模式下的持久化作业队列：API 只写入作业，由 `python -m planning_worker` 启动的 worker 进程领取执行。
+# API 进程崩溃或重启不会丢失排队中/执行中的任务，worker 进程崩溃后作业在租约到期后被重新领取
+job_queue = create_job_queue(PLANNING_JOB_QUEUE_BACKEND, PLANNING_JOBS_DB_FILE) if WORKER_MODE else None
+
+# 进行中的相同规划请求合并为一次运行（single-flight），重复请求各自拥有任务 ID，但共享同一次运行的进度与结果。
+# inprocess 模式下登记表在本进程内存中，多 worker 部署时只合并落到同一进程的请求；
+# worker 模式下成员记录保存在作业队列中，所有 API 进程与规划 worker 进程共享
+single_flight = job_queue if WORKER_MODE else SingleFlightGroup()
+
+# 规划事件（节点开始/结束、模型 token）按 run_id 分发给 /plan/{task_id}/stream 与 /ws/plan/{task_id} 的订阅者；
+# 只在执行该运行的进程内分发，其他进程的订阅者只能收到从任务仓库读取的状态变化
+planning_events = PlanningEventBroker(queue_size=PLANNING_STREAM_QUEUE_SIZE)
+
+def planning_queue_full() -> bool:
+    """规划队列是否已满（worker 模式下按作业队列中等待执行的作业数判断）"""
+    if job_queue is not None:
+        return job_queue.pending_count() >= PLANNING_QUEUE_MAX_SIZE
+    return planning_scheduler.is_full()
+
+def planning_retry_after() -> int:
+    """
+    队列已满时建议客户端等待的秒数
+
+    inprocess 模式由本进程的调度器按最近的任务耗时估算。worker 模式下本进程的调度器不执行任务，
+    按作业队列中等待的作业数估算：所有 worker 进程合计同时执行 PLANNING_MAX_CONCURRENCY × PLANNING_WORKER_PROCESSES 个作业，
+    平均每 (单作业耗时 / 总并发数) 秒领取一个等待中的作业，队列降到上限以下需要领取 (等待数 - 上限 + 1) 个。
+    """
+    if job_queue is None:
+        return planning_scheduler.retry_after()
+    workers = max(1, PLANNING_MAX_CONCURRENCY * PLANNING_WORKER_PROCESSES)
+    backlog = max(1, job_queue.pending_count() - PLANNING_QUEUE_MAX_SIZE + 1)
+    return max(1, math.ceil(backlog * PLANNING_ESTIMATED_TASK_SECONDS / workers))
+
+def planning_queue_position(run_id: str) -> Optional[int]:
+    """运行的排队位置，已开始执行时为 None"""
+    if job_queue is not None:
+        return job_queue.position(run_id)
+    return planning_scheduler.position(run_id)
+
+def enqueue_planning_job(task: Dict[str, Any], kind: str, payload: Dict[str, Any],
+                         fingerprint: Optional[str] = None) -> Tuple[str, Optional[int]]:
+    """
+    worker 模式：写入任务记录后把作业提交到持久化作业队列，返回 (run_id, 排队位置)
+
+    任务记录必须先于作业落盘，规划 worker 领取作业时才能找到它。与进行中的相同请求合并时
+    不受队列上限限制；队列上限按提交前的等待作业数判断，多个 API 进程同时提交时可能略微超出。
+    合并进来的任务记录先保持 queued 状态，运行的下一个进度事件会同步它的进度。
+    """
+    task_id = task["task_id"]
+    if (fingerprint is None or job_queue.run_for(fingerprint) is None) and planning_queue_full():
+        retry_after = planning_retry_after()
+        api_logger.warning(f"规划作业队列已满，拒绝任务 {task_id}，Retry-After: {retry_after} 秒")
+        raise queue_full_error(retry_after)
+
+    task_repo.create({**task, "status": "queued", "progress": 0})
+    try:
+        run_id = job_queue.submit(task_id, kind, payload, fingerprint)
+    except Exception:
+        task_repo.update(task_id, status="failed", message="提交规划作业失败，请重新提交")
+        raise
+    if run_id != task_id:
+        api_logger.info(f"任务 {task_id} 与进行中的任务 {run_id} 请求相同，合并执行")
+    touch_task(task_id)
+    return run_id, job_queue.position(run_id)
+
+def enqueue_planning_task(task: Dict[str, Any], kind: str, payload: Dict[str, Any],
+                          fingerprint: Optional[str] = None) -> Tuple[str, Optional[int]]:
+    """
+    把规划任务加入调度队列并写入任务记录，返回 (run_id, 排队位置)
+
+    kind 是 `PLANNING_JOB_RUNNERS` 中的作业类型，payload 为传给它的旅行请求；worker 模式下转交
+    `enqueue_planning_job` 写入持久化作业队列，否则提交给本进程的规划调度器。
+
+    先提交到调度器（队列已满时抛出 429），再创建状态为 queued 的任务记录；两步之间没有 await，
+    worker 不会在任务记录写入之前开始执行。任务记录写入失败时从队列中撤回任务。
+
+    传入 fingerprint 时启用请求合并：相同指纹的运行正在进行时，不再提交新的运行，
+    只创建一个复制当前运行状态的任务记录并加入该运行，返回的 run_id 与任务 ID 不同；
+    运行已开始执行时排队位置为 None。
+    """
+    if job_queue is not None:
+        return enqueue_planning_job(task, kind, payload, fingerprint)
+
+    task_id = task["task_id"]
+    if fingerprint is not None:
+        run_id = single_flight.attach(fingerprint, task_id)
+        if run_id is not None:
+            try:
+                run_task = task_repo.get(run_id) or {}
+                task_repo.create({
+                    **task,
+                    "status": run_task.get("status", "queued"),
+                    "progress": run_task.get("progress", 0),
+                    "current_agent": run_task.get("current_agent", task["current_agent"]),
+                    "message": run_task.get("message", task["message"]),
+                    "shared_run_id": run_id  # 实际执行规划的运行（第一个相同请求的任务 ID）
+                })
+            except Exception:
+                single_flight.detach(task_id)
+                raise
+            touch_task(task_id)
+            api_logger.info(f"任务 {task_id} 与进行中的任务 {run_id} 请求相同，合并执行")
+            return run_id, planning_scheduler.position(run_id)
+
+    async def job():
+        try:
+            await PLANNING_JOB_RUNNERS[kind](task_id, payload)
+        finally:
+            if fingerprint is not None:
+                single_flight.close(task_id)
+            planning_events.close(task_id)
 
-def load_tasks_state():
-    """从文件加载任务状态"""
-    global planning_tasks
     try:
-        if os.path.exists(TASKS_FILE):
-            with open(TASKS_FILE, 'r', encoding='utf-8') as f:
-                planning_tasks = json.load(f)
-            api_logger.info(f"已加载 {len(planning_tasks)} 个任务状态")
+        position = planning_scheduler.submit(task_id, job)
+    except PlanningQueueFull as e:
+        api_logger.warning(f"规划队列已满，拒绝任务 {task_id}，Retry-After: {e.retry_after} 秒")
+        raise queue_full_error(e.retry_after)
+
+    try:
+        task_repo.create({**task, "status": "queued", "progress": 0})
+    except Exception:
+        planning_scheduler.discard(task_id)
+        raise
+    if fingerprint is not None:
+        single_flight.open(fingerprint, task_id)
+    touch_task(task_id)
+    return task_id, position
+
+def active_run_members(run_id: str) -> List[str]:
+    """
+    运行中仍在等待结果的成员任务
+
+    已取消的成员（包括在其他 worker 进程中被取消的）退出运行，之后的进度与结果不再写入它们；
+    返回空列表表示所有成员都已取消，运行可以停止。
+    """
+    members = []
+    for task_id in single_flight.members(run_id):
+        if task_repo.cancellation_requested(task_id):
+            single_flight.detach(task_id)
         else:
-            api_logger.info("任务状态文件不存在，使用空状态")
-    except Exception as e:
-        api_logger.error(f"加载任务状态失败: {e}")
-        planning_tasks = {}
+            members.append(task_id)
+    return members
+
+def update_run(run_id: str, **fields):
+    """
+    把一次规划运行的状态变化写入它的所有成员任务
 
-# 启动时加载任务状态
-load_tasks_state()
+    写入最终状态（completed / failed / cancelled）之前先封闭运行，相同的新请求不再加入而是重新规划：
+    worker 模式下最终状态写入后、作业删除前，其他 API 进程仍可能提交相同请求，
+    如果这时加入运行，它既收不到最终状态，成员记录又随作业一起删除，会一直停留在 queued。
+    """
+    if fields.get("status") in TERMINAL_STATUSES:
+        single_flight.seal(run_id)
+    for task_id in active_run_members(run_id):
+        task_repo.update(task_id, **fields)
+
+def cancel_planning_task(task_id: str, message: str) -> Optional[Dict[str, Any]]:
+    """
+    取消规划任务：先把任务标记为 cancelled，再让调度器停止它
+
+    本进程中排队的任务直接移出队列，执行中的任务在当前 await 处收到 CancelledError，
+    正在等待的 LLM 请求、工具调用和 MCP 子进程随之关闭；已在线程池中运行的同步调用（简化智能体、
+    同步搜索工具）无法中途打断，会在后台跑完，但结果被丢弃，任务状态也不会再被改写。
+    多 worker 部署时任务可能由其他进程执行，该进程在下一个智能体节点开始或结束时发现取消状态并停止。
+    合并执行的任务被取消时只退出所在的运行，其他相同请求的任务不受影响；最后一个成员退出后运行才会停止。
+    """
+    task = task_repo.mark_cancelled(task_id, message)
+    if task is not None:
+        task_last_seen.pop(task_id, None)
+        run_id, remaining = single_flight.detach(task_id)
+        if remaining > 0:
+            api_logger.info(f"任务 {task_id} 已取消，运行 {run_id} 仍有 {remaining} 个任务等待结果，继续执行: {message}")
+            return task
+        if job_queue is not None:
+            # 删除作业：排队中的不会再被领取，执行中的 worker 下一次续约失败时停止运行
+            removed = job_queue.cancel(run_id)
+            api_logger.info(f"任务 {task_id} 已取消（{'已从作业队列移除' if removed else '作业已结束'}）: {message}")
+            return task
+        stopped = planning_scheduler.cancel(run_id)
+        api_logger.info(f"任务 {task_id} 已取消（{'本进程已停止执行' if stopped else '不在本进程中执行'}）: {message}")
+    return task
+
+# --------------------------- 被放弃任务的自动取消 ---------------------------
+# 每个任务最近一次被客户端查询的时间（time.monotonic()）；只记录本进程调度器中的任务，定期清理
+task_last_seen: Dict[str, float] = {}
+
+# 查询记录只在本进程内存中，多 worker 部署时客户端的查询可能落到其他进程，因此只在单进程时自动取消
+ABANDON_TIMEOUT_SECONDS = PLANNING_ABANDON_TIMEOUT_SECONDS if API_WORKERS == 1 else 0
+
+def touch_task(task_id: str):
+    """记录客户端仍在关注该任务"""
+    task_last_seen[task_id] = time.monotonic()
+
+async def reap_abandoned_tasks():
+    """
+    定期取消被客户端放弃的任务
+
+    前端在规划期间每隔几秒查询一次 `/status`；用户关闭页面或重复提交后旧任务不再被查询，
+    超过 ABANDON_TIMEOUT_SECONDS 没有查询的排队中/执行中任务会被自动取消，把名额让给新的任务。
+    """
+    while True:
+        await asyncio.sleep(PLANNING_ABANDON_CHECK_INTERVAL_SECONDS)
+        now = time.monotonic()
+        active = set(job_queue.task_ids() if job_queue is not None else planning_scheduler.task_ids())
+        for task_id in list(task_last_seen):
+            if single_flight.run_of(task_id) not in active:
+                del task_last_seen[task_id]
+            elif now - task_last_seen[task_id] > ABANDON_TIMEOUT_SECONDS:
+                cancel_planning_task(task_id, "长时间未查询任务进度，任务已自动取消")
+
+abandoned_task_reaper: Optional[asyncio.Task] = None
+
+@app.on_event("startup")
+def startup_load_tasks_state():
+    """服务启动时（而不是模块导入时）初始化任务仓库；只读取索引，耗时不随历史任务数量和结果体积增长"""
+    started = time.perf_counter()
+    load_tasks_state()
+    api_logger.info(f"任务状态加载耗时 {time.perf_counter() - started:.3f} 秒")
+
+@app.on_event("startup")
+def warm_up_agent_runtime():
+    """
+    在规划线程池中预热智能体运行时（导入依赖、创建模型客户端、编译工作流图），不阻塞服务开始接收请求
+
+    worker 模式下规划由独立的 worker 进程执行，API 进程只预热 /chat 使用的模型客户端。
+    """
+    if AGENT_WARMUP_ON_STARTUP:
+        planning_executor.submit(agent_runtime.warm_up, not WORKER_MODE)
+
+@app.on_event("startup")
+def start_planning_scheduler():
+    """启动规划调度器的 worker 协程（worker 模式下改为初始化作业队列）与被放弃任务的检查协程"""
+    global abandoned_task_reaper
+    if job_queue is not None:
+        job_queue.load()
+    else:
+        planning_scheduler.start()
+    if ABANDON_TIMEOUT_SECONDS > 0:
+        abandoned_task_reaper = asyncio.get_running_loop().create_task(reap_abandoned_tasks())
+
+@app.on_event("shutdown")
+async def stop_planning_scheduler():
+    """停止调度器；排队中和执行中的任务无法完成，标记为失败，避免客户端一直轮询"""
+    if abandoned_task_reaper is not None:
+        abandoned_task_reaper.cancel()
+    for run_id in await planning_scheduler.stop():
+        update_run(run_id, status="failed", message="服务已停止，任务未完成，请重新提交")
+
+@app.on_event("shutdown")
+def flush_task_state():
+    """服务关闭时把后台写线程中尚未落盘的任务状态全部写完"""
+    planning_executor.shutdown(wait=False, cancel_futures=True)
+    if job_queue is not None:
+        job_queue.close()
+    task_repo.close()
+    persistence_writer.close()
 
 # --------------------------- 数据模型定义 ---------------------------
 class TravelRequest(BaseModel):
@@ -150,13 +511,36 @@ class PlanningResponse(BaseModel):
     message: str
 
 class PlanningStatus(BaseModel):
-    """规划状态模型"""
+    """
+    规划状态模型（轻量）
+
+    只包含进度信息与结果的大小/摘要，不携带结果本身，无论规划结果多大，每次轮询都只有几百字节；
+    完整结果通过 `/result/{task_id}` 单独获取。
+    """
     task_id: str
     status: str
     progress: int
     current_agent: str
     message: str
-    result: Optional[Dict[str, Any]] = None
+    result_available: bool = False       # 结果是否已生成
+    result_size: Optional[int] = None    # 结果文件字节数
+    result_hash: Optional[str] = None    # 结果文件 SHA-256，同时是 `/result/{task_id}` 的 ETag
+    queue_position: Optional[int] = None # 排队位置（1 表示下一个执行），不在队列中时为空
+    version: int = 1  # 任务状态版本号，每次状态字段变化时加 1
+
+class PlanningStatusDelta(BaseModel):
+    """增量状态模型：`?since=<version>` 查询时只包含该版本之后变化过的字段"""
+    task_id: str
+    version: int
+    delta: bool = True
+    status: Optional[str] = None
+    progress: Optional[int] = None
+    current_agent: Optional[str] = None
+    message: Optional[str] = None
+    result_available: Optional[bool] = None
+    result_size: Optional[int] = None
+    result_hash: Optional[str] = None
+    queue_position: Optional[int] = None
 
 class ChatRequest(BaseModel):
     """自然语言交互请求模型"""
@@ -199,7 +583,9 @@ async def root():
             "chat": "/chat - 自然语言交互",
             "plan": "/plan - 创建旅行规划",
             "status": "/status/{task_id} - 查询任务状态",
+            "stream": "/plan/{task_id}/stream（SSE）或 /ws/plan/{task_id}（WebSocket）- 实时接收智能体输出",
             "download": "/download/{task_id} - 下载结果",
+            "cancel": "DELETE /tasks/{task_id} - 取消任务",
             "docs": "/docs - API文档"
         }
     }
@@ -218,10 +604,10 @@ async def health_check():
                 "timestamp": datetime.now().isoformat()
             }
         
-        # 检查系统资源
+        # 检查系统资源（interval=None 返回距上次调用以来的 CPU 占用，不会阻塞事件循环）
         import psutil
         memory_info = psutil.virtual_memory()
-        cpu_percent = psutil.cpu_percent(interval=1)
+        cpu_percent = psutil.cpu_percent(interval=None)
         
         return {
             "status": "healthy",
@@ -232,7 +618,13 @@ async def health_check():
                 "memory_usage": f"{memory_info.percent}%",
                 "memory_available": f"{memory_info.available / 1024 / 1024 / 1024:.1f}GB"
             },
-            "active_tasks": len(planning_tasks),
+            "active_tasks": task_repo.count(),
+            "execution_mode": PLANNING_EXECUTION_MODE,
+            "planning_queue": job_queue.stats() if job_queue is not None else planning_scheduler.stats(),
+            "merged_runs": single_flight.stats(),
+            "planning_streams": planning_events.stats(),
+            "hedging": {"enabled": PLANNING_HEDGE_ENABLED, **planning_latency.stats()},
+            "agent_runtime": agent_runtime.stats(),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
@@ -244,48 +636,153 @@ async def health_check():
         }
 
 # --------------------------- 异步执行核心任务 ---------------------------
+# 多智能体运行期间的进度区间：0 表示尚未开始，100 只在结果保存后写入
+PLANNING_PROGRESS_FLOOR = 5
+PLANNING_PROGRESS_CEILING = 95
+
+def planning_progress_reporter(task_id: str):
+    """
+    生成 `arun_travel_planning` 的进度回调
+
+    进度按已完成的专业智能体数线性映射到 [PLANNING_PROGRESS_FLOOR, PLANNING_PROGRESS_CEILING]，
+    current_agent 为正在执行的节点；状态未变化时 task_repo.update 不产生写入。
+
+    进度写入运行的所有成员任务（合并执行的相同请求），并作为 node_start / node_end 事件发布给流式接口的订阅者。
+    每个节点事件同时检查成员是否都已被取消
+    （多 worker 部署时取消请求可能由其他进程写入），是则取消当前协程，图在下一个 await 处停止。
+    """
+    def on_progress(event: Dict[str, Any]):
+        members = active_run_members(task_id)
+        if not members:
+            asyncio.current_task().cancel()
+            return
+        completed, total = event["completed_agents"], event["total_agents"]
+        progress = PLANNING_PROGRESS_FLOOR + (PLANNING_PROGRESS_CEILING - PLANNING_PROGRESS_FLOOR) * completed // total
+        if event["phase"] == "start":
+            message = f"{event['agent']}正在工作...（已完成 {completed}/{total} 位专家）"
+        else:
+            message = f"{event['agent']}已完成（已完成 {completed}/{total} 位专家）"
+        for member_id in members:
+            task_repo.update(member_id, progress=progress, current_agent=event["agent"], message=message)
+        planning_events.publish(task_id, {"type": f"node_{event['phase']}", **event, "progress": progress})
+    return on_progress
+
+def planning_token_publisher(task_id: str):
+    """生成 `arun_travel_planning` 的 token 回调：把各智能体生成的文本片段发布给流式接口的订阅者"""
+    def on_token(event: Dict[str, Any]):
+        planning_events.publish(task_id, {"type": "token", **event})
+    return on_token
+
+def build_langgraph_request(travel_request: Dict[str, Any]) -> Dict[str, Any]:
+    """把 API 的旅行请求转换为 LangGraph 智能体使用的标准化请求（也用于计算请求合并的指纹）"""
+    return {
+        "destination": travel_request["destination"],
+        "duration": travel_request.get("duration", 7),
+        "budget_range": travel_request["budget_range"],
+        "interests": travel_request["interests"],
+        "group_size": travel_request["group_size"],
+        "travel_dates": f"{travel_request['start_date']} 至 {travel_request['end_date']}"
+    }
+
+# 多智能体规划耗时统计（本进程内），对冲等待时间取最近运行耗时的 p95，且不超过 LangGraph 超时时间
+planning_latency = LatencyTracker(
+    window=PLANNING_HEDGE_WINDOW_SIZE,
+    percentile=PLANNING_HEDGE_PERCENTILE,
+    min_samples=PLANNING_HEDGE_MIN_SAMPLES,
+    default_seconds=PLANNING_HEDGE_DEFAULT_SECONDS,
+    min_seconds=PLANNING_HEDGE_MIN_SECONDS,
+    max_seconds=LANGGRAPH_TIMEOUT_SECONDS
+)
+
+# 对冲胜出的简化方案在 travel_plan.planning_method 中使用的标记
+HEDGED_PLANNING_METHOD = "简化版AI规划（多智能体规划耗时过长，对冲返回）"
+
+async def run_hedged_planning(task_id: str, travel_agents, langgraph_request: Dict[str, Any],
+                              deadline: Deadline) -> Dict[str, Any]:
+    """
+    执行多智能体规划，耗时超过对冲等待时间后同时运行简化智能体，返回先成功的结果
+
+    多智能体图的截止时间为任务截止时间 deadline 与 LANGGRAPH_TIMEOUT_SECONDS 中较早的一个，
+    图中每次模型/工具调用只使用剩余时间，时间不足时跳过可选智能体，在截止时间前返回已完成的部分；
+    外层 asyncio.wait_for 在截止时间后再等 LANGGRAPH_DEADLINE_GRACE_SECONDS 秒，只作为兜底。
+    超过 `planning_latency.threshold()`（最近运行耗时的 p95）
+    仍未完成时启动简化智能体，但多智能体图继续运行，先成功的一方胜出：
+    - 多智能体先完成：结果与不对冲时相同，简化智能体的结果被丢弃（线程池中的同步调用无法中途打断）
+    - 简化智能体先完成：多智能体图被取消，结果的 planning_method 标记为 HEDGED_PLANNING_METHOD
+    两者都失败时抛出多智能体的异常（或返回其失败结果），由调用方按原有逻辑降级。
+    """
+    started = time.monotonic()
+    graph_deadline = deadline.sooner(LANGGRAPH_TIMEOUT_SECONDS)
+    langgraph_run = asyncio.wait_for(
+        travel_agents.arun_travel_planning(
+            langgraph_request,
+            on_progress=planning_progress_reporter(task_id),
+            on_token=planning_token_publisher(task_id),
+            deadline=graph_deadline
+        ),
+        timeout=graph_deadline.remaining() + LANGGRAPH_DEADLINE_GRACE_SECONDS
+    )
+    if not PLANNING_HEDGE_ENABLED:
+        result, hedged = await langgraph_run, False
+    else:
+        delay = planning_latency.threshold()
+
+        def on_hedge():
+            planning_latency.hedged += 1
+            api_logger.info(f"任务 {task_id}: LangGraph 超过 {delay:.0f} 秒未完成，同时启动简化智能体")
+            update_run(task_id, message="多智能体规划耗时较长，同时准备简化方案...")
+
+        result, hedged = await hedged_call(
+            langgraph_run,
+            lambda: run_in_planning_executor(run_simple_agent, langgraph_request),
+            delay=delay,
+            accept=lambda r: bool(r.get("success")),
+            on_hedge=on_hedge
+        )
+
+    if hedged:
+        planning_latency.hedge_wins += 1
+        result["travel_plan"]["planning_method"] = HEDGED_PLANNING_METHOD
+        api_logger.info(f"任务 {task_id}: 简化智能体先完成，采用简化方案")
+    elif result.get("success"):
+        planning_latency.record(time.monotonic() - started)
+    return result
+
 async def run_planning_task(task_id: str, travel_request: Dict[str, Any]):
     """
     异步执行旅行规划任务
 
     后台协程负责整个 LangGraph 多智能体推理流程，核心步骤如下：
-        1. 更新任务状态进度条，并构造 LangGraph 所需的标准化请求 `langgraph_request`；
-        2. 在异步上下文中调用 `LangGraphTravelAgents`，通过线程池避免阻塞事件循环；
-        3. 设定超时与异常回退策略：若 LangGraph 超时或执行失败，则自动降级至 SimpleTravelAgent；
+        1. 标记任务开始执行，并构造 LangGraph 所需的标准化请求 `langgraph_request`；
+        2. 获取进程内共享的 `LangGraphTravelAgents`（只在首次使用时于线程池中创建），再 `await arun_travel_planning()` 以原生异步方式运行多智能体图，
+           规划期间不占用线程，超时后可立即取消；进度与当前智能体由图的节点事件实时更新（见 `planning_progress_reporter`）；
+        3. 设定超时与异常回退策略：耗时超过最近运行的 p95 时并行启动 SimpleTravelAgent 对冲，先成功的结果胜出；
+           若 LangGraph 超时或执行失败，则自动降级至 SimpleTravelAgent；
         4. 规划成功后保存结果、写入文件；若失败或异常，则返回简化方案并记录错误信息。
 
-    该函数不会阻塞 API 响应，由 `BackgroundTasks` 在后台运行，确保接口响应迅速。
+    该函数不会阻塞 API 响应，由规划调度器 `planning_scheduler` 的 worker 在后台运行，确保接口响应迅速；
+    worker 执行模式下则由独立的规划 worker 进程（`planning_worker.py`）领取作业后调用。
+    task_id 同时是这次运行的 run_id，状态通过 `update_run` 写入所有合并进来的相同请求任务。
     """
+    if not active_run_members(task_id):
+        api_logger.info(f"任务 {task_id} 在排队期间已被取消，跳过执行")
+        return
+
+    # 任务的截止时间从真正开始执行时计算，随请求一路传给多智能体图中的每个节点和工具
+    task_deadline = Deadline.after(PLANNING_TASK_TIMEOUT_SECONDS)
     try:
         api_logger.info(f"开始执行任务 {task_id} | 请求: {json.dumps(travel_request, ensure_ascii=False)}")
         
-        # 更新任务状态
-        planning_tasks[task_id]["status"] = "processing"
-        planning_tasks[task_id]["progress"] = 10
-        planning_tasks[task_id]["message"] = "正在初始化AI旅行规划智能体..."
-        
-        # 模拟处理时间，避免立即完成
-        await asyncio.sleep(1)
-        
-        planning_tasks[task_id]["progress"] = 30
-        planning_tasks[task_id]["message"] = "多智能体系统已启动，开始协作规划..."
-        
-        await asyncio.sleep(1)
+        # 更新任务状态：从这里开始就是真实的规划工作，之后的进度由智能体节点事件驱动
+        update_run(
+            task_id,
+            status="processing",
+            current_agent="系统初始化",
+            message="正在初始化AI旅行规划智能体..."
+        )
         
         # 转换请求格式
-        langgraph_request = {
-            "destination": travel_request["destination"],
-            "duration": travel_request.get("duration", 7),
-            "budget_range": travel_request["budget_range"],
-            "interests": travel_request["interests"],
-            "group_size": travel_request["group_size"],
-            "travel_dates": f"{travel_request['start_date']} 至 {travel_request['end_date']}"
-        }
-        
-        planning_tasks[task_id]["progress"] = 50
-        planning_tasks[task_id]["message"] = "智能体团队正在协作分析..."
-        
-        await asyncio.sleep(1)
+        langgraph_request = build_langgraph_request(travel_request)
         
         api_logger.info(f"任务 {task_id}: 开始LangGraph处理")
         
@@ -293,51 +790,41 @@ async def run_planning_task(task_id: str, travel_request: Dict[str, Any]):
             # 使用asyncio.wait_for添加超时控制
             async def run_langgraph():
                 """封装 LangGraph 智能体执行流程，便于统一超时处理"""
-                # 初始化AI旅行规划智能体
-                api_logger.info(f"任务 {task_id}: 初始化AI旅行规划智能体")
-                planning_tasks[task_id]["progress"] = 50
-                planning_tasks[task_id]["message"] = "初始化AI旅行规划智能体..."
+                # 获取共享的AI旅行规划智能体（服务启动时已预热，通常无需等待）
+                api_logger.info(f"任务 {task_id}: 获取AI旅行规划智能体")
 
                 try:
-                    travel_agents = LangGraphTravelAgents()
-                    api_logger.info(f"任务 {task_id}: AI旅行规划智能体初始化完成")
-
-                    planning_tasks[task_id]["progress"] = 60
-                    planning_tasks[task_id]["message"] = "开始多智能体协作..."
+                    travel_agents = await get_langgraph_agents()
+                    api_logger.info(f"任务 {task_id}: AI旅行规划智能体已就绪")
 
                     api_logger.info(f"任务 {task_id}: 执行旅行规划")
-                    # 在线程池中执行规划，避免阻塞
-                    import concurrent.futures
-
-                    def run_planning():
-                        """在线程池中实际执行多智能体规划，保持事件循环顺畅"""
-                        return travel_agents.run_travel_planning(langgraph_request)
-
-                    # 使用线程池执行，设置超时
-                    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
-                        future = executor.submit(run_planning)
-                        try:
-                            # 等待最多4分钟
-                            result = future.result(timeout=240)
-                            api_logger.info(f"任务 {task_id}: LangGraph执行完成，结果: {result.get('success', False)}")
-                            return result
-                        except concurrent.futures.TimeoutError:
-                            api_logger.warning(f"任务 {task_id}: LangGraph执行超时，尝试使用简化版本")
-                            planning_tasks[task_id]["progress"] = 80
-                            planning_tasks[task_id]["message"] = "LangGraph超时，使用简化版本..."
-
-                            # 使用简化版本作为备选方案
-                            simple_agent = SimpleTravelAgent()
-                            return simple_agent.run_travel_planning(langgraph_request)
-
-                        except Exception as e:
-                            api_logger.error(f"任务 {task_id}: LangGraph执行异常: {str(e)}，尝试使用简化版本")
-                            planning_tasks[task_id]["progress"] = 80
-                            planning_tasks[task_id]["message"] = "LangGraph异常，使用简化版本..."
-
-                            # 使用简化版本作为备选方案
-                            simple_agent = SimpleTravelAgent()
-                            return simple_agent.run_travel_planning(langgraph_request)
+                    try:
+                        # 原生异步执行多智能体图（llm.ainvoke），图在截止时间前自行收尾，兜底超时后取消；
+                        # 耗时超过最近运行的 p95 时同时启动简化智能体，先成功的结果胜出
+                        result = await run_hedged_planning(task_id, travel_agents, langgraph_request, task_deadline)
+                        api_logger.info(f"任务 {task_id}: LangGraph执行完成，结果: {result.get('success', False)}")
+                        return result
+                    except asyncio.TimeoutError:
+                        api_logger.warning(f"任务 {task_id}: LangGraph执行超时，尝试使用简化版本")
+                        update_run(
+                            task_id,
+                            current_agent="简化智能体",
+                            message="LangGraph超时，使用简化版本..."
+                        )
+
+                        # 使用简化版本作为备选方案
+                        return await run_in_planning_executor(run_simple_agent, langgraph_request)
+
+                    except Exception as e:
+                        api_logger.error(f"任务 {task_id}: LangGraph执行异常: {str(e)}，尝试使用简化版本")
+                        update_run(
+                            task_id,
+                            current_agent="简化智能体",
+                            message="LangGraph异常，使用简化版本..."
+                        )
+
+                        # 使用简化版本作为备选方案
+                        return await run_in_planning_executor(run_simple_agent, langgraph_request)
 
                 except Exception as e:
                     api_logger.error(f"任务 {task_id}: 初始化LangGraph失败: {str(e)}")
@@ -349,26 +836,34 @@ async def run_planning_task(task_id: str, travel_request: Dict[str, Any]):
                         "planning_complete": False
                     }
             
-            # 设置300秒超时（5分钟）
-            result = await asyncio.wait_for(run_langgraph(), timeout=300.0)
+            # 设置任务总超时（默认5分钟）
+            result = await asyncio.wait_for(run_langgraph(), timeout=task_deadline.remaining())
             
             api_logger.info(f"任务 {task_id}: LangGraph处理完成")
             
             if result["success"]:
-                planning_tasks[task_id]["status"] = "completed"
-                planning_tasks[task_id]["progress"] = 100
-                planning_tasks[task_id]["message"] = "旅行规划完成！"
-                planning_tasks[task_id]["result"] = result
-
-                # 保存任务状态
-                save_tasks_state()
-                
                 # 保存结果到文件
-                await save_planning_result(task_id, result, langgraph_request)
+                result_fields = await save_planning_result(task_id, result, langgraph_request)
+
+                # 保存任务状态（结果已写入文件时只记录文件名）
+                if result.get("travel_plan", {}).get("planning_method") == HEDGED_PLANNING_METHOD:
+                    completion = {"current_agent": "简化智能体", "message": "旅行规划完成（多智能体规划耗时较长，已提供简化方案）"}
+                else:
+                    completion = {"message": "旅行规划完成！"}
+                update_run(
+                    task_id,
+                    status="completed",
+                    progress=100,
+                    **completion,
+                    **result_fields
+                )
                 
             else:
-                planning_tasks[task_id]["status"] = "failed"
-                planning_tasks[task_id]["message"] = f"规划失败: {result.get('error', '未知错误')}"
+                update_run(
+                    task_id,
+                    status="failed",
+                    message=f"规划失败: {result.get('error', '未知错误')}"
+                )
                 
         except asyncio.TimeoutError:
             api_logger.warning(f"任务 {task_id}: LangGraph处理超时")
@@ -394,13 +889,16 @@ async def run_planning_task(task_id: str, travel_request: Dict[str, Any]):
                 "planning_complete": True
             }
             
-            planning_tasks[task_id]["status"] = "completed"
-            planning_tasks[task_id]["progress"] = 100
-            planning_tasks[task_id]["message"] = "旅行规划完成（快速模式）"
-            planning_tasks[task_id]["result"] = simplified_result
-            
             # 保存简化结果
-            await save_planning_result(task_id, simplified_result, langgraph_request)
+            result_fields = await save_planning_result(task_id, simplified_result, langgraph_request)
+
+            update_run(
+                task_id,
+                status="completed",
+                progress=100,
+                message="旅行规划完成（快速模式）",
+                **result_fields
+            )
                 
         except Exception as agent_error:
             # 如果AI旅行规划智能体出错，提供一个简化的响应
@@ -428,67 +926,118 @@ async def run_planning_task(task_id: str, travel_request: Dict[str, Any]):
                 "planning_complete": True
             }
             
-            planning_tasks[task_id]["status"] = "completed"
-            planning_tasks[task_id]["progress"] = 100
-            planning_tasks[task_id]["message"] = "旅行规划完成（简化模式）"
-            planning_tasks[task_id]["result"] = simplified_result
-            
             # 保存简化结果
-            await save_planning_result(task_id, simplified_result, langgraph_request)
+            result_fields = await save_planning_result(task_id, simplified_result, langgraph_request)
+
+            update_run(
+                task_id,
+                status="completed",
+                progress=100,
+                message="旅行规划完成（简化模式）",
+                **result_fields
+            )
             
         api_logger.info(f"任务 {task_id}: 执行完成")
             
     except Exception as e:
-        planning_tasks[task_id]["status"] = "failed"
-        planning_tasks[task_id]["message"] = f"系统错误: {str(e)}"
+        update_run(
+            task_id,
+            status="failed",
+            message=f"系统错误: {str(e)}"
+        )
         api_logger.error(f"任务 {task_id}: 规划任务执行错误: {str(e)}")
 
+async def run_simple_planning_task(task_id: str, travel_request: Dict[str, Any]):
+    """运行简化智能体规划逻辑（/simple-plan），保持与完整版相同的状态更新流程"""
+    if task_repo.cancellation_requested(task_id):
+        return
+    try:
+        task_repo.update(
+            task_id,
+            status="processing",
+            progress=30,
+            message="正在使用简化智能体规划..."
+        )
+
+        result = await run_in_planning_executor(run_simple_agent, travel_request)
+
+        if result["success"]:
+            # 保存结果到文件
+            result_fields = await save_planning_result(task_id, result, travel_request)
+
+            task_repo.update(
+                task_id,
+                status="completed",
+                progress=100,
+                message="简化规划完成！",
+                **result_fields
+            )
+        else:
+            task_repo.update(
+                task_id,
+                status="failed",
+                message=f"简化规划失败: {result.get('error', '未知错误')}"
+            )
+
+    except Exception as e:
+        task_repo.update(
+            task_id,
+            status="failed",
+            message=f"简化规划异常: {str(e)}"
+        )
+
+# 规划作业类型 -> 执行函数；作业类型与旅行请求一起写入调度队列（或持久化作业队列），
+# 规划 worker 进程按作业类型找到对应的执行函数
+PLANNING_JOB_RUNNERS = {
+    "langgraph": run_planning_task,
+    "simple": run_simple_planning_task
+}
+
 # --------------------------- 规划结果输出工具函数 ---------------------------
-async def save_planning_result(task_id: str, result: Dict[str, Any], request: Dict[str, Any]):
+async def save_planning_result(task_id: str, result: Dict[str, Any], request: Dict[str, Any]) -> Dict[str, Any]:
     """
     保存规划结果到文件
 
     将规划请求、结果及时间戳封装为 JSON 存入 `results/` 目录，文件命名包含目的地与时间，
     便于后续归档。该函数在完成主任务后调用，确保生成的报告可以被用户下载或复盘。
+
+    文件在后台持久化写线程中原子写入（临时文件 + os.replace），这里只异步等待写入完成，不阻塞事件循环。
+
+    返回：需要随任务状态一并写入的结果字段——保存成功时为结果文件名、大小与摘要，
+    保存失败时结果改为内联保存在任务记录中
     """
     try:
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        destination = request.get('destination', 'unknown').replace(' ', '_')
-        filename = f"旅行计划_{destination}_{timestamp}.json"
-        filepath = os.path.join("results", filename)
-        
-        # 确保results目录存在
-        os.makedirs("results", exist_ok=True)
-        
-        # 保存为JSON格式
-        save_data = {
-            "task_id": task_id,
-            "timestamp": datetime.now().isoformat(),
-            "request": request,
-            "result": result
+        stored = await asyncio.wrap_future(
+            persistence_writer.submit(None, lambda: result_store.save(task_id, result, request))
+        )
+        api_logger.info(f"任务 {task_id}: 结果已压缩保存 {stored.size} -> {stored.stored_size} 字节")
+        return {
+            "result": None,
+            "result_file": stored.filename,
+            "result_size": stored.size,
+            "result_hash": stored.sha256
         }
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(save_data, f, ensure_ascii=False, indent=2)
-
-        planning_tasks[task_id]["result_file"] = filename
-        
     except Exception as e:
         api_logger.error(f"保存结果文件时出错: {str(e)}")
+        return {"result": result, "result_file": None}
 
 # --------------------------- API 路由：创建、查询、下载 ---------------------------
 @app.post("/plan", response_model=PlanningResponse)
-async def create_travel_plan(request: TravelRequest, background_tasks: BackgroundTasks):
+async def create_travel_plan(request: TravelRequest):
     """
     创建旅行规划任务
 
     该接口负责接收前端提交的详细旅行需求，初始化任务状态并触发后台异步执行：
         1. 生成唯一的 task_id，作为后续查询的关键主键；
         2. 依据起止日期计算旅行天数，写入请求体供多智能体使用；
-        3. 将任务存入全局状态字典 `planning_tasks`，并立即持久化到本地文件；
-        4. 投递后台任务 `run_planning_task`，由事件循环异步执行，保证接口快速响应。
+        3. 把 `run_planning_task` 提交给规划调度器排队，并将任务写入任务仓库 `task_repo`；
+        4. 调度器的 worker 空闲后在后台执行任务，接口本身立即返回。
 
-    请求成功后返回 `PlanningResponse`，调用方可通过 task_id 轮询 `/status/{task_id}` 获取进度。
+    请求成功后返回 `PlanningResponse`，调用方可通过 task_id 轮询 `/status/{task_id}` 获取进度与排队位置。
+    排队任务已满时返回 429，响应头 `Retry-After` 给出建议的重试等待秒数。
+    与进行中的规划请求完全相同（目的地、日期、预算、人数、兴趣一致）时不会重复运行多智能体图，
+    新任务加入该运行，进度与结果和它保持一致。
     """
     try:
         # 生成任务ID
@@ -504,119 +1053,369 @@ async def create_travel_plan(request: TravelRequest, background_tasks: Backgroun
         travel_request = request.model_dump()
         travel_request["duration"] = duration
         
-        # 初始化任务状态
-        planning_tasks[task_id] = {
+        # 提交到规划调度器并保存任务状态
+        # “旅行规划任务”的实际执行放到后台异步运行，接口能够立即响应，不会因耗时的AI推理阻塞前端用户。
+        # 调度器限制了同时执行的任务数量：worker 都在忙时任务先排队，队列也满了则直接返回 429，
+        # 突发流量下每个任务的延迟可预期，也不会一次性向大模型发出过多请求触发限流。
+        # 相同请求的指纹相同，进行中的相同规划只运行一次
+        run_id, position = enqueue_planning_task({
             "task_id": task_id,
-            "status": "started",
-            "progress": 0,
             "current_agent": "系统初始化",
-            "message": "任务已创建，准备开始规划...",
+            "message": "任务已创建，正在排队等待规划...",
             "created_at": datetime.now().isoformat(),
             "request": travel_request,
             "result": None
-        }
-
-        # 保存任务状态
-        save_tasks_state()
-        
-        # 添加后台任务
-        # 这里通过 FastAPI 提供的 BackgroundTasks 功能，把“旅行规划任务”的实际执行放到后台异步运行。
-        # 这样做的好处是接口能够立即响应，并不会因耗时的AI推理阻塞前端用户。
-        # add_task 的第一个参数是要执行的函数（run_planning_task），
-        # 后面的参数（task_id, travel_request）是传递给该函数的实际参数。
-        # run_planning_task 用于具体执行业务逻辑（AI旅行规划），
-        # 而 background_tasks.add_task 会在响应完成后自动在后台启动它。
-        background_tasks.add_task(run_planning_task, task_id, travel_request)
+        }, "langgraph", travel_request,
+            fingerprint=request_fingerprint(build_langgraph_request(travel_request)))
         
-        return PlanningResponse(
-            task_id=task_id,
-            status="started",
-            message="旅行规划任务已启动，请使用task_id查询进度"
-        )
+        if run_id != task_id:
+            message = "相同的旅行规划正在进行中，本任务将共享它的进度与结果，请使用task_id查询进度"
+        else:
+            message = f"旅行规划任务已进入队列（第 {position} 位），请使用task_id查询进度"
+        return PlanningResponse(task_id=task_id, status=task_repo.get(task_id)["status"], message=message)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建规划任务失败: {str(e)}")
 
+# 任务记录中与结果相关的字段，其中任一变化都意味着状态接口中的 result_* 字段变化
+RESULT_RECORD_FIELDS = {"result", "result_file", "result_size", "result_hash"}
+
+def status_fields(task: Dict[str, Any]) -> Dict[str, Any]:
+    """从任务记录中提取状态接口返回的轻量字段（不读取结果本身）"""
+    return {
+        "status": task["status"],
+        "progress": task["progress"],
+        "current_agent": task["current_agent"],
+        "message": task["message"],
+        "result_available": bool(task.get("result_file")) or task.get("result") is not None,
+        "result_size": task.get("result_size"),
+        "result_hash": task.get("result_hash")
+    }
+
+def status_etag(task: Dict[str, Any], queue_position: Optional[int] = None) -> str:
+    """按任务版本号（排队中的任务再加上排队位置）生成 ETag，两者都不变则状态内容不变"""
+    suffix = f"-q{queue_position}" if queue_position is not None else ""
+    return f'"{task["task_id"]}-v{task_version(task)}{suffix}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 请求头是否命中当前 ETag（支持多个值、弱校验前缀 W/ 与 *）"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or any(
+        value[2:] == etag if value.startswith("W/") else value == etag for value in candidates
+    )
+
 @app.get("/status/{task_id}", response_model=PlanningStatus)
-async def get_planning_status(task_id: str):
+async def get_planning_status(
+    task_id: str,
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0, description="客户端最后看到的版本号，只返回之后变化的字段")
+):
     """
     获取规划任务状态
 
-    根据 task_id 读取内存中的任务状态，返回进度条（0-100）、当前执行智能体/阶段提示、
-    文本消息以及完成后缓存的最终结果。若任务不存在则返回 404。
+    根据 task_id 从任务仓库按主键读取任务状态，返回进度条（0-100）、当前执行智能体/阶段提示、
+    文本消息以及结果是否可用、结果大小与摘要；完整结果请调用 `/result/{task_id}`。若任务不存在则返回 404。
+
+    轮询优化：
+    - 每次状态变化任务版本号加 1，响应头 `ETag` 对应当前版本；
+      请求头 `If-None-Match` 与当前 ETag 一致时返回 304，不再重复发送内容
+    - `?since=<version>` 时只返回该版本之后变化过的字段（`PlanningStatusDelta`），
+      客户端把它们合并到上次的状态上即可；没有任何变化时同样返回 304
+    - 排队中的任务额外返回 `queue_position`；排队位置不改变任务版本号，因此排队期间的增量响应总是带上它
     """
     try:
-        api_logger.info(f"状态查询: {task_id}")
-
-        if task_id not in planning_tasks:
+        task = task_repo.get(task_id)
+        if task is None:
             api_logger.warning(f"任务不存在: {task_id}")
             raise HTTPException(status_code=404, detail="任务不存在")
-
-        task = planning_tasks[task_id]
-        api_logger.info(f"任务状态: {task['status']}, 进度: {task['progress']}%")
-
-        return PlanningStatus(
-            task_id=task_id,
-            status=task["status"],
-            progress=task["progress"],
-            current_agent=task["current_agent"],
-            message=task["message"],
-            result=task["result"]
-        )
+        touch_task(task_id)
+
+        version = task_version(task)
+        # inprocess 模式下排队位置只有持有该任务的进程知道，多 worker 部署时其他进程查询到的排队位置为空；
+        # worker 模式下排队位置从共享的作业队列读取
+        queue_position = planning_queue_position(single_flight.run_of(task_id))
+        etag = status_etag(task, queue_position)
+        unchanged = since is not None and since >= version and queue_position is None
+        if etag_matches(request.headers.get("if-none-match"), etag) or unchanged:
+            return Response(status_code=304, headers={"ETag": etag})
+
+        api_logger.info(f"状态查询: {task_id}, 任务状态: {task['status']}, 进度: {task['progress']}%, 版本: {version}")
+
+        fields = {**status_fields(task), "queue_position": queue_position}
+        if since is not None:
+            changed = set(changed_since(task, since))
+            if changed & RESULT_RECORD_FIELDS:
+                changed |= {"result_available", "result_size", "result_hash"}
+            if queue_position is not None or "status" in changed:
+                # 离开队列时状态必然变化，此时返回空的排队位置，清除客户端合并状态中的旧值
+                changed.add("queue_position")
+            values = {field: value for field, value in fields.items() if field in changed}
+            delta = PlanningStatusDelta(task_id=task_id, version=version, delta=True, **values)
+            return JSONResponse(content=delta.model_dump(exclude_unset=True), headers={"ETag": etag})
+
+        response.headers["ETag"] = etag
+        return PlanningStatus(task_id=task_id, version=version, **fields)
     except HTTPException:
         raise
     except Exception as e:
         api_logger.error(f"状态查询错误: {str(e)}")
         raise HTTPException(status_code=500, detail=f"状态查询失败: {str(e)}")
 
+# --------------------------- 规划事件流（SSE / WebSocket） ---------------------------
+async def planning_event_stream(task_id: str):
+    """
+    逐个产生任务的规划事件，直到任务结束
+
+    事件（均为字典，type 字段区分类型）：
+    - snapshot: 连接后的第一个事件，包含当前状态和各智能体到目前为止已生成的文本（partial_outputs）
+    - node_start / node_end: 智能体节点开始/结束，带 progress、completed_agents、total_agents
+    - token: 智能体生成的文本片段（node、agent、message_id、text），按 message_id 拼接即为该次回复
+    - status: 从任务仓库读取到的状态变化（worker 模式或对冲降级时主要依靠它）
+    - heartbeat: PLANNING_STREAM_HEARTBEAT_SECONDS 秒内没有其他事件时发送，防止代理断开空闲连接
+    - done: 任务已结束（completed / failed / cancelled），之后调用 `/result/{task_id}` 获取完整结果
+
+    节点与 token 事件来自本进程的 planning_events；每隔 PLANNING_STREAM_POLL_SECONDS 秒还会读取一次任务仓库，
+    这样取消、降级、其他进程执行的运行也能及时反映出来。订阅期间视为客户端仍在关注该任务（touch_task）。
+    """
+    task = task_repo.get(task_id)
+    if task is None:
+        return
+    run_id = single_flight.run_of(task_id)
+    queue, partial_outputs = planning_events.subscribe(run_id)
+    try:
+        touch_task(task_id)
+        version = task_version(task)
+        yield {"type": "snapshot", "task_id": task_id, "version": version, **status_fields(task),
+               "partial_outputs": partial_outputs}
+        now = time.monotonic()
+        next_poll, last_sent = now + PLANNING_STREAM_POLL_SECONDS, now
+        while task["status"] not in TERMINAL_STATUSES:
+            event = await next_event(queue, min(next_poll, last_sent + PLANNING_STREAM_HEARTBEAT_SECONDS) - time.monotonic())
+            now = time.monotonic()
+            if event is not None:
+                yield event
+                last_sent = now
+                if now < next_poll:
+                    continue
+            # 到了检查时间、运行已结束（None）或等待超时：从任务仓库读取最新状态
+            next_poll = now + PLANNING_STREAM_POLL_SECONDS
+            touch_task(task_id)
+            task = task_repo.get(task_id)
+            if task is None:
+                return
+            if task_version(task) != version:
+                version = task_version(task)
+                yield {"type": "status", "task_id": task_id, "version": version, **status_fields(task)}
+                last_sent = now
+            elif now - last_sent >= PLANNING_STREAM_HEARTBEAT_SECONDS:
+                yield {"type": "heartbeat"}
+                last_sent = now
+        yield {"type": "done", "task_id": task_id, "version": version, **status_fields(task)}
+    finally:
+        planning_events.unsubscribe(run_id, queue)
+
+def sse_frame(event: Dict[str, Any]) -> str:
+    """把事件编码为 Server-Sent Events 格式；心跳使用注释行，浏览器的 EventSource 会忽略它"""
+    if event["type"] == "heartbeat":
+        return ": heartbeat\n\n"
+    return f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+@app.get("/plan/{task_id}/stream")
+async def stream_planning_events(task_id: str):
+    """
+    以 Server-Sent Events 实时推送规划过程（事件类型见 `planning_event_stream`）
+
+    前端可以用 `new EventSource('/plan/<task_id>/stream')` 订阅，按事件类型分别处理：
+    token 事件按智能体拼接显示，done 事件后再请求 `/result/{task_id}` 获取完整结果。
+    相比轮询 `/status`，各智能体的回复在生成的同时就能显示，用户几秒内即可看到第一段内容。
+    任务不存在时返回 404；任务已结束时只返回 snapshot 与 done 两个事件。
+    """
+    if task_repo.get(task_id) is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    async def frames():
+        async for event in planning_event_stream(task_id):
+            yield sse_frame(event)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}  # 禁止 nginx 等代理缓冲事件
+    )
+
+@app.websocket("/ws/plan/{task_id}")
+async def websocket_planning_events(websocket: WebSocket, task_id: str):
+    """
+    以 WebSocket 实时推送规划过程，每个事件是一条 JSON 文本消息，内容与 SSE 接口相同
+
+    任务不存在时以关闭码 4404 关闭连接；发送 done 事件后服务端主动关闭连接。
+    """
+    await websocket.accept()
+    if task_repo.get(task_id) is None:
+        await websocket.close(code=4404, reason="任务不存在")
+        return
+    try:
+        async for event in planning_event_stream(task_id):
+            await websocket.send_json(event)
+        await websocket.close()
+    except WebSocketDisconnect:
+        api_logger.info(f"任务 {task_id} 的事件流连接已断开")
+
+def accepts_gzip(request: Request) -> bool:
+    """根据 Accept-Encoding 判断客户端能否接收 gzip 编码的响应（q=0 表示明确拒绝）"""
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if coding.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+def result_file_response(request: Request, task: Dict[str, Any], headers: Dict[str, str],
+                         download: bool = False) -> Response:
+    """
+    返回任务的结果文件，按客户端能力协商编码
+
+    - 客户端接受 gzip：把压缩文件原样作为 `Content-Encoding: gzip` 响应体发送，服务端不解压；
+      FileResponse 支持 Range 分段请求，运行在支持 pathsend 扩展的 ASGI 服务器上时由服务器直接发送文件
+    - 客户端不接受 gzip：边读边解压，以流式响应返回（不支持 Range）
+    - `ETag` 由结果摘要生成，gzip 编码的响应加 `-gzip` 后缀以区分两种表示，`If-None-Match` 命中时返回 304
+    """
+    filename = task["result_file"]
+    filepath = result_store.path(filename)
+    compressed = result_store.is_compressed(filename)
+    send_gzip = compressed and accepts_gzip(request)
+    download_name = result_store.download_name(filename) if download else None
+
+    headers = {"Vary": "Accept-Encoding", **headers}
+    if task.get("result_hash"):
+        headers["ETag"] = f'"{task["result_hash"]}{"-gzip" if send_gzip else ""}"'
+        if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
+    if not compressed or send_gzip:
+        if send_gzip:
+            headers["Content-Encoding"] = "gzip"
+        return FileResponse(path=filepath, filename=download_name, media_type="application/json", headers=headers)
+
+    if download_name:
+        headers["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(download_name)}"
+    return StreamingResponse(result_store.iter_decompressed(filename), media_type="application/json", headers=headers)
+
+@app.get("/result/{task_id}")
+async def get_planning_result(task_id: str, request: Request):
+    """
+    获取完整规划结果
+
+    直接以文件方式返回 `results/` 中保存的结果文件（包含 task_id、timestamp、request 与 result 字段），
+    不经过 Pydantic 校验和重新序列化，按 Accept-Encoding 返回 gzip 压缩内容或解压后的内容。
+    结果文件写入后不再变化，因此：
+    - `ETag` 由结果的 SHA-256 摘要（与状态接口中的 `result_hash` 一致）生成，`If-None-Match` 命中时返回 304
+    - `Cache-Control` 允许客户端在缓存有效期内直接复用
+    结果未保存为文件的旧任务，返回 `{"task_id", "result"}` 形式的 JSON。任务不存在或结果尚未生成时返回 404。
+    """
+    task = task_repo.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+
+    cache_headers = {"Cache-Control": f"private, max-age={CACHE_DURATION_HOURS * 3600}"}
+    if task.get("result_file") and os.path.exists(result_store.path(task["result_file"])):
+        return result_file_response(request, task, cache_headers)
+
+    result = task_repo.get_result(task_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="结果尚未生成")
+    return JSONResponse(content={"task_id": task_id, "result": result}, headers=cache_headers)
+
 @app.get("/download/{task_id}")
-async def download_result(task_id: str):
+async def download_result(task_id: str, request: Request):
     """
     下载规划结果文件
 
-    如果任务执行成功并生成结果文件，则按照 task_id 寻址 `results/` 目录下的 JSON 文件，
-    返回 `FileResponse` 供调用方下载。若文件不存在或任务无结果，将抛出 404。
+    如果任务执行成功并生成结果文件，则按照 task_id 寻址 `results/` 目录下的结果文件供调用方下载。
+    支持 gzip 内容协商、ETag / If-None-Match 与 Range 断点续传（见 `result_file_response`），
+    下载得到的文件名不带 .gz 后缀。若文件不存在或任务无结果，将抛出 404。
     """
-    if task_id not in planning_tasks:
+    task = task_repo.get(task_id)
+    if task is None:
         raise HTTPException(status_code=404, detail="任务不存在")
     
-    task = planning_tasks[task_id]
-    if "result_file" not in task:
+    if not task.get("result_file"):
         raise HTTPException(status_code=404, detail="结果文件不存在")
     
-    filepath = os.path.join("results", task["result_file"])
-    if not os.path.exists(filepath):
+    if not os.path.exists(result_store.path(task["result_file"])):
         raise HTTPException(status_code=404, detail="文件不存在")
-    
-    return FileResponse(
-        path=filepath,
-        filename=task["result_file"],
-        media_type='application/json'
-    )
+
+    return result_file_response(request, task, {}, download=True)
 
 # --------------------------- 辅助路由：任务列表、简化/模拟模式 ---------------------------
 @app.get("/tasks")
-async def list_tasks():
+async def list_tasks(
+    status: Optional[str] = None,
+    destination: Optional[str] = None,
+    source: Optional[str] = None,
+    created_after: Optional[str] = None,
+    created_before: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200)
+):
     """
-    列出所有任务
+    分页列出任务
+
+    从任务仓库按条件读取任务摘要（不加载规划结果），便于在管理端展示和筛选历史任务。
+    每个任务包含 task_id、状态、创建时间、目的地及来源信息。
 
-    将当前内存中的 `planning_tasks` 转化为摘要列表，便于调试或在管理端展示所有历史任务。
-    每个任务包含 task_id、状态、创建时间及目的地信息。
+    查询参数：
+        - status / destination / source: 按状态、目的地、来源（如 "chat"）过滤；
+        - created_after / created_before: 创建时间范围（ISO 格式，前闭后开）；
+        - order: "desc"（最新在前，默认）或 "asc"；
+        - cursor / limit: 游标分页，传入上一页返回的 `next_cursor` 获取下一页。
+
+    查询走二级索引并按游标定位，响应时间与历史任务总数无关。
     """
-    return {
-        "tasks": [
-            {
-                "task_id": task_id,
-                "status": task["status"],
-                "created_at": task["created_at"],
-                "destination": task["request"].get("destination", "未知")
-            }
-            for task_id, task in planning_tasks.items()
-        ]
-    }
+    query = TaskQuery(
+        status=status,
+        destination=destination,
+        source=source,
+        created_after=created_after,
+        created_before=created_before,
+        order=order,
+        cursor=cursor,
+        limit=limit
+    )
+    try:
+        tasks, next_cursor = task_repo.query_summaries(query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"tasks": tasks, "next_cursor": next_cursor}
+
+@app.delete("/tasks/{task_id}", response_model=PlanningResponse)
+async def cancel_task(task_id: str):
+    """
+    取消规划任务
+
+    排队中的任务直接移出队列，执行中的任务立即停止（正在等待的 LLM 请求、工具调用与 MCP 子进程随之关闭），
+    释放的并发名额立即分配给下一个排队任务。已完成或已失败的任务无法取消，返回 409；
+    重复取消同一任务返回当前的取消状态。
+    """
+    task = task_repo.get(task_id)
+    if task is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if task["status"] == "cancelled":
+        return PlanningResponse(task_id=task_id, status="cancelled", message=task["message"])
+    if task["status"] in ("completed", "failed"):
+        raise HTTPException(status_code=409, detail=f"任务已结束（{task['status']}），无法取消")
+
+    task = cancel_planning_task(task_id, "任务已被用户取消")
+    return PlanningResponse(task_id=task_id, status="cancelled", message=task["message"])
 
 @app.post("/simple-plan")
-async def simple_travel_plan(request: TravelRequest, background_tasks: BackgroundTasks):
+async def simple_travel_plan(request: TravelRequest):
     """
     简化版旅行规划（使用简化智能体）
 
@@ -637,53 +1436,24 @@ async def simple_travel_plan(request: TravelRequest, background_tasks: Backgroun
         travel_request = request.model_dump()
         travel_request["duration"] = duration
 
-        # 初始化任务状态
-        planning_tasks[task_id] = {
+        # 与完整版共用规划调度器排队执行
+        _, position = enqueue_planning_task({
             "task_id": task_id,
-            "status": "started",
-            "progress": 0,
             "current_agent": "简化智能体",
-            "message": "任务已创建，准备开始简化规划...",
+            "message": "任务已创建，正在排队等待简化规划...",
             "created_at": datetime.now().isoformat(),
             "request": travel_request,
             "result": None
-        }
-
-        # 添加后台任务
-        async def run_simple_planning():
-            """运行简化智能体规划逻辑，保持与完整版相同的状态更新流程"""
-            try:
-                planning_tasks[task_id]["status"] = "processing"
-                planning_tasks[task_id]["progress"] = 30
-                planning_tasks[task_id]["message"] = "正在使用简化智能体规划..."
-
-                simple_agent = SimpleTravelAgent()
-                result = simple_agent.run_travel_planning(travel_request)
-
-                if result["success"]:
-                    planning_tasks[task_id]["status"] = "completed"
-                    planning_tasks[task_id]["progress"] = 100
-                    planning_tasks[task_id]["message"] = "简化规划完成！"
-                    planning_tasks[task_id]["result"] = result
-
-                    # 保存结果到文件
-                    await save_planning_result(task_id, result, travel_request)
-                else:
-                    planning_tasks[task_id]["status"] = "failed"
-                    planning_tasks[task_id]["message"] = f"简化规划失败: {result.get('error', '未知错误')}"
-
-            except Exception as e:
-                planning_tasks[task_id]["status"] = "failed"
-                planning_tasks[task_id]["message"] = f"简化规划异常: {str(e)}"
-
-        background_tasks.add_task(run_simple_planning)
+        }, "simple", travel_request)
 
         return PlanningResponse(
             task_id=task_id,
-            status="started",
-            message="简化版旅行规划任务已启动"
+            status="queued",
+            message=f"简化版旅行规划任务已进入队列（第 {position} 位）"
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"创建简化规划任务失败: {str(e)}")
 
@@ -711,6 +1481,7 @@ async def mock_travel_plan(request: TravelRequest):
         travel_request["duration"] = duration
 
         # 使用模拟智能体
+        from agents.simple_travel_agent import MockTravelAgent
         mock_agent = MockTravelAgent()
         result = mock_agent.run_travel_planning(travel_request)
 
@@ -727,7 +1498,7 @@ async def mock_travel_plan(request: TravelRequest):
         raise HTTPException(status_code=500, detail=f"模拟规划失败: {str(e)}")
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest, background_tasks: BackgroundTasks):
+async def chat_with_ai(request: ChatRequest):
     """
     自然语言交互接口 - 旅小智智能对话
     
@@ -737,20 +1508,18 @@ async def chat_with_ai(request: ChatRequest, background_tasks: BackgroundTasks):
     - "我想下周去北京玩3天，预算3000元，喜欢历史文化"
     - "帮我规划一个杭州5日游，2个人，预算中等"
     - "8月份去成都，想吃美食和看大熊猫"
+
+    规划队列已满时直接返回 429，不再调用大模型解析意图（解析出的任务也无法排队）。
     """
+    if planning_queue_full():
+        raise queue_full_error(planning_retry_after())
+
     try:
         user_message = request.message
         api_logger.info(f"收到自然语言请求: {user_message}")
         
-        # 使用 LLM 解析用户意图
-        from langchain_openai import ChatOpenAI
-        
-        llm = ChatOpenAI(
-            model=config.OPENAI_MODEL,
-            api_key=config.OPENAI_API_KEY,
-            base_url=config.OPENAI_BASE_URL,
-            temperature=0.3
-        )
+        # 使用 LLM 解析用户意图（共享的模型客户端，复用已建立的连接）
+        llm = agent_runtime.intent_llm()
         
         # 构造提示词
         system_prompt = """你是"旅小智"，一个专业的AI旅行规划助手。
@@ -783,7 +1552,8 @@ async def chat_with_ai(request: ChatRequest, background_tasks: BackgroundTasks):
             HumanMessage(content=f"用户说：{user_message}\n\n今天是 {datetime.now().strftime('%Y年%m月%d日')}")
         ]
         
-        response = llm.invoke(messages)
+        # 异步调用 LLM，等待模型响应期间事件循环可以继续处理其他请求
+        response = await llm.ainvoke(messages)
         
         # 解析 LLM 响应
         import json
@@ -854,28 +1624,24 @@ async def chat_with_ai(request: ChatRequest, background_tasks: BackgroundTasks):
                 duration = (end_date_obj - start_date_obj).days + 1
                 travel_data["duration"] = duration
                 
-                # 创建任务
+                # 创建任务并提交到规划调度器（与进行中的相同规划请求合并执行）
                 task_id = str(uuid.uuid4())
-                planning_tasks[task_id] = {
+                enqueue_planning_task({
                     "task_id": task_id,
-                    "status": "started",
-                    "progress": 0,
                     "current_agent": "旅小智",
                     "message": f"旅小智正在为您规划{travel_data['destination']}之旅...",
                     "created_at": datetime.now().isoformat(),
                     "request": travel_data,
                     "result": None,
                     "source": "chat"  # 标记来源
-                }
-                
-                # 保存任务状态
-                save_tasks_state()
-                
-                # 添加后台任务
-                background_tasks.add_task(run_planning_task, task_id, travel_data)
+                }, "langgraph", travel_data,
+                    fingerprint=request_fingerprint(build_langgraph_request(travel_data)))
                 
                 api_logger.info(f"自然语言创建任务成功: {task_id}")
                 
+            except HTTPException:
+                # 解析意图期间队列被占满，返回 429
+                raise
             except Exception as e:
                 api_logger.error(f"自动创建任务失败: {str(e)}")
                 can_proceed = False
@@ -917,6 +1683,8 @@ async def chat_with_ai(request: ChatRequest, background_tasks: BackgroundTasks):
             task_id=task_id
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         api_logger.error(f"自然语言处理失败: {str(e)}")
         return ChatResponse(
@@ -932,11 +1700,13 @@ if __name__ == "__main__":
     api_logger.info("启动AI旅行规划智能体API服务器…")
     api_logger.info("API文档: http://localhost:8080/docs")
     api_logger.info("健康检查: http://localhost:8080/health")
+    api_logger.info(f"worker 进程数: {API_WORKERS}")
 
     uvicorn.run(
         "api_server:app",
         host="0.0.0.0",  # 监听所有接口
         port=8080,
+        workers=API_WORKERS,  # 多个 worker 进程通过 SQLite 共享任务状态，可利用多个 CPU 核心
         reload=False,  # 禁用热重载，避免任务数据丢失
         log_level="info",
         timeout_keep_alive=30,  # 增加keep-alive超时
@@ -13,6 +13,8 @@
 通过集中管理参数来提高系统的可维护性。
 """
 
+import os
+
 # 应用程序基本设置
 APP_NAME = "AI旅行规划助手"  # 应用程序名称
 VERSION = "1.0.0"                    # 版本号
@@ -37,12 +39,77 @@ MAX_HOTELS = 8                       # 最大酒店推荐数量
 
 # 缓存设置
 # 缓存可以提高系统性能，减少重复的API调用
+# API 服务的任务热缓存也使用这两个参数：最多缓存 MAX_CACHE_SIZE 个任务，超过有效期后淘汰
 CACHE_DURATION_HOURS = 1             # 缓存持续时间（小时）
 MAX_CACHE_SIZE = 100                 # 最大缓存大小
 
 # 文件设置
 OUTPUT_DIRECTORY = "旅行计划"         # 输出目录名称
 MAX_FILE_SIZE_MB = 10                # 最大文件大小（MB）
+RESULTS_DIRECTORY = "results"        # API 服务保存规划结果文件的目录
+RESULTS_GZIP_LEVEL = 6               # 结果文件 gzip 压缩级别（1 最快，9 压缩率最高）
+
+# 任务状态存储设置
+# sqlite：SQLite(WAL) 数据库，按状态/创建时间/目的地建立索引（默认）
+# journal：内存字典 + 追加日志，累计到阈值后在后台压缩为快照
+TASK_STORE_BACKEND = os.getenv("TASK_STORE_BACKEND", "sqlite")  # 任务存储后端
+TASKS_DB_FILE = os.getenv("TASKS_DB_FILE", "tasks_state.db")   # SQLite 数据库文件
+TASKS_SNAPSHOT_FILE = "tasks_state.json"      # 任务状态快照文件（sqlite 后端首次启动时从中导入历史任务）
+TASKS_JOURNAL_FILE = "tasks_state.journal"    # 任务状态追加日志文件
+TASKS_JOURNAL_COMPACT_THRESHOLD = 500         # 触发后台压缩的日志条数
+PERSISTENCE_FLUSH_INTERVAL_SECONDS = 0.2      # 后台写线程合并写入的时间窗口（秒）
+
+# API 服务设置
+# API_WORKERS > 1 时以多个 uvicorn worker 进程运行，各进程通过 SQLite 数据库共享任务状态
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))  # uvicorn worker 进程数
+IMPORT_TIME_BUDGET_SECONDS = 1.5               # api_server 模块导入耗时预算（秒），超出时记录警告
+
+# 规划任务执行设置
+# 同步的智能体调用在专用线程池中执行，事件循环只等待结果，规划运行期间 API 仍可正常响应
+PLANNING_THREAD_POOL_SIZE = int(os.getenv("PLANNING_THREAD_POOL_SIZE", "8"))  # 规划线程池大小
+# 服务启动时在后台预热智能体运行时（创建共享的模型客户端并编译工作流图），第一个规划任务无需等待初始化
+AGENT_WARMUP_ON_STARTUP = os.getenv("AGENT_WARMUP_ON_STARTUP", "true").lower() == "true"
+LANGGRAPH_TIMEOUT_SECONDS = 240               # LangGraph 多智能体规划超时（秒），超时后降级到简化智能体
+PLANNING_TASK_TIMEOUT_SECONDS = 300           # 单个规划任务（含降级）的总超时（秒）
+# 多智能体图按截止时间（LANGGRAPH_TIMEOUT_SECONDS）自行收尾，外层超时再多等这么久，只作为兜底
+LANGGRAPH_DEADLINE_GRACE_SECONDS = 10
+# 对冲降级：多智能体规划超过最近运行耗时的 p95 仍未完成时，同时启动简化智能体，先成功的结果胜出；
+# 样本不足时使用 PLANNING_HEDGE_DEFAULT_SECONDS。对冲等待时间不会短于 PLANNING_HEDGE_MIN_SECONDS
+PLANNING_HEDGE_ENABLED = os.getenv("PLANNING_HEDGE_ENABLED", "true").lower() == "true"  # 是否启用对冲
+PLANNING_HEDGE_PERCENTILE = 95                # 对冲等待时间使用的耗时分位数
+PLANNING_HEDGE_WINDOW_SIZE = 100              # 参与统计的最近运行次数
+PLANNING_HEDGE_MIN_SAMPLES = 20               # 按分位数计算前至少需要的运行次数
+PLANNING_HEDGE_DEFAULT_SECONDS = float(os.getenv("PLANNING_HEDGE_DEFAULT_SECONDS", "120"))  # 样本不足时的对冲等待时间（秒）
+PLANNING_HEDGE_MIN_SECONDS = 30               # 对冲等待时间下限（秒）
+
+# 规划任务调度设置
+# 每个 API 进程最多同时执行 PLANNING_MAX_CONCURRENCY 个规划任务，其余任务排队；
+# 排队任务达到 PLANNING_QUEUE_MAX_SIZE 时新请求返回 HTTP 429（多 worker 部署时每个进程各自计数）
+PLANNING_MAX_CONCURRENCY = int(os.getenv("PLANNING_MAX_CONCURRENCY", "4"))  # 同时执行的规划任务数
+PLANNING_QUEUE_MAX_SIZE = int(os.getenv("PLANNING_QUEUE_MAX_SIZE", "50"))   # 排队等待的规划任务上限
+PLANNING_ESTIMATED_TASK_SECONDS = 60          # 还没有历史耗时数据时，估算 Retry-After 使用的单任务耗时（秒）
+# 客户端超过该时间没有查询任务状态，视为已放弃，自动取消排队中/执行中的任务（0 表示不自动取消）；
+# 查询记录保存在各进程内存中，多 worker 部署时不启用
+PLANNING_ABANDON_TIMEOUT_SECONDS = int(os.getenv("PLANNING_ABANDON_TIMEOUT_SECONDS", "180"))
+PLANNING_ABANDON_CHECK_INTERVAL_SECONDS = 15  # 检查被放弃任务的间隔（秒）
+
+# 规划任务执行位置
+# inprocess：在 API 进程内由规划调度器执行（默认）
+# worker：API 只把作业写入持久化作业队列，由独立的 worker 进程（python -m planning_worker）领取执行；
+#         API 与 worker 通过 SQLite 共享任务状态，要求 TASK_STORE_BACKEND=sqlite
+PLANNING_EXECUTION_MODE = os.getenv("PLANNING_EXECUTION_MODE", "inprocess")
+PLANNING_JOB_QUEUE_BACKEND = os.getenv("PLANNING_JOB_QUEUE_BACKEND", "sqlite")      # 作业队列后端
+PLANNING_JOBS_DB_FILE = os.getenv("PLANNING_JOBS_DB_FILE", "planning_jobs.db")      # 作业队列数据库文件
+PLANNING_WORKER_PROCESSES = int(os.getenv("PLANNING_WORKER_PROCESSES", "1"))        # 每个 worker 服务启动的进程数
+PLANNING_WORKER_POLL_INTERVAL_SECONDS = 1.0   # 队列为空时 worker 查询新作业的间隔（秒）
+PLANNING_JOB_LEASE_SECONDS = 60               # 作业租约时长（秒），worker 崩溃后最多这么久作业会被重新领取
+PLANNING_JOB_MAX_ATTEMPTS = 3                 # 作业最多被领取的次数，超过后标记任务失败（避免反复导致崩溃的作业无限重试）
+
+# 规划事件流（/plan/{task_id}/stream 与 /ws/plan/{task_id}）设置
+# 节点事件与模型 token 只在执行该运行的进程内分发；收不到事件时按 PLANNING_STREAM_POLL_SECONDS 从任务仓库读取状态变化
+PLANNING_STREAM_QUEUE_SIZE = 1000             # 每个订阅者最多缓存的事件数，客户端读取太慢时丢弃新事件
+PLANNING_STREAM_POLL_SECONDS = 1.0            # 从任务仓库检查状态变化的间隔（秒）
+PLANNING_STREAM_HEARTBEAT_SECONDS = 15        # 没有任何事件时发送心跳的间隔（秒），防止代理断开空闲连接
 
 # 显示设置
 MAX_DISPLAY_ITEMS = 5                # 最大显示项目数量
@@ -40,10 +40,32 @@ class LangGraphConfig:
     DUCKDUCKGO_MAX_RESULTS = 10        # 每次搜索的最大结果数
     DUCKDUCKGO_REGION = "zh-cn"        # 搜索区域设置为中国
     DUCKDUCKGO_SAFESEARCH = "moderate" # 安全搜索级别
+    DUCKDUCKGO_TIMEOUT = 10            # 单次搜索请求超时（秒），同时不超过工具调用剩余的时间
 
     # 智能体协作配置
     MAX_ITERATIONS = 50      # 最大迭代次数
     RECURSION_LIMIT = 100    # 递归限制
+    # 智能体执行模式：
+    # - sequential（默认）: 由协调员逐个调度专业智能体，协调员可以根据中间结果调整流程
+    # - parallel: 旅行顾问、天气分析师、预算优化师、当地专家同时执行，全部完成后由行程规划师汇总（耗时约等于最慢的一个），
+    #   不经过协调员，需要通过环境变量显式开启
+    AGENT_EXECUTION_MODE = os.getenv("AGENT_EXECUTION_MODE", "sequential").lower()
+    # 协调员调度策略（仅 sequential 模式）：
+    # - rules: 下一步可以直接确定时（按顺序调用下一个尚未执行的智能体）不调用协调员模型，
+    #          只有需要真正决策时（搜索结果返回后是否让智能体重新分析）和全部完成后综合最终建议时才调用
+    # - llm: 每一步都由协调员模型决定
+    COORDINATOR_POLICY = os.getenv("COORDINATOR_POLICY", "rules").lower()
+    # 协调员上下文：只提供各智能体输出的摘要（见 agents/agent_digest.py），不再嵌入完整回复
+    COORDINATOR_DIGEST_TOKEN_BUDGET = 600      # 摘要部分的 token 预算
+    COORDINATOR_RECENT_MESSAGE_CHARS = 200     # 附带的最近消息每条最多保留的字符数
+    AGENT_DIGEST_SUMMARY_CHARS = 120           # 每个智能体摘要的最大字符数
+    AGENT_DIGEST_MAX_FACTS = 3                 # 每个智能体摘要保留的要点条数
+
+    # 截止时间配置（见 utils/deadline.py）：每次调用的超时取下列上限与任务剩余时间中较小的一个
+    PLANNING_DEADLINE_SECONDS = 240    # 调用方未指定截止时间时，一次多智能体规划的默认时限（秒）
+    AGENT_LLM_TIMEOUT_SECONDS = 60     # 单次模型调用的超时上限（秒）
+    AGENT_TOOL_TIMEOUT_SECONDS = 30    # 单次工具调用（搜索、天气查询）的超时上限（秒）
+    AGENT_OPTIONAL_MIN_SECONDS = 60    # 剩余时间少于该值时跳过可选的专业智能体与搜索，只完成必需的智能体
 
     # 旅行规划功能配置
     WEATHER_SEARCH_ENABLED = True      # 启用天气搜索
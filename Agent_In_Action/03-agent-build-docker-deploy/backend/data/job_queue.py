@@ -0,0 +1,382 @@
+"""
+规划作业队列 - 可插拔的持久化作业队列
+
+默认情况下规划任务在 API 进程内由 `PlanningScheduler` 执行，一次占用大量 CPU/内存的多智能体运行
+会拖慢同一进程中的 HTTP 接口，API 进程崩溃时所有进行中的任务也一起丢失。
+
+设置 `PLANNING_EXECUTION_MODE=worker` 后，API 只把规划作业写入这里的持久化队列，
+由独立的 worker 进程（`python -m planning_worker`）领取并执行，API 与 worker 可以分别扩容：
+
+1. 领取作业使用"租约"（lease）：worker 领取时写入租约到期时间，执行期间定期续约；
+   worker 进程崩溃后租约到期，作业会被其他 worker 重新领取，不会丢失
+2. 取消作业直接删除作业记录，执行中的 worker 下一次续约失败即停止运行
+3. 同时记录进行中运行的成员任务（与 `SingleFlightGroup` 相同的 attach / members / detach / run_of 接口），
+   相同请求的合并执行在多个 API 进程与 worker 进程之间同样有效
+
+这个模块把队列抽象为 `JobQueue` 接口，默认实现是 SQLite（WAL 模式）：
+同一台机器上的多个 API 进程和 worker 进程通过同一个数据库文件协作，领取作业在写事务中完成，
+同一个作业不会被两个 worker 同时领取。
+
+适用于大模型技术初级用户：
+"API 接收请求 + 队列 + 后台 worker"是 Celery、RQ 等任务队列框架的基本结构，
+这里只用标准库 sqlite3 实现了其中最核心的部分，不需要额外部署 Redis 等中间件。
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+
+@dataclass
+class PlanningJob:
+    """被 worker 领取的规划作业：任务 ID（同时是 run_id）、作业类型、请求参数与已领取次数"""
+    task_id: str
+    kind: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+class JobQueue(ABC):
+    """
+    规划作业队列接口
+
+    作业：
+    - submit(task_id, kind, payload, fingerprint): 提交作业；相同指纹的运行正在进行时只加入该运行，返回 run_id
+    - claim(worker_id, lease_seconds): 领取最早的待执行作业（或租约已过期的作业），没有时返回 None
+    - renew(task_id, worker_id, lease_seconds): 续约，作业已被取消或被其他 worker 接管时返回 False
+    - release(task_id, worker_id): worker 停止时把未完成的作业放回队列
+    - seal(run_id): 运行即将写入最终状态，不再接受相同请求加入（之后的相同请求会提交新的作业）
+    - finish(task_id): 作业结束，删除作业及其成员记录
+    - cancel(task_id): 取消作业（排队中与执行中都适用），同时删除成员记录
+    - discard_members(run_id): 作业记录已不存在时删除残留的成员记录（worker 续约失败后调用）
+
+    成员（与 SingleFlightGroup 接口一致）：run_for / attach / run_of / members / detach
+    """
+
+    @abstractmethod
+    def load(self):
+        """初始化存储（建表等），多个进程重复调用无副作用"""
+
+    @abstractmethod
+    def submit(self, task_id: str, kind: str, payload: Dict[str, Any], fingerprint: Optional[str] = None) -> str:
+        """提交作业，返回 run_id：新建作业时为 task_id，加入相同请求的进行中运行时为该运行的 task_id"""
+
+    @abstractmethod
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[PlanningJob]:
+        """领取一个作业"""
+
+    @abstractmethod
+    def renew(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """延长租约"""
+
+    @abstractmethod
+    def release(self, task_id: str, worker_id: str):
+        """把作业放回队列，由其他 worker 重新执行"""
+
+    @abstractmethod
+    def seal(self, run_id: str):
+        """
+        停止接受新成员；必须在向成员写入最终状态之前调用
+
+        写入最终状态与 finish 之间其他进程可能提交相同的请求，如果此时仍能加入运行，
+        新成员既收不到最终状态，成员记录又会被 finish 删除，任务会一直停留在 queued。
+        """
+
+    @abstractmethod
+    def finish(self, task_id: str):
+        """作业结束（成功、失败或已取消）"""
+
+    @abstractmethod
+    def cancel(self, task_id: str) -> bool:
+        """取消作业，返回作业是否存在"""
+
+    @abstractmethod
+    def discard_members(self, run_id: str):
+        """作业记录已被删除时清理运行的成员记录；作业仍存在（例如被其他 worker 接管）时不做任何事"""
+
+    @abstractmethod
+    def position(self, task_id: str) -> Optional[int]:
+        """作业的排队位置（从 1 开始），已开始执行或不存在时返回 None"""
+
+    @abstractmethod
+    def pending_count(self) -> int:
+        """等待执行的作业数"""
+
+    @abstractmethod
+    def task_ids(self) -> List[str]:
+        """所有未结束作业的 task_id"""
+
+    @abstractmethod
+    def run_for(self, fingerprint: str) -> Optional[str]:
+        """相同指纹的进行中运行的 run_id，没有时返回 None"""
+
+    @abstractmethod
+    def attach(self, fingerprint: str, task_id: str) -> Optional[str]:
+        """相同指纹的运行正在进行时把任务加入该运行，返回 run_id；否则返回 None"""
+
+    @abstractmethod
+    def run_of(self, task_id: str) -> str:
+        """任务所属运行的 run_id；不属于任何运行时就是任务自己"""
+
+    @abstractmethod
+    def members(self, run_id: str) -> List[str]:
+        """运行当前的成员任务 ID"""
+
+    @abstractmethod
+    def detach(self, task_id: str) -> Tuple[str, int]:
+        """成员退出，返回 (run_id, 剩余成员数)"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """队列当前状态，用于健康检查"""
+
+    def close(self):
+        """释放资源（默认无操作）"""
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    基于 SQLite（WAL 模式）的作业队列
+
+    表结构说明：
+    - planning_jobs：每个未结束的作业一行，seq 自增列决定先后顺序，status 为 pending / running，
+      running 的作业记录领取它的 worker 与租约到期时间（time.time() 时间戳）
+    - planning_job_members：运行的成员任务（task_id -> run_id），作业本身的 task_id 也是一个成员
+
+    结束的作业直接删除，表中只保留排队中与执行中的作业，查询开销不随历史任务数增长。
+    每个线程使用独立的数据库连接，修改在 BEGIN IMMEDIATE 写事务中完成。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS planning_jobs (
+            seq          INTEGER PRIMARY KEY AUTOINCREMENT,
+            task_id      TEXT NOT NULL UNIQUE,
+            kind         TEXT NOT NULL,
+            payload      TEXT NOT NULL,
+            fingerprint  TEXT,
+            status       TEXT NOT NULL,
+            worker_id    TEXT,
+            lease_until  REAL,
+            attempts     INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS idx_planning_jobs_status ON planning_jobs(status, seq);
+        CREATE INDEX IF NOT EXISTS idx_planning_jobs_fingerprint ON planning_jobs(fingerprint);
+        CREATE TABLE IF NOT EXISTS planning_job_members (
+            task_id  TEXT PRIMARY KEY,
+            run_id   TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_planning_job_members_run ON planning_job_members(run_id);
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（首次使用时创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _write(self, func):
+        """在写事务中执行 func(conn)，异常时回滚"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = func(conn)
+            conn.execute("COMMIT")
+            return value
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def load(self):
+        self._conn().executescript(self._SCHEMA)
+
+    # --------------------------- 作业 ---------------------------
+    def submit(self, task_id: str, kind: str, payload: Dict[str, Any], fingerprint: Optional[str] = None) -> str:
+        def submit_job(conn: sqlite3.Connection) -> str:
+            if fingerprint is not None:
+                run_id = self._run_for(conn, fingerprint)
+                if run_id is not None:
+                    conn.execute("INSERT OR REPLACE INTO planning_job_members (task_id, run_id) VALUES (?, ?)",
+                                 (task_id, run_id))
+                    return run_id
+            conn.execute(
+                "INSERT INTO planning_jobs (task_id, kind, payload, fingerprint, status) VALUES (?, ?, ?, ?, 'pending')",
+                (task_id, kind, json.dumps(payload, ensure_ascii=False, default=str), fingerprint)
+            )
+            conn.execute("INSERT OR REPLACE INTO planning_job_members (task_id, run_id) VALUES (?, ?)",
+                         (task_id, task_id))
+            return task_id
+
+        return self._write(submit_job)
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[PlanningJob]:
+        def claim_job(conn: sqlite3.Connection) -> Optional[PlanningJob]:
+            now = time.time()
+            row = conn.execute(
+                "SELECT task_id, kind, payload, attempts FROM planning_jobs "
+                "WHERE status = 'pending' OR (status = 'running' AND lease_until < ?) "
+                "ORDER BY seq LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE planning_jobs SET status = 'running', worker_id = ?, lease_until = ?, attempts = attempts + 1 "
+                "WHERE task_id = ?",
+                (worker_id, now + lease_seconds, row["task_id"])
+            )
+            return PlanningJob(
+                task_id=row["task_id"],
+                kind=row["kind"],
+                payload=json.loads(row["payload"]),
+                attempts=row["attempts"] + 1
+            )
+
+        return self._write(claim_job)
+
+    def renew(self, task_id: str, worker_id: str, lease_seconds: float) -> bool:
+        cursor = self._conn().execute(
+            "UPDATE planning_jobs SET lease_until = ? WHERE task_id = ? AND worker_id = ? AND status = 'running'",
+            (time.time() + lease_seconds, task_id, worker_id)
+        )
+        return cursor.rowcount > 0
+
+    def release(self, task_id: str, worker_id: str):
+        self._conn().execute(
+            "UPDATE planning_jobs SET status = 'pending', worker_id = NULL, lease_until = NULL "
+            "WHERE task_id = ? AND worker_id = ?",
+            (task_id, worker_id)
+        )
+
+    def seal(self, run_id: str):
+        # 清除指纹后 _run_for 找不到这个作业：attach 与 submit 在写事务中查找运行，
+        # 要么在这条语句之前加入（之后读取成员时能看到），要么之后提交为新的作业
+        self._conn().execute("UPDATE planning_jobs SET fingerprint = NULL WHERE task_id = ?", (run_id,))
+
+    def finish(self, task_id: str):
+        def finish_job(conn: sqlite3.Connection):
+            conn.execute("DELETE FROM planning_jobs WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM planning_job_members WHERE run_id = ?", (task_id,))
+
+        self._write(finish_job)
+
+    def cancel(self, task_id: str) -> bool:
+        def cancel_job(conn: sqlite3.Connection) -> bool:
+            cursor = conn.execute("DELETE FROM planning_jobs WHERE task_id = ?", (task_id,))
+            conn.execute("DELETE FROM planning_job_members WHERE run_id = ?", (task_id,))
+            return cursor.rowcount > 0
+
+        return self._write(cancel_job)
+
+    def discard_members(self, run_id: str):
+        self._conn().execute(
+            "DELETE FROM planning_job_members WHERE run_id = ? "
+            "AND NOT EXISTS (SELECT 1 FROM planning_jobs WHERE task_id = ?)",
+            (run_id, run_id)
+        )
+
+    def position(self, task_id: str) -> Optional[int]:
+        row = self._conn().execute(
+            "SELECT COUNT(*) FROM planning_jobs WHERE status = 'pending' AND seq <= "
+            "(SELECT seq FROM planning_jobs WHERE task_id = ? AND status = 'pending')",
+            (task_id,)
+        ).fetchone()
+        return row[0] or None
+
+    def pending_count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM planning_jobs WHERE status = 'pending'").fetchone()[0]
+
+    def task_ids(self) -> List[str]:
+        return [row[0] for row in self._conn().execute("SELECT task_id FROM planning_jobs ORDER BY seq")]
+
+    # --------------------------- 运行成员 ---------------------------
+    @staticmethod
+    def _run_for(conn: sqlite3.Connection, fingerprint: str) -> Optional[str]:
+        row = conn.execute(
+            "SELECT task_id FROM planning_jobs WHERE fingerprint = ? ORDER BY seq DESC LIMIT 1", (fingerprint,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def run_for(self, fingerprint: str) -> Optional[str]:
+        return self._run_for(self._conn(), fingerprint)
+
+    def attach(self, fingerprint: str, task_id: str) -> Optional[str]:
+        def attach_member(conn: sqlite3.Connection) -> Optional[str]:
+            run_id = self._run_for(conn, fingerprint)
+            if run_id is not None:
+                conn.execute("INSERT OR REPLACE INTO planning_job_members (task_id, run_id) VALUES (?, ?)",
+                             (task_id, run_id))
+            return run_id
+
+        return self._write(attach_member)
+
+    def run_of(self, task_id: str) -> str:
+        row = self._conn().execute(
+            "SELECT run_id FROM planning_job_members WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        return row[0] if row else task_id
+
+    def members(self, run_id: str) -> List[str]:
+        rows = self._conn().execute(
+            "SELECT task_id FROM planning_job_members WHERE run_id = ? ORDER BY task_id != run_id", (run_id,)
+        ).fetchall()
+        return [row[0] for row in rows] or [run_id]
+
+    def detach(self, task_id: str) -> Tuple[str, int]:
+        def detach_member(conn: sqlite3.Connection) -> Tuple[str, int]:
+            row = conn.execute("SELECT run_id FROM planning_job_members WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return task_id, 0
+            run_id = row[0]
+            conn.execute("DELETE FROM planning_job_members WHERE task_id = ?", (task_id,))
+            remaining = conn.execute(
+                "SELECT COUNT(*) FROM planning_job_members WHERE run_id = ?", (run_id,)
+            ).fetchone()[0]
+            return run_id, remaining
+
+        return self._write(detach_member)
+
+    def stats(self) -> Dict[str, Any]:
+        conn = self._conn()
+        counts = dict(conn.execute("SELECT status, COUNT(*) FROM planning_jobs GROUP BY status").fetchall())
+        followers = conn.execute(
+            "SELECT COUNT(*) FROM planning_job_members WHERE task_id != run_id"
+        ).fetchone()[0]
+        return {
+            "queued": counts.get("pending", 0),
+            "running": counts.get("running", 0),
+            "runs": sum(counts.values()),
+            "followers": followers
+        }
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# --------------------------- 工厂函数 ---------------------------
+def create_job_queue(backend: str, db_path: str) -> JobQueue:
+    """
+    根据配置创建作业队列
+
+    参数：
+    - backend: "sqlite"（默认）；实现 JobQueue 接口即可接入其他队列（例如基于文件或 Redis 的实现）
+    - db_path: SQLite 数据库文件路径，同一台机器上的 API 进程与 worker 进程必须使用同一个文件
+    """
+    if backend == "sqlite":
+        return SQLiteJobQueue(db_path)
+    raise ValueError(f"未知的作业队列后端: {backend}")
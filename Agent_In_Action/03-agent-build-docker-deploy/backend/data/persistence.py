@@ -0,0 +1,145 @@
+"""
+后台持久化写入器
+
+API 的异步处理函数中如果直接执行 `open()` / `json.dump()` 或数据库写入，
+文件写完之前事件循环无法处理其他请求。这个模块提供一个专用写线程：
+
+1. 写入请求按 key 合并：同一个 key 在一个刷新间隔内多次提交，只执行最后一次（例如同一任务的连续进度更新）
+2. 所有写入都在专用线程中顺序执行，不占用事件循环
+3. 提供 `atomic_write_json`：先写临时文件再 `os.replace`，读者永远看不到写了一半的文件
+
+适用于大模型技术初级用户：
+"合并写入"（coalescing）是日志、数据库等系统常用的优化手段——
+频繁变化的数据只需要把最终状态落盘，中间状态可以直接丢弃。
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+writer_logger = logging.getLogger('api_server')
+
+
+def atomic_write_bytes(path: str, payload: bytes):
+    """
+    原子写入文件
+
+    在目标文件同一目录下创建临时文件，写入并刷盘后用 `os.replace` 替换目标文件，
+    因此进程崩溃或并发读取时只会看到旧文件或完整的新文件。
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path: str, data: Any, **dump_kwargs):
+    """原子写入 JSON 文件（UTF-8 编码），写入方式同 `atomic_write_bytes`"""
+    atomic_write_bytes(path, json.dumps(data, **dump_kwargs).encode('utf-8'))
+
+
+class PersistenceWriter:
+    """
+    在专用线程中执行、按 key 合并的写入队列
+
+    - submit(key, write_fn): 提交写入任务，返回 concurrent.futures.Future；
+      同一 key 尚未执行的旧任务会被新任务替换，双方的 Future 都在新任务执行后完成
+    - flush(): 阻塞等待当前所有待写任务完成（用于服务关闭）
+
+    在异步代码中可以用 `await asyncio.wrap_future(writer.submit(...))` 等待写入完成而不阻塞事件循环。
+    """
+
+    def __init__(self, flush_interval: float = 0.2, name: str = "persistence-writer"):
+        self.flush_interval = flush_interval
+        # key -> (写入函数, 等待该 key 写入完成的 Future 列表)
+        self._pending: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._busy = False
+        self._closed = False
+        self._flush_requested = False
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, key: Optional[Hashable], write_fn: Callable[[], Any]) -> concurrent.futures.Future:
+        """提交一次写入；key 为 None 时表示不参与合并的一次性写入"""
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("持久化写入器已关闭")
+            if key is None:
+                key = object()
+            if key in self._pending:
+                _, futures = self._pending.pop(key)
+                futures.append(future)
+                self._pending[key] = (write_fn, futures)
+            else:
+                self._pending[key] = (write_fn, [future])
+            self._cond.notify()
+        return future
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending and self._closed:
+                    return
+                self._busy = True
+
+            # 等待一个刷新间隔，让突发的连续更新合并为一次写入（flush/close 时立即写入）
+            deadline = time.monotonic() + self.flush_interval
+            with self._cond:
+                while not self._closed and not self._flush_requested:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                self._flush_requested = False
+                batch = list(self._pending.values())
+                self._pending.clear()
+
+            for write_fn, futures in batch:
+                # 调用方可能已取消等待（例如 await wrap_future 的协程在服务关闭时被取消），
+                # 写入照常执行，只是不再通知已取消的 Future；对已取消的 Future 设置结果会抛异常导致写线程退出
+                futures = [future for future in futures if future.set_running_or_notify_cancel()]
+                try:
+                    result = write_fn()
+                    for future in futures:
+                        future.set_result(result)
+                except Exception as e:
+                    writer_logger.error(f"后台持久化写入失败: {e}")
+                    for future in futures:
+                        future.set_exception(e)
+
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待所有待写任务执行完毕，超时返回 False"""
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout)
+
+    def close(self, timeout: Optional[float] = None):
+        """写完剩余任务后停止写线程"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
@@ -0,0 +1,104 @@
+"""
+规划结果文件存储
+
+每个完成的规划任务会把请求、结果和时间戳写入 `results/` 目录下的 gzip 压缩 JSON 文件（`.json.gz`），
+任务记录中只保存文件名（`result_file`）以及 JSON 大小和 SHA-256 摘要，完整结果在需要时再从文件读取。
+这样任务仓库和内存缓存都不必长期持有体积较大的多智能体输出，状态接口也只需返回大小和摘要。
+
+压缩后的文件可以原样作为 `Content-Encoding: gzip` 的响应体发送给客户端，服务端不需要解压；
+旧版本保存的未压缩 `.json` 文件仍可正常读取。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Any, Iterator, Optional
+
+from .persistence import atomic_write_bytes
+
+
+@dataclass
+class StoredResult:
+    """已保存的结果文件信息：文件名、JSON 字节数、SHA-256 摘要（用作 ETag）与压缩后的文件字节数"""
+    filename: str
+    size: int
+    sha256: str
+    stored_size: int
+
+
+class ResultStore:
+    """规划结果文件的读写封装"""
+
+    def __init__(self, results_dir: str = "results", compress_level: int = 6):
+        self.results_dir = results_dir
+        self.compress_level = compress_level
+
+    def path(self, filename: str) -> str:
+        """返回结果文件的完整路径"""
+        return os.path.join(self.results_dir, filename)
+
+    @staticmethod
+    def is_compressed(filename: str) -> bool:
+        """结果文件是否为 gzip 压缩格式（旧版本保存的 .json 文件未压缩）"""
+        return filename.endswith(".gz")
+
+    @staticmethod
+    def download_name(filename: str) -> str:
+        """下载时使用的文件名：压缩文件去掉 .gz 后缀，客户端解码后得到的就是 JSON 文件"""
+        return filename[:-len(".gz")] if filename.endswith(".gz") else filename
+
+    def save(self, task_id: str, result: Dict[str, Any], request: Dict[str, Any]) -> StoredResult:
+        """
+        保存规划结果到文件
+
+        文件命名包含目的地与时间，便于后续归档；附带 task_id 前缀，避免同一秒内完成的同目的地任务互相覆盖。
+
+        返回：StoredResult（文件名、大小、摘要）
+        """
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        destination = request.get('destination', 'unknown').replace(' ', '_')
+        filename = f"旅行计划_{destination}_{timestamp}_{task_id[:8]}.json.gz"
+
+        save_data = {
+            "task_id": task_id,
+            "timestamp": datetime.now().isoformat(),
+            "request": request,
+            "result": result
+        }
+
+        # 保留缩进便于用户阅读下载的报告，空白字符在 gzip 压缩后几乎不占空间；
+        # mtime=0 使相同内容得到相同的压缩文件。先写临时文件再原子替换，下载接口不会读到写了一半的文件
+        payload = json.dumps(save_data, ensure_ascii=False, indent=2).encode('utf-8')
+        compressed = gzip.compress(payload, compresslevel=self.compress_level, mtime=0)
+        atomic_write_bytes(self.path(filename), compressed)
+
+        return StoredResult(
+            filename=filename,
+            size=len(payload),
+            sha256=hashlib.sha256(payload).hexdigest(),
+            stored_size=len(compressed)
+        )
+
+    def _open(self, filename: str):
+        """以二进制方式打开结果文件，压缩文件自动解压"""
+        filepath = self.path(filename)
+        return gzip.open(filepath, 'rb') if self.is_compressed(filename) else open(filepath, 'rb')
+
+    def load(self, filename: str) -> Optional[Dict[str, Any]]:
+        """从结果文件读取规划结果，文件不存在时返回 None"""
+        if not os.path.exists(self.path(filename)):
+            return None
+        with self._open(filename) as f:
+            return json.load(f).get("result")
+
+    def iter_decompressed(self, filename: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """逐块读取解压后的文件内容，用于向不支持 gzip 的客户端流式返回"""
+        with self._open(filename) as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
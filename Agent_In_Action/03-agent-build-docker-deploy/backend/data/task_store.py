@@ -0,0 +1,1039 @@
+"""
+任务状态持久化存储 - 可插拔的任务仓库
+
+原先所有规划任务保存在 `api_server.py` 的全局字典 `planning_tasks` 中，
+每次任务创建/完成都会把整个字典（包含所有历史任务的完整结果）重新序列化写入 `tasks_state.json`。
+
+这个模块把任务存储抽象为 `TaskRepository` 接口，并提供两种实现：
+1. SQLiteTaskRepository（默认）：SQLite + WAL 模式，按 task_id / status / created_at / destination 建立索引，
+   查询直接走索引，结果只在需要时读取，不必把所有历史结果常驻内存
+2. JournaledTaskRepository："快照 + 追加日志"，每次更新只追加变化的那条任务记录，
+   日志累计到阈值后在后台线程中压缩为新的快照；启动时只加载快照索引，任务正文按偏移量按需读取
+
+在任一实现之上，可以再包一层 CachedTaskRepository：大小与存活时间都有上限的 LRU 热缓存，
+已完成任务的结果只以 `results/` 文件的形式保存，按需懒加载回内存。
+
+多个 uvicorn worker 进程可以共用同一个 SQLite 数据库文件（WAL 模式下读写互不阻塞），
+此时 CachedTaskRepository 以 shared 模式运行，任何一个 worker 都能查询其他 worker 创建的任务。
+
+适用于大模型技术初级用户：
+接口（抽象基类）让上层 API 代码不关心数据具体存放在哪里，
+通过配置项 `TASK_STORE_BACKEND` 即可切换不同的存储实现。
+"""
+
+import base64
+import bisect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+
+from .persistence import PersistenceWriter, atomic_write_json
+from .result_store import ResultStore
+
+store_logger = logging.getLogger('api_server')
+
+
+@dataclass
+class TaskQuery:
+    """
+    任务列表查询条件
+
+    - status / destination / source: 等值过滤（source 目前只有自然语言创建的任务为 "chat"）
+    - created_after / created_before: 创建时间范围，ISO 格式字符串，前闭后开
+    - order: "desc"（最新在前，默认）或 "asc"
+    - cursor: 上一页返回的 next_cursor，用于游标分页
+    - limit: 每页条数
+    """
+    status: Optional[str] = None
+    destination: Optional[str] = None
+    source: Optional[str] = None
+    created_after: Optional[str] = None
+    created_before: Optional[str] = None
+    order: str = "desc"
+    cursor: Optional[str] = None
+    limit: int = 50
+
+
+def encode_cursor(created_at: str, task_id: str) -> str:
+    """把分页位置 (created_at, task_id) 编码为不透明的游标字符串"""
+    raw = json.dumps([created_at, task_id], ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """解析游标字符串，格式错误时抛出 ValueError"""
+    try:
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(created_at), str(task_id)
+    except Exception:
+        raise ValueError("无效的分页游标")
+
+
+class TaskRepository(ABC):
+    """
+    任务仓库抽象基类
+
+    定义 API 服务读写规划任务所需的最小操作集合。
+    任务以字典形式表示，包含 task_id、status、progress、current_agent、message、
+    created_at、request、result 等字段。
+    """
+
+    @abstractmethod
+    def load(self):
+        """服务启动时调用，完成存储初始化或历史数据恢复"""
+
+    @abstractmethod
+    def create(self, task: Dict[str, Any]):
+        """新建一条任务记录（已存在时整体覆盖）"""
+
+    def save(self, task: Dict[str, Any]):
+        """整体写入一条任务记录的最新状态（存在则覆盖，不存在则新建）"""
+        self.create(task)
+
+    @abstractmethod
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """按 task_id 读取完整任务记录，不存在时返回 None"""
+
+    @abstractmethod
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        """更新任务的部分字段并持久化，返回更新后的任务记录"""
+
+    @abstractmethod
+    def query_summaries(self, query: TaskQuery) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        按条件分页查询任务摘要（task_id、状态、创建时间、目的地、来源），不加载规划结果
+
+        返回：(当前页摘要列表, 下一页游标；没有更多数据时为 None)
+        """
+
+    @abstractmethod
+    def count(self) -> int:
+        """返回任务总数"""
+
+    def exists(self, task_id: str) -> bool:
+        """判断任务是否存在"""
+        return self.get(task_id) is not None
+
+    def get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """读取任务的规划结果，任务不存在或尚无结果时返回 None"""
+        task = self.get(task_id)
+        return task.get("result") if task else None
+
+    def close(self):
+        """释放存储占用的资源"""
+
+
+# 终态任务不会再被更新，多进程共享存储时可以放心缓存
+TERMINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+
+# --------------------------- 版本号 ---------------------------
+def task_version(task: Dict[str, Any]) -> int:
+    """任务记录的版本号；旧数据没有版本号时视为 1"""
+    return task.get("version", 1)
+
+
+def init_task_version(task: Dict[str, Any]) -> Dict[str, Any]:
+    """新建任务时初始化版本号：version 从 1 开始，所有字段的版本都视为 1"""
+    task.setdefault("version", 1)
+    task.setdefault("field_versions", {})
+    return task
+
+
+def apply_task_update(task: Dict[str, Any], fields: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    把字段更新应用到任务记录上，返回新的记录对象
+
+    只有值真正发生变化时才把 version 加 1，并在 `field_versions` 中记下每个字段最后一次变化时的版本号，
+    状态接口据此实现 ETag 条件请求与 `?since=<version>` 增量查询。
+    """
+    changed = {key: value for key, value in fields.items() if task.get(key) != value}
+    if not changed:
+        return task
+    version = task_version(task) + 1
+    field_versions = dict(task.get("field_versions") or {})
+    for key in changed:
+        field_versions[key] = version
+    return {**task, **changed, "version": version, "field_versions": field_versions}
+
+
+def changed_since(task: Dict[str, Any], since: int) -> List[str]:
+    """返回在版本 since 之后发生过变化的字段名（没有记录版本的字段视为在版本 1 写入）"""
+    field_versions = task.get("field_versions") or {}
+    return [key for key in task if field_versions.get(key, 1) > since]
+
+
+def _task_summary(task: Dict[str, Any]) -> Dict[str, Any]:
+    """从完整任务记录中提取列表接口使用的摘要字段"""
+    return {
+        "task_id": task["task_id"],
+        "status": task["status"],
+        "created_at": task["created_at"],
+        "destination": (task.get("request") or {}).get("destination", "未知"),
+        "source": task.get("source")
+    }
+
+
+# --------------------------- SQLite 实现 ---------------------------
+class SQLiteTaskRepository(TaskRepository):
+    """
+    基于 SQLite（WAL 模式）的任务仓库
+
+    表结构说明：
+    - 常用查询字段（status、created_at、destination、source）单独成列，
+      并建立 (过滤字段, created_at, task_id) 复合索引，分页查询可直接按索引顺序扫描
+    - 其余任务字段序列化为 JSON 存入 data 列
+    - 体积最大的规划结果单独存入 result 列，只在读取单个任务时才加载
+
+    每个线程使用独立的数据库连接，写入在事务内完成，进程崩溃也不会留下半写状态。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            task_id     TEXT PRIMARY KEY,
+            status      TEXT NOT NULL,
+            created_at  TEXT NOT NULL,
+            destination TEXT,
+            source      TEXT,
+            data        TEXT NOT NULL,
+            result      TEXT
+        );
+        DROP INDEX IF EXISTS idx_tasks_status;
+        DROP INDEX IF EXISTS idx_tasks_created_at;
+        DROP INDEX IF EXISTS idx_tasks_destination;
+        CREATE INDEX IF NOT EXISTS idx_tasks_created ON tasks(created_at, task_id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_status_created ON tasks(status, created_at, task_id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_destination_created ON tasks(destination, created_at, task_id);
+        CREATE INDEX IF NOT EXISTS idx_tasks_source_created ON tasks(source, created_at, task_id);
+    """
+
+    def __init__(self, db_path: str, legacy_snapshot_path: Optional[str] = None):
+        self.db_path = db_path
+        self.legacy_snapshot_path = legacy_snapshot_path
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（首次使用时创建）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def load(self):
+        """创建表和索引；数据库为空时导入旧版 tasks_state.json"""
+        conn = self._conn()
+        conn.executescript(self._SCHEMA)
+
+        if not (self.legacy_snapshot_path and os.path.exists(self.legacy_snapshot_path)):
+            return
+        # 多个 worker 同时启动时，写锁保证只有一个进程执行导入
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if self.count() > 0:
+                conn.execute("COMMIT")
+                return
+            with open(self.legacy_snapshot_path, 'r', encoding='utf-8') as f:
+                legacy_tasks = json.load(f)
+            for task in legacy_tasks.values():
+                self.create(task)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        store_logger.info(f"已从 {self.legacy_snapshot_path} 导入 {len(legacy_tasks)} 个历史任务")
+
+    @staticmethod
+    def _columns(task: Dict[str, Any]) -> Dict[str, Any]:
+        """把任务字典拆分为索引列、data 列和 result 列"""
+        data = {k: v for k, v in task.items() if k != "result"}
+        result = task.get("result")
+        return {
+            "task_id": task["task_id"],
+            "status": task["status"],
+            "created_at": task["created_at"],
+            "destination": (task.get("request") or {}).get("destination"),
+            "source": task.get("source"),
+            "data": json.dumps(data, ensure_ascii=False, default=str),
+            "result": json.dumps(result, ensure_ascii=False, default=str) if result is not None else None
+        }
+
+    def create(self, task: Dict[str, Any]):
+        cols = self._columns(task)
+        self._conn().execute(
+            "INSERT OR REPLACE INTO tasks (task_id, status, created_at, destination, source, data, result) "
+            "VALUES (:task_id, :status, :created_at, :destination, :source, :data, :result)",
+            cols
+        )
+
+    def save(self, task: Dict[str, Any]):
+        """
+        写入任务最新状态；已取消的任务不再被覆盖
+
+        任务可能由其他进程执行（多 worker 部署或独立的规划 worker），执行进程写线程中尚未落盘的旧进度
+        可能晚于取消状态到达，这里在同一条语句中跳过这类写入，取消状态不会被改回运行中。
+        """
+        self._conn().execute(
+            "INSERT INTO tasks (task_id, status, created_at, destination, source, data, result) "
+            "VALUES (:task_id, :status, :created_at, :destination, :source, :data, :result) "
+            "ON CONFLICT(task_id) DO UPDATE SET status = excluded.status, created_at = excluded.created_at, "
+            "destination = excluded.destination, source = excluded.source, data = excluded.data, "
+            "result = excluded.result WHERE tasks.status != 'cancelled'",
+            self._columns(task)
+        )
+
+    @staticmethod
+    def _row_to_task(row: sqlite3.Row) -> Dict[str, Any]:
+        task = json.loads(row["data"])
+        task["result"] = json.loads(row["result"]) if row["result"] is not None else None
+        return task
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            "SELECT data, result FROM tasks WHERE task_id = ?", (task_id,)
+        ).fetchone()
+        return self._row_to_task(row) if row else None
+
+    def exists(self, task_id: str) -> bool:
+        row = self._conn().execute("SELECT 1 FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+        return row is not None
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data, result FROM tasks WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            task = apply_task_update(self._row_to_task(row), fields)
+            cols = self._columns(task)
+            if "result" in fields:
+                conn.execute(
+                    "UPDATE tasks SET status = :status, data = :data, result = :result WHERE task_id = :task_id",
+                    cols
+                )
+            else:
+                # 结果未变化时不重写体积最大的 result 列
+                conn.execute("UPDATE tasks SET status = :status, data = :data WHERE task_id = :task_id", cols)
+            conn.execute("COMMIT")
+            return task
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def query_summaries(self, query: TaskQuery) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        clauses, params = [], []
+        for column in ("status", "destination", "source"):
+            value = getattr(query, column)
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if query.created_after:
+            clauses.append("created_at >= ?")
+            params.append(query.created_after)
+        if query.created_before:
+            clauses.append("created_at < ?")
+            params.append(query.created_before)
+
+        descending = query.order != "asc"
+        if query.cursor:
+            # 键集分页：从上一页最后一条记录之后继续扫描索引，而不是 OFFSET 跳过前面所有记录
+            clauses.append(f"(created_at, task_id) {'<' if descending else '>'} (?, ?)")
+            params.extend(decode_cursor(query.cursor))
+
+        direction = "DESC" if descending else "ASC"
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn().execute(
+            f"SELECT task_id, status, created_at, destination, source FROM tasks {where} "
+            f"ORDER BY created_at {direction}, task_id {direction} LIMIT ?",
+            (*params, query.limit + 1)
+        ).fetchall()
+
+        page = [
+            {
+                "task_id": row["task_id"],
+                "status": row["status"],
+                "created_at": row["created_at"],
+                "destination": row["destination"] or "未知",
+                "source": row["source"]
+            }
+            for row in rows[:query.limit]
+        ]
+        next_cursor = None
+        if len(rows) > query.limit:
+            last = page[-1]
+            next_cursor = encode_cursor(last["created_at"], last["task_id"])
+        return page, next_cursor
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+# --------------------------- 快照 + 追加日志实现 ---------------------------
+class JournaledTaskRepository(TaskRepository):
+    """
+    基于"快照 + 追加日志"的任务仓库，启动时只加载轻量索引，任务正文按需读取
+
+    文件说明（以 snapshot_path = tasks_state.json 为例）：
+    - tasks_state.data.<编号>.jsonl: 快照数据文件，每行一条完整的任务记录
+    - tasks_state.index.json: 快照索引，记录当前数据文件名，以及每个任务在数据文件中的
+      [偏移量, 长度, created_at, status, destination, source]
+    - journal_path: 追加日志，每行一条 {"task_id": ..., "task": {...}} 记录
+    - journal_path + ".compacting": 压缩进行中时被轮换出来的旧日志，压缩完成后删除
+    - snapshot_path: 旧版全量快照 {task_id: task}，只在索引不存在时导入一次并转换为新格式
+
+    启动时只读取索引并重放日志（日志条数受压缩阈值限制），不解析任何历史任务正文，
+    因此启动耗时不随历史任务的结果体积增长；`get()` 时才按偏移量从数据文件读取单个任务。
+    内存中只保存快照之后新建或更新过的任务，压缩完成后这些任务也转为按需读取。
+
+    列表查询使用内存中维护的二级索引：按 (created_at, task_id) 排序的键列表，
+    以及按 status / destination / source 分组的同类有序键列表，任务变更时增量维护。
+    """
+
+    _INDEXED_FIELDS = ("status", "destination", "source")
+
+    def __init__(self, snapshot_path: str, journal_path: str, compact_threshold: int = 500):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+        self.compacting_path = journal_path + ".compacting"
+        self.compact_threshold = compact_threshold
+
+        base = os.path.splitext(snapshot_path)[0]
+        self.index_path = base + ".index.json"
+        self._data_prefix = base + ".data."
+
+        # 快照之后新建/更新过的任务（完整记录）
+        self._live: Dict[str, Dict[str, Any]] = {}
+        # 快照中的任务：task_id -> (偏移量, 长度)
+        self._offsets: Dict[str, Tuple[int, int]] = {}
+        self._data_path: Optional[str] = None
+        self._data_file = None
+
+        # 二级索引：全部任务的有序键、按字段取值分组的有序键，以及每个任务当前被索引的取值
+        self._keys_all: List[Tuple[str, str]] = []
+        self._keys_by: Dict[str, Dict[Any, List[Tuple[str, str]]]] = {f: {} for f in self._INDEXED_FIELDS}
+        self._indexed: Dict[str, Dict[str, Any]] = {}
+        # 保护任务数据、数据文件句柄与二级索引（写入可能来自后台写线程，查询来自事件循环）
+        self._index_lock = threading.RLock()
+
+        self._lock = threading.Lock()
+        self._journal_file = None
+        self._journal_entries = 0
+        self._compaction_thread = None
+
+    # --------------------------- 加载与重放 ---------------------------
+    def load(self):
+        """读取快照索引并按顺序重放日志，恢复最新的任务状态（不读取快照中的任务正文）"""
+        migrate_legacy = False
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            self._open_data_file(os.path.join(os.path.dirname(self.index_path), index["data_file"]))
+            for task_id, (offset, length, created_at, status, destination, source) in index["tasks"].items():
+                self._offsets[task_id] = (offset, length)
+                self._indexed[task_id] = {
+                    "created_at": created_at, "status": status, "destination": destination, "source": source
+                }
+        elif os.path.exists(self.snapshot_path):
+            # 旧版全量快照：一次性读入，随后在后台转换为 "索引 + 数据文件" 格式
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                self._live.update(json.load(f))
+            migrate_legacy = bool(self._live)
+
+        replayed = 0
+        for path in (self.compacting_path, self.journal_path):
+            replayed += self._replay_journal(path, self._live)
+
+        for task_id, task in self._live.items():
+            self._indexed[task_id] = self._index_values(task)
+        self._journal_entries = replayed
+        self._rebuild_indexes()
+        store_logger.info(
+            f"任务存储加载完成: 共 {len(self._indexed)} 个任务（内存中 {len(self._live)} 个），重放 {replayed} 条日志"
+        )
+
+        if migrate_legacy:
+            self.compact_in_background()
+
+    def _replay_journal(self, path: str, tasks: Dict[str, Dict[str, Any]]) -> int:
+        """
+        重放单个日志文件
+
+        进程在写入过程中崩溃时，文件末尾可能残留一行没有换行符的不完整记录：重放时跳过并把它截掉，
+        否则之后追加的第一条记录会接在这半行后面，合成一行损坏的记录，下一次启动时丢失。
+        """
+        if not os.path.exists(path):
+            return 0
+
+        count = 0
+        complete_end = 0
+        with open(path, 'rb') as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break
+                complete_end += len(raw)
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    store_logger.warning(f"跳过损坏的日志行: {path}")
+                    continue
+                tasks[entry["task_id"]] = entry["task"]
+                count += 1
+
+        if os.path.getsize(path) > complete_end:
+            store_logger.warning(f"截掉日志末尾不完整的记录: {path}")
+            with open(path, 'r+b') as f:
+                f.truncate(complete_end)
+        return count
+
+    def _open_data_file(self, path: str):
+        """切换当前使用的快照数据文件（调用方需持有 _index_lock 或处于加载阶段）"""
+        old_file = self._data_file
+        self._data_file = open(path, 'rb')
+        self._data_path = path
+        if old_file is not None:
+            old_file.close()
+
+    def _read_body(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """按偏移量从快照数据文件读取单个任务（调用方需持有 _index_lock）"""
+        location = self._offsets.get(task_id)
+        if location is None or self._data_file is None:
+            return None
+        offset, length = location
+        self._data_file.seek(offset)
+        return json.loads(self._data_file.read(length))
+
+    # --------------------------- 二级索引 ---------------------------
+    @staticmethod
+    def _index_values(task: Dict[str, Any]) -> Dict[str, Any]:
+        """提取任务在各个索引中的取值"""
+        return {
+            "created_at": task["created_at"],
+            "status": task.get("status"),
+            "destination": (task.get("request") or {}).get("destination"),
+            "source": task.get("source")
+        }
+
+    def _rebuild_indexes(self):
+        """加载完成后按 _indexed 中的取值一次性构建全部二级索引"""
+        self._keys_all = []
+        self._keys_by = {f: {} for f in self._INDEXED_FIELDS}
+        for task_id, values in self._indexed.items():
+            key = (values["created_at"], task_id)
+            self._keys_all.append(key)
+            for field in self._INDEXED_FIELDS:
+                self._keys_by[field].setdefault(values[field], []).append(key)
+        self._keys_all.sort()
+        for groups in self._keys_by.values():
+            for keys in groups.values():
+                keys.sort()
+
+    @staticmethod
+    def _remove_key(keys: List[Tuple[str, str]], key: Tuple[str, str]):
+        pos = bisect.bisect_left(keys, key)
+        if pos < len(keys) and keys[pos] == key:
+            del keys[pos]
+
+    def _reindex(self, task: Dict[str, Any]):
+        """任务新建或变更后，只调整取值发生变化的索引"""
+        task_id = task["task_id"]
+        values = self._index_values(task)
+        old = self._indexed.get(task_id)
+        key = (values["created_at"], task_id)
+
+        if old is None:
+            bisect.insort(self._keys_all, key)
+        for field in self._INDEXED_FIELDS:
+            if old is not None and old[field] == values[field]:
+                continue
+            if old is not None:
+                old_keys = self._keys_by[field].get(old[field], [])
+                self._remove_key(old_keys, (old["created_at"], task_id))
+                if not old_keys:
+                    self._keys_by[field].pop(old[field], None)
+            bisect.insort(self._keys_by[field].setdefault(values[field], []), key)
+        self._indexed[task_id] = values
+
+    @staticmethod
+    def _summary_from_values(task_id: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """直接用索引中的取值生成任务摘要，列表查询不需要读取任务正文"""
+        return {
+            "task_id": task_id,
+            "status": values["status"],
+            "created_at": values["created_at"],
+            "destination": values["destination"] if values["destination"] is not None else "未知",
+            "source": values["source"]
+        }
+
+    def query_summaries(self, query: TaskQuery) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        with self._index_lock:
+            return self._query_summaries_locked(query)
+
+    def _query_summaries_locked(self, query: TaskQuery) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # 选择匹配条目最少的那个等值索引作为扫描起点，其余条件在扫描时过滤
+        filters = {f: getattr(query, f) for f in self._INDEXED_FIELDS if getattr(query, f) is not None}
+        keys = self._keys_all
+        for field, value in filters.items():
+            candidate = self._keys_by[field].get(value, [])
+            if len(candidate) < len(keys) or keys is self._keys_all:
+                keys = candidate
+
+        descending = query.order != "asc"
+        # 计算扫描范围 [lo, hi)：时间范围与游标都通过二分查找定位
+        lo, hi = 0, len(keys)
+        if query.created_after:
+            lo = bisect.bisect_left(keys, (query.created_after, ""))
+        if query.created_before:
+            hi = bisect.bisect_left(keys, (query.created_before, ""))
+        if query.cursor:
+            cursor_key = decode_cursor(query.cursor)
+            if descending:
+                hi = min(hi, bisect.bisect_left(keys, cursor_key))
+            else:
+                lo = max(lo, bisect.bisect_right(keys, cursor_key))
+
+        positions = range(hi - 1, lo - 1, -1) if descending else range(lo, hi)
+        page: List[Dict[str, Any]] = []
+        has_more = False
+        for pos in positions:
+            created_at, task_id = keys[pos]
+            values = self._indexed[task_id]
+            if any(values[f] != v for f, v in filters.items()):
+                continue
+            if len(page) == query.limit:
+                has_more = True
+                break
+            page.append(self._summary_from_values(task_id, values))
+
+        next_cursor = None
+        if has_more:
+            last = page[-1]
+            next_cursor = encode_cursor(last["created_at"], last["task_id"])
+        return page, next_cursor
+
+    # --------------------------- 读写接口 ---------------------------
+    def create(self, task: Dict[str, Any]):
+        with self._index_lock:
+            self._live[task["task_id"]] = task
+            self._reindex(task)
+        self._append(task["task_id"])
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._index_lock:
+            task = self._live.get(task_id)
+            if task is not None:
+                return task
+            return self._read_body(task_id)
+
+    def exists(self, task_id: str) -> bool:
+        return task_id in self._indexed
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        with self._index_lock:
+            task = self.get(task_id)
+            if task is None:
+                return None
+            task = apply_task_update(task, fields)
+            self._live[task_id] = task
+            self._reindex(task)
+        self._append(task_id)
+        return task
+
+    def count(self) -> int:
+        return len(self._indexed)
+
+    # --------------------------- 追加写入 ---------------------------
+    def _append(self, task_id: str):
+        """把单个任务的最新记录追加到日志中，必要时触发后台压缩"""
+        task = self._live.get(task_id)
+        if task is None:
+            return
+
+        line = json.dumps({"task_id": task_id, "task": task}, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._journal_file is None:
+                self._journal_file = open(self.journal_path, 'a', encoding='utf-8')
+            self._journal_file.write(line + "\n")
+            self._journal_file.flush()
+            self._journal_entries += 1
+            should_compact = self._journal_entries >= self.compact_threshold
+
+        if should_compact:
+            self.compact_in_background()
+
+    # --------------------------- 压缩 ---------------------------
+    def compact_in_background(self):
+        """
+        在后台线程中把当前全部任务压缩为新的 "数据文件 + 索引"
+
+        压缩开始时在锁内轮换日志文件，并记下内存中的任务与快照中各任务的位置，之后的新写入进入新的日志，
+        因此压缩过程不会阻塞请求处理，也不会丢失压缩期间产生的更新。
+        """
+        with self._lock:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+
+            if self._journal_file is not None:
+                self._journal_file.close()
+                self._journal_file = None
+            if os.path.exists(self.compacting_path):
+                # 上一次压缩未完成（例如写入失败或进程崩溃），把当前日志接到旧的轮换日志之后
+                if os.path.exists(self.journal_path):
+                    with open(self.journal_path, 'r', encoding='utf-8') as src, \
+                            open(self.compacting_path, 'a', encoding='utf-8') as dst:
+                        dst.write(src.read())
+                    os.remove(self.journal_path)
+            elif os.path.exists(self.journal_path):
+                os.replace(self.journal_path, self.compacting_path)
+
+            with self._index_lock:
+                live = dict(self._live)
+                offsets = {task_id: location for task_id, location in self._offsets.items() if task_id not in live}
+                indexed = {task_id: self._indexed[task_id] for task_id in offsets}
+                data_path = self._data_path
+            self._journal_entries = 0
+
+            self._compaction_thread = threading.Thread(
+                target=self._write_snapshot,
+                args=(live, offsets, indexed, data_path),
+                name="task-store-compaction",
+                daemon=True
+            )
+            self._compaction_thread.start()
+
+    def _write_snapshot(self, live: Dict[str, Dict[str, Any]], offsets: Dict[str, Tuple[int, int]],
+                        indexed: Dict[str, Dict[str, Any]], old_data_path: Optional[str]):
+        """
+        写入新的数据文件和索引，再切换到新文件并删除已被合并的旧文件与旧日志
+
+        快照中未变化的任务直接按字节复制，不需要重新解析和序列化。
+        """
+        new_data_path = f"{self._data_prefix}{time.time_ns()}.jsonl"
+        rows: Dict[str, List[Any]] = {}
+
+        def add_row(out, task_id: str, raw: bytes, values: Dict[str, Any]):
+            rows[task_id] = [out.tell(), len(raw), values["created_at"], values["status"],
+                             values["destination"], values["source"]]
+            out.write(raw + b"\n")
+
+        try:
+            with open(new_data_path, 'wb') as out:
+                if old_data_path:
+                    with open(old_data_path, 'rb') as src:
+                        for task_id, (offset, length) in offsets.items():
+                            src.seek(offset)
+                            add_row(out, task_id, src.read(length), indexed[task_id])
+                for task_id, task in live.items():
+                    raw = json.dumps(task, ensure_ascii=False, default=str).encode('utf-8')
+                    add_row(out, task_id, raw, self._index_values(task))
+                out.flush()
+                os.fsync(out.fileno())
+
+            atomic_write_json(self.index_path, {"data_file": os.path.basename(new_data_path), "tasks": rows},
+                              ensure_ascii=False)
+
+            with self._index_lock:
+                self._open_data_file(new_data_path)
+                for task_id, row in rows.items():
+                    self._offsets[task_id] = (row[0], row[1])
+                    # 压缩期间没有再次更新的任务不必继续留在内存中
+                    if task_id in live and self._live.get(task_id) is live[task_id]:
+                        del self._live[task_id]
+
+            if old_data_path and os.path.exists(old_data_path):
+                os.remove(old_data_path)
+            if os.path.exists(self.compacting_path):
+                os.remove(self.compacting_path)
+            store_logger.info(f"任务状态压缩完成: {len(rows)} 个任务")
+        except Exception as e:
+            store_logger.error(f"任务状态压缩失败: {e}")
+            if os.path.exists(new_data_path) and self._data_path != new_data_path:
+                os.remove(new_data_path)
+
+    def close(self):
+        """关闭日志与数据文件句柄，并等待进行中的压缩结束"""
+        with self._lock:
+            if self._journal_file is not None:
+                self._journal_file.close()
+                self._journal_file = None
+        if self._compaction_thread is not None:
+            self._compaction_thread.join()
+        with self._index_lock:
+            if self._data_file is not None:
+                self._data_file.close()
+                self._data_file = None
+
+
+# --------------------------- 有界热缓存 ---------------------------
+class CachedTaskRepository(TaskRepository):
+    """
+    带 LRU + TTL 热缓存的任务仓库包装器
+
+    - 写操作先更新缓存中的任务记录，再写入底层仓库；
+      配置了 writer 时，底层写入交给后台写线程并按 task_id 合并，调用方（事件循环）不会被磁盘写入阻塞
+    - 读操作优先命中缓存，其次是尚未落盘的待写记录；缓存条数超过 max_size 时淘汰最久未访问的任务，
+      超过 ttl_seconds 未刷新的条目在被访问时惰性清理（写入时顺带清理排在最前面的过期条目），
+      每次读写的缓存维护都是 O(1)，不随缓存条数增长
+    - 已完成任务的结果只保存在 `results/` 文件中（任务记录里是 `result_file`），
+      `get_result()` 首次访问时才从文件读取并随缓存条目一起淘汰
+
+    因此无论服务累计处理过多少任务，进程内常驻的任务数据都不超过 max_size 条（加上少量待写记录）。
+
+    shared=True 用于多个进程共用同一个底层仓库（多 worker 部署）：
+    - 新建任务同步写入底层仓库，客户端拿到 task_id 后的下一次查询无论落到哪个 worker 都能找到
+    - 每个任务只由创建它的进程执行和更新，本进程写入的记录始终是最新的，可以直接缓存；
+      唯一的例外是取消：任一进程都可以 `mark_cancelled`，执行任务的进程通过 `cancellation_requested` 发现并停止
+    - 从底层仓库读到的其他进程的任务，只有进入终态（不会再变化）后才缓存，运行中的任务每次都读取最新状态
+
+    executes_tasks=False 用于只创建任务、由其他进程执行的场景（worker 模式下的 API 进程）：
+    新建的任务记录不放入本进程缓存，之后的查询总是读取执行进程写入的最新状态。
+    """
+
+    def __init__(self, backend: TaskRepository, result_store: ResultStore,
+                 max_size: int = 100, ttl_seconds: float = 3600,
+                 writer: Optional[PersistenceWriter] = None, shared: bool = False,
+                 executes_tasks: bool = True):
+        self.backend = backend
+        self.result_store = result_store
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.writer = writer
+        self.shared = shared
+        self.executes_tasks = executes_tasks
+
+        # task_id -> {"task": 任务记录, "result": 懒加载的结果, "cached_at": 写入缓存的时间}
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # task_id -> 已更新但尚未由写线程落盘的最新任务记录
+        self._dirty: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    # --------------------------- 缓存维护 ---------------------------
+    def _put(self, task: Dict[str, Any]):
+        """写入/刷新缓存条目，结果文件未变化时保留已懒加载的结果"""
+        task_id = task["task_id"]
+        with self._lock:
+            entry = self._cache.pop(task_id, None)
+            result = None
+            if entry is not None and entry["task"].get("result_file") == task.get("result_file"):
+                result = entry["result"]
+            self._cache[task_id] = {"task": task, "result": result, "cached_at": time.monotonic()}
+            self._evict_locked()
+
+    def _lookup(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """查找未过期的缓存条目，并标记为最近使用"""
+        with self._lock:
+            entry = self._cache.get(task_id)
+            if entry is None:
+                return None
+            if time.monotonic() - entry["cached_at"] > self.ttl_seconds:
+                del self._cache[task_id]
+                return None
+            self._cache.move_to_end(task_id)
+            return entry
+
+    def _evict_locked(self):
+        """
+        淘汰缓存条目（调用方需持有锁）
+
+        OrderedDict 按最近使用的顺序排列，最前面是最久未访问的条目：先弹出排在最前面的过期条目，
+        再按 LRU 顺序弹出超出容量的条目。每个条目只会被弹出一次，均摊每次写入 O(1)，不再扫描整个缓存；
+        排在后面的过期条目由 `_lookup` 在访问时清理，容量上限保证它们不会无限累积。
+        """
+        now = time.monotonic()
+        while self._cache:
+            oldest = next(iter(self._cache.values()))
+            if now - oldest["cached_at"] <= self.ttl_seconds:
+                break
+            self._cache.popitem(last=False)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    # --------------------------- 持久化 ---------------------------
+    def _persist(self, task: Dict[str, Any], sync: bool = False):
+        """把任务最新状态写入底层仓库：有写线程时排队合并，否则（或 sync=True 时）同步写入"""
+        if self.writer is None or sync:
+            self.backend.save(task)
+            return
+
+        task_id = task["task_id"]
+        with self._lock:
+            self._dirty[task_id] = task
+        self.writer.submit(("task", task_id), lambda: self._flush_task(task_id))
+
+    def _flush_task(self, task_id: str):
+        """在写线程中执行：取出该任务最新的待写记录并落盘"""
+        with self._lock:
+            task = self._dirty.get(task_id)
+        if task is None:
+            return
+        self.backend.save(task)
+        with self._lock:
+            # 落盘期间没有新的更新时才清除待写标记
+            if self._dirty.get(task_id) is task:
+                del self._dirty[task_id]
+
+    # --------------------------- 仓库接口 ---------------------------
+    def load(self):
+        self.backend.load()
+
+    def create(self, task: Dict[str, Any]):
+        init_task_version(task)
+        if self.executes_tasks:
+            self._put(task)
+        self._persist(task, sync=self.shared or not self.executes_tasks)
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._lookup(task_id)
+        if entry is not None:
+            return entry["task"]
+        with self._lock:
+            task = self._dirty.get(task_id)
+        if task is not None:
+            self._put(task)
+            return task
+        task = self.backend.get(task_id)
+        if task is not None and (not self.shared or task.get("status") in TERMINAL_STATUSES):
+            self._put(task)
+        return task
+
+    def exists(self, task_id: str) -> bool:
+        return self.get(task_id) is not None
+
+    def update(self, task_id: str, **fields) -> Optional[Dict[str, Any]]:
+        current = self.get(task_id)
+        if current is None:
+            return None
+        # 生成新的记录对象而不是原地修改，写线程拿到的始终是某一时刻的完整快照；
+        # 所有字段都没有变化时版本号不变，也不必再次落盘
+        task = apply_task_update(current, fields)
+        if task is current:
+            return task
+        self._put(task)
+        self._persist(task)
+        return task
+
+    def mark_cancelled(self, task_id: str, message: str) -> Optional[Dict[str, Any]]:
+        """
+        把任务标记为 cancelled 并同步落盘
+
+        立即写入底层仓库而不是交给写线程，多进程共享时执行该任务的进程下一次检查就能看到；
+        同时丢弃该任务尚未落盘的旧记录，避免写线程随后用旧状态覆盖取消状态。
+        """
+        current = self.get(task_id)
+        if current is None:
+            return None
+        task = apply_task_update(current, {"status": "cancelled", "message": message})
+        with self._lock:
+            self._dirty.pop(task_id, None)
+        self._put(task)
+        self._persist(task, sync=True)
+        return task
+
+    def cancellation_requested(self, task_id: str) -> bool:
+        """
+        任务是否已被取消
+
+        shared 模式下直接读取底层仓库，才能看到其他进程发起的取消；
+        读到取消状态时以它替换本进程缓存中的运行中记录，并丢弃尚未落盘的进度更新。
+        """
+        if not self.shared:
+            task = self.get(task_id)
+            return task is not None and task.get("status") == "cancelled"
+        stored = self.backend.get(task_id)
+        if stored is None or stored.get("status") != "cancelled":
+            return False
+        with self._lock:
+            self._dirty.pop(task_id, None)
+        self._put(stored)
+        return True
+
+    def get_result(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """
+        读取任务结果：优先使用缓存中已懒加载的结果，其次是任务记录中的内联结果（旧数据），
+        最后才从 `results/` 文件中读取并放入缓存
+        """
+        task = self.get(task_id)
+        if task is None:
+            return None
+        if task.get("result") is not None:
+            return task["result"]
+        if not task.get("result_file"):
+            return None
+
+        entry = self._lookup(task_id)
+        if entry is not None and entry["result"] is not None:
+            return entry["result"]
+
+        result = self.result_store.load(task["result_file"])
+        with self._lock:
+            entry = self._cache.get(task_id)
+            if entry is not None and entry["task"].get("result_file") == task["result_file"]:
+                entry["result"] = result
+        return result
+
+    def query_summaries(self, query: TaskQuery) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        # 列表查询直接走底层仓库的索引，先把写线程尚未落盘的记录写入，
+        # 否则刚更新的任务会以旧状态列出（或被状态过滤条件错误地包含/排除）
+        self._save_dirty()
+        return self.backend.query_summaries(query)
+
+    def _save_dirty(self):
+        """
+        立即把所有待写记录写入底层仓库
+
+        待写标记不在这里清除，仍由写线程在写入最新记录后清除，写线程随后的写入内容与这里相同或更新。
+        任务更新都在事件循环线程中进行，与列表查询不会同时发生，这里写入的就是最新记录。
+        """
+        with self._lock:
+            pending = list(self._dirty.values())
+        for task in pending:
+            self.backend.save(task)
+
+    def count(self) -> int:
+        return self.backend.count()
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.flush()
+        with self._lock:
+            self._cache.clear()
+        self.backend.close()
+
+
+# --------------------------- 工厂函数 ---------------------------
+def create_task_repository(backend: str, db_path: str, snapshot_path: str, journal_path: str,
+                           compact_threshold: int = 500) -> TaskRepository:
+    """
+    根据配置创建任务仓库
+
+    参数：
+    - backend: "sqlite"（默认）或 "journal"
+    - db_path: SQLite 数据库文件路径
+    - snapshot_path / journal_path: 快照与追加日志文件路径（journal 后端使用，sqlite 后端用于导入旧数据）
+    - compact_threshold: 触发日志压缩的条数
+    """
+    if backend == "journal":
+        return JournaledTaskRepository(snapshot_path, journal_path, compact_threshold)
+    if backend == "sqlite":
+        return SQLiteTaskRepository(db_path, legacy_snapshot_path=snapshot_path)
+    raise ValueError(f"未知的任务存储后端: {backend}")
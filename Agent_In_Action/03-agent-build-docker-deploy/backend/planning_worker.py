@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+规划任务 worker 进程
+
+PLANNING_EXECUTION_MODE=worker 时，API 只把规划作业写入持久化作业队列（见 `data/job_queue.py`），
+由这里启动的 worker 进程领取并执行（`LangGraphTravelAgents` / `SimpleTravelAgent`），
+进度与结果写回共享的 SQLite 任务仓库，API 的 `/status`、`/result` 等接口照常查询。
+
+用法（在 backend 目录下执行）：
+    python -m planning_worker                            # 启动 PLANNING_WORKER_PROCESSES 个 worker 进程
+    python -m planning_worker --processes 4              # 同一台机器上启动 4 个 worker 进程
+    python -m planning_worker --concurrency 2            # 每个进程同时执行 2 个作业
+
+每个 worker 进程：
+1. 按 PLANNING_MAX_CONCURRENCY 控制同时执行的作业数，有空闲名额时才领取下一个作业
+2. 执行期间定期续约；续约失败说明作业已被取消（或租约过期后被其他 worker 接管），立即停止运行
+3. 收到 SIGTERM / SIGINT 时停止领取新作业，中断执行中的作业并放回队列，由其他 worker 重新执行
+
+适用于大模型技术初级用户：
+把耗时的 AI 推理从 Web 服务进程中拆出来，API 进程只负责接收请求和查询状态，
+推理进程崩溃不会影响 API，两者也可以按各自的负载分别增加进程数。
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from config.app_config import (
+    PLANNING_EXECUTION_MODE, PLANNING_MAX_CONCURRENCY, PLANNING_WORKER_PROCESSES,
+    PLANNING_WORKER_POLL_INTERVAL_SECONDS, PLANNING_JOB_LEASE_SECONDS, PLANNING_JOB_MAX_ATTEMPTS,
+    AGENT_WARMUP_ON_STARTUP
+)
+
+worker_logger = logging.getLogger('api_server')
+
+
+class PlanningWorker:
+    """
+    单个 worker 进程中的作业循环
+
+    任务仓库、作业队列、规划线程池与作业执行函数都复用 `api_server` 模块中的同一套对象，
+    作业的执行逻辑（超时、降级、进度上报、结果保存）与 inprocess 模式完全相同。
+    """
+
+    def __init__(self, server, concurrency: int):
+        self.server = server
+        self.queue = server.job_queue
+        self.concurrency = max(1, concurrency)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._stopping = asyncio.Event()
+        self._running = set()
+
+    def stop(self):
+        """停止领取新作业（信号处理函数中调用）"""
+        self._stopping.set()
+
+    async def run(self):
+        self.server.load_tasks_state()
+        self.queue.load()
+        if AGENT_WARMUP_ON_STARTUP:
+            # 领取作业前创建好共享的智能体实例，第一个作业无需等待初始化
+            await self.server.run_in_planning_executor(self.server.agent_runtime.warm_up)
+        worker_logger.info(f"规划 worker {self.worker_id} 已启动，同时执行 {self.concurrency} 个作业")
+
+        slots = asyncio.Semaphore(self.concurrency)
+        while not self._stopping.is_set():
+            await slots.acquire()
+            job = self.queue.claim(self.worker_id, PLANNING_JOB_LEASE_SECONDS)
+            if job is None:
+                slots.release()
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=PLANNING_WORKER_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            running = asyncio.create_task(self.execute(job), name=f"planning-job-{job.task_id}")
+            self._running.add(running)
+            running.add_done_callback(self._running.discard)
+            running.add_done_callback(lambda _: slots.release())
+
+        # 中断执行中的作业，execute 会把它们放回队列
+        for running in list(self._running):
+            running.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
+        worker_logger.info(f"规划 worker {self.worker_id} 已停止")
+
+    async def execute(self, job):
+        """执行一个作业，期间按租约时长的 1/3 续约；无论作业以何种方式结束，都释放该运行的流式事件状态"""
+        try:
+            await self._execute(job)
+        finally:
+            self.server.planning_events.close(job.task_id)
+
+    async def _execute(self, job):
+        task_id = job.task_id
+        if job.attempts > PLANNING_JOB_MAX_ATTEMPTS:
+            # 作业已被多个 worker 领取过仍未完成（通常是执行过程中进程崩溃），不再重试
+            worker_logger.error(f"规划作业 {task_id} 已领取 {job.attempts - 1} 次仍未完成，标记为失败")
+            self.server.update_run(task_id, status="failed", message="规划任务多次执行中断，请重新提交")
+            self.queue.finish(task_id)
+            return
+
+        runner = self.server.PLANNING_JOB_RUNNERS.get(job.kind)
+        if runner is None:
+            worker_logger.error(f"规划作业 {task_id} 的类型未知: {job.kind}")
+            self.server.update_run(task_id, status="failed", message=f"未知的规划作业类型: {job.kind}")
+            self.queue.finish(task_id)
+            return
+
+        worker_logger.info(f"worker {self.worker_id} 开始执行规划作业 {task_id}（第 {job.attempts} 次领取）")
+        run = asyncio.create_task(runner(task_id, job.payload), name=f"planning-{task_id}")
+        try:
+            while True:
+                done, _ = await asyncio.wait({run}, timeout=PLANNING_JOB_LEASE_SECONDS / 3)
+                if done:
+                    break
+                if not self.queue.renew(task_id, self.worker_id, PLANNING_JOB_LEASE_SECONDS):
+                    worker_logger.info(f"规划作业 {task_id} 已被取消或已由其他 worker 接管，停止执行")
+                    run.cancel()
+                    await asyncio.wait({run})
+                    # 作业已被删除（取消）时清理残留的成员记录；被其他 worker 接管的作业成员仍在使用，保持不变
+                    self.queue.discard_members(task_id)
+                    return
+        except asyncio.CancelledError:
+            # worker 进程停止：中断运行并把作业放回队列，由其他 worker 重新执行
+            run.cancel()
+            await asyncio.gather(run, return_exceptions=True)
+            self.queue.release(task_id, self.worker_id)
+            worker_logger.info(f"worker 停止，规划作业 {task_id} 已放回队列")
+            raise
+
+        if run.cancelled():
+            # 所有成员任务都已取消，进度回调取消了运行
+            worker_logger.info(f"规划作业 {task_id} 已取消")
+        elif run.exception() is not None:
+            worker_logger.error(f"规划作业 {task_id} 执行异常: {run.exception()}")
+        self.queue.finish(task_id)
+
+
+def run_worker_process(concurrency: int):
+    """单个 worker 进程的入口：导入 api_server（得到任务仓库、作业队列等），运行作业循环直到收到停止信号"""
+    # api_server 的日志只写入 logs/backend.log，worker 额外输出到控制台，便于 docker logs 查看
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - worker[{os.getpid()}] - %(levelname)s - %(message)s")
+    # 在 worker 进程内导入，每个进程拥有独立的数据库连接、热缓存与后台写线程；
+    # 导入前声明进程角色，任务仓库按"本进程执行任务"创建（缓存自己更新的任务，进度更新交给写线程合并落盘）
+    os.environ["PLANNING_PROCESS_ROLE"] = "worker"
+    import api_server
+
+    async def main():
+        worker = PlanningWorker(api_server, concurrency)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, worker.stop)
+        try:
+            await worker.run()
+        finally:
+            api_server.flush_task_state()
+
+    asyncio.run(main())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="旅行规划 worker：从作业队列领取并执行规划任务")
+    parser.add_argument("--processes", type=int, default=PLANNING_WORKER_PROCESSES,
+                        help=f"启动的 worker 进程数（默认 {PLANNING_WORKER_PROCESSES}）")
+    parser.add_argument("--concurrency", type=int, default=PLANNING_MAX_CONCURRENCY,
+                        help=f"每个进程同时执行的作业数（默认 {PLANNING_MAX_CONCURRENCY}）")
+    args = parser.parse_args(argv)
+
+    if PLANNING_EXECUTION_MODE != "worker":
+        parser.error("规划 worker 需要设置 PLANNING_EXECUTION_MODE=worker（API 进程也需使用相同配置）")
+
+    if args.processes <= 1:
+        run_worker_process(args.concurrency)
+        return
+
+    # 使用 spawn 启动子进程：每个子进程重新导入模块，不会继承父进程的线程与数据库连接
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_worker_process, args=(args.concurrency,), name=f"planning-worker-{i}")
+        for i in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+
+    def forward_signal(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward_signal)
+    signal.signal(signal.SIGINT, forward_signal)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+测试共用的 fixture
+
+api_server 在导入时根据环境变量和当前目录创建任务仓库、结果目录等全局对象，服务关闭时会关闭规划线程池与后台写线程，
+一个测试进程只能导入并启动一次。因此由这里统一在临时目录中导入、用同一个 TestClient 启动，
+各测试模块共用（测试之间用不同的目的地、指纹等区分各自的任务）。
+"""
+
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional, Set
+
+import pytest
+from fastapi.testclient import TestClient
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+# 配置在导入时读取密钥，测试只使用假模型，有一个非空的值即可创建客户端
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+
+
+@pytest.fixture(scope="session")
+def api_server(tmp_path_factory):
+    """在临时目录中导入 api_server，任务数据库、结果文件与日志都写到临时目录"""
+    workdir = tmp_path_factory.mktemp("backend")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(workdir)
+        import api_server
+        yield api_server
+
+
+@pytest.fixture(scope="session")
+def client(api_server):
+    """整个测试进程共用的测试客户端：进入时执行服务的 startup 事件，所有测试结束后执行 shutdown"""
+    with TestClient(api_server.app) as client:
+        yield client
+
+
+class BlockingJobs:
+    """
+    一种一直等待、直到被取消的规划作业，用来测试排队、取消与合并执行而不调用模型
+
+    submit() 在事件循环线程中（通过 TestClient 的 portal）把作业交给 api_server 的规划调度器，
+    submitted 记录提交的任务 ID，started / cancelled 记录开始执行与被取消的运行。
+    """
+
+    kind = "test-blocking"
+
+    def __init__(self, api_server, client):
+        self.api_server = api_server
+        self.client = client
+        self.submitted: List[str] = []
+        self.started: Set[str] = set()
+        self.cancelled: Set[str] = set()
+
+    async def run(self, task_id: str, payload):
+        self.started.add(task_id)
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            self.cancelled.add(task_id)
+            raise
+
+    def submit(self, fingerprint: Optional[str] = None, destination: str = "阻塞作业测试") -> str:
+        task_id = str(uuid.uuid4())
+        self.client.portal.call(self.api_server.enqueue_planning_task, {
+            "task_id": task_id,
+            "current_agent": "系统初始化",
+            "message": "任务已创建，正在排队等待规划...",
+            "created_at": datetime.now().isoformat(),
+            "request": {"destination": destination},
+            "result": None
+        }, self.kind, {}, fingerprint)
+        self.submitted.append(task_id)
+        return task_id
+
+
+@pytest.fixture
+def blocking_jobs(api_server, client, monkeypatch):
+    """注册阻塞作业；测试结束时停止本测试提交的、仍在执行或排队的运行"""
+    jobs = BlockingJobs(api_server, client)
+    monkeypatch.setitem(api_server.PLANNING_JOB_RUNNERS, jobs.kind, jobs.run)
+    yield jobs
+    for task_id in jobs.submitted:
+        client.portal.call(api_server.planning_scheduler.cancel, task_id)
@@ -0,0 +1,83 @@
+"""
+任务取消测试：DELETE /tasks/{task_id} 停止执行中/排队中的任务，以及被放弃任务的自动取消
+
+使用 conftest.py 中一直等待直到被取消的阻塞作业，不调用模型。
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_cancellation.py
+"""
+
+import time
+import uuid
+from datetime import datetime
+
+
+def wait_until(condition, timeout: float = 5, interval: float = 0.02) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
+
+
+def test_delete_stops_running_task(api_server, client, blocking_jobs):
+    task_id = blocking_jobs.submit()
+    assert wait_until(lambda: task_id in blocking_jobs.started)
+
+    response = client.delete(f"/tasks/{task_id}")
+    assert response.status_code == 200 and response.json()["status"] == "cancelled"
+    # 执行中的作业在当前 await 处收到 CancelledError
+    assert wait_until(lambda: task_id in blocking_jobs.cancelled)
+    assert client.get(f"/status/{task_id}").json()["status"] == "cancelled"
+    assert task_id not in client.portal.call(api_server.planning_scheduler.task_ids)
+    # 重复取消直接返回已取消状态
+    assert client.delete(f"/tasks/{task_id}").json()["status"] == "cancelled"
+
+
+def test_delete_removes_queued_task_before_it_starts(api_server, client, blocking_jobs):
+    running = [blocking_jobs.submit() for _ in range(api_server.planning_scheduler.workers)]
+    assert wait_until(lambda: blocking_jobs.started >= set(running))
+    queued = blocking_jobs.submit()
+    assert client.get(f"/status/{queued}").json()["queue_position"] == 1
+
+    assert client.delete(f"/tasks/{queued}").status_code == 200
+    assert queued not in client.portal.call(api_server.planning_scheduler.task_ids)
+    # 空出名额后排队的任务也不会再开始执行
+    client.delete(f"/tasks/{running[0]}")
+    assert wait_until(lambda: running[0] in blocking_jobs.cancelled)
+    time.sleep(0.1)
+    assert queued not in blocking_jobs.started
+
+
+def test_finished_or_unknown_tasks_cannot_be_cancelled(api_server, client):
+    task_id = str(uuid.uuid4())
+    api_server.task_repo.create({
+        "task_id": task_id, "status": "completed", "progress": 100, "current_agent": "", "message": "旅行规划完成！",
+        "created_at": datetime.now().isoformat(), "request": {"destination": "取消测试"}, "result": {"success": True}
+    })
+    assert client.delete(f"/tasks/{task_id}").status_code == 409
+    assert client.delete(f"/tasks/{uuid.uuid4()}").status_code == 404
+
+
+def test_reaper_cancels_only_tasks_nobody_polls(api_server, client, blocking_jobs, monkeypatch):
+    monkeypatch.setattr(api_server, "ABANDON_TIMEOUT_SECONDS", 0.3)
+    monkeypatch.setattr(api_server, "PLANNING_ABANDON_CHECK_INTERVAL_SECONDS", 0.05)
+    abandoned, watched = blocking_jobs.submit(), blocking_jobs.submit()
+    api_server.task_last_seen["already-finished"] = 0.0
+    reaper = client.portal.start_task_soon(api_server.reap_abandoned_tasks)
+    try:
+        # 前端每隔一小段时间查询一次 watched，从不查询 abandoned
+        def poll_watched_until_abandoned_is_cancelled():
+            client.get(f"/status/{watched}")
+            return abandoned in blocking_jobs.cancelled
+
+        assert wait_until(poll_watched_until_abandoned_is_cancelled, interval=0.05)
+        assert client.get(f"/status/{abandoned}").json()["status"] == "cancelled"
+        assert "长时间未查询" in client.get(f"/status/{abandoned}").json()["message"]
+        assert client.get(f"/status/{watched}").json()["status"] == "queued"
+        assert watched not in blocking_jobs.cancelled
+        # 已不在调度器中的任务只清理查询记录
+        assert "already-finished" not in api_server.task_last_seen
+    finally:
+        reaper.cancel()
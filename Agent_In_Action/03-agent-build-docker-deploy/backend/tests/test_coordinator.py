@@ -0,0 +1,115 @@
+"""
+协调员测试：提示词大小、rules 策略下的调度与最终综合
+
+用一个记录输入的假模型代替 ChatOpenAI，检查顺序模式一次规划中模型被调用的次数与内容；
+协调员提示词只包含各智能体的摘要，完成的智能体越来越多时提示词大小应保持在预算之内。
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_coordinator.py
+"""
+
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from agents.agent_digest import estimate_tokens
+from agents.langgraph_agents import SPECIALIST_AGENTS, LangGraphTravelAgents
+from config.langgraph_config import langgraph_config as config
+
+TRAVEL_REQUEST = {
+    "destination": "杭州",
+    "duration": 3,
+    "budget_range": "中等",
+    "interests": ["美食", "历史"],
+    "group_size": 2,
+    "travel_dates": "2025-08-14 至 2025-08-16"
+}
+
+SYNTHESIS = "综合建议：第一天游西湖，第二天看灵隐寺，雨天备好雨具。"
+
+
+class RecordingChatModel(BaseChatModel):
+    """记录每次调用的输入消息；最后一条输入要求综合时返回 SYNTHESIS，否则返回固定的智能体回复"""
+
+    calls: List[Any]
+
+    @property
+    def _llm_type(self) -> str:
+        return "recording-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls.append(messages)
+        content = SYNTHESIS if "综合" in messages[-1].content else "测试建议：西湖游船。\n- 龙井虾仁\n- 灵隐寺"
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=content))])
+
+
+@pytest.fixture
+def agents():
+    agents = LangGraphTravelAgents(execution_mode="sequential", coordinator_policy="rules")
+    agents.llm = RecordingChatModel(calls=[])
+    return agents
+
+
+def state_after(agents, finished: int, response_chars: int = 3000):
+    """前 finished 个专业智能体各自给出一段很长的回复之后的状态"""
+    state = agents._initial_state(TRAVEL_REQUEST)
+    for agent_name in SPECIALIST_AGENTS[:finished]:
+        lines = [f"{agent_name} 的建议：西湖游船，品尝龙井虾仁，参观灵隐寺。"]
+        lines += [f"- 第 {i} 条要点：" + "这一天的行程安排与注意事项" * 5 for i in range(response_chars // 80)]
+        update = agents._record_specialist_output(agent_name, AIMessage(content="\n".join(lines)))
+        state["messages"] = state["messages"] + update["messages"]
+        state["agent_outputs"] = {**state["agent_outputs"], **update["agent_outputs"]}
+        state["agent_digests"] = {**state["agent_digests"], **update["agent_digests"]}
+    return state
+
+
+def test_coordinator_prompt_stays_bounded_as_agents_finish(agents):
+    empty = agents._prompt_tokens(agents._coordinator_messages(state_after(agents, 0)))
+    one = agents._prompt_tokens(agents._coordinator_messages(state_after(agents, 1)))
+    state = state_after(agents, len(SPECIALIST_AGENTS))
+    all_agents = agents._prompt_tokens(agents._coordinator_messages(state))
+
+    # 完整回复加起来远超预算，提示词却只比没有任何输出时多出摘要预算和截断后的最近消息
+    full_outputs = sum(estimate_tokens(output["response"]) for output in state["agent_outputs"].values())
+    bound = empty + config.COORDINATOR_DIGEST_TOKEN_BUDGET + 3 * config.COORDINATOR_RECENT_MESSAGE_CHARS
+    assert full_outputs > 5 * bound
+    assert one <= bound and all_agents <= bound
+    # 每个完成的智能体都出现在摘要中，但完整回复不会被嵌入
+    prompt = agents._coordinator_messages(state)[0].content
+    assert all(agent_name in prompt for agent_name in SPECIALIST_AGENTS)
+    assert "第 30 条要点" not in prompt
+    # 最终综合使用同样的摘要，大小同样有界
+    assert agents._prompt_tokens(agents._final_synthesis_messages(state)) <= bound
+
+
+def test_rules_policy_synthesizes_once_after_all_specialists(agents):
+    result = agents.run_travel_planning(TRAVEL_REQUEST)
+
+    assert result["success"]
+    assert set(result["agent_outputs"]) == set(SPECIALIST_AGENTS)
+    # 每个专业智能体一次，最后协调员综合一次；中间的调度都按规则决定，不调用模型
+    calls = agents.llm.calls
+    assert len(calls) == len(SPECIALIST_AGENTS) + 1
+    assert "目前智能体输出摘要" in calls[-1][0].content
+    assert result["travel_plan"]["summary"] == SYNTHESIS
+    # 提示词大小只写日志，不出现在返回给用户的结果中
+    assert "coordinator_prompt_tokens" not in result
+
+
+def test_synthesis_timeout_falls_back_to_default_summary(agents, monkeypatch):
+    original = agents.llm.__class__._generate
+
+    def generate(self, messages, *args, **kwargs):
+        if "综合" in messages[-1].content:
+            raise TimeoutError("综合超时")
+        return original(self, messages, *args, **kwargs)
+
+    monkeypatch.setattr(RecordingChatModel, "_generate", generate)
+    result = agents.run_travel_planning(TRAVEL_REQUEST)
+
+    assert result["success"]
+    assert result["travel_plan"]["summary"] == "使用LangGraph框架的多智能体协作生成的旅行计划"
@@ -0,0 +1,124 @@
+"""
+截止时间传递测试：Deadline 的计算、工具与模型调用在截止时间后不再发起、剩余时间不足时跳过可选智能体
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_deadline.py
+"""
+
+import asyncio
+import time
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from agents.langgraph_agents import LangGraphTravelAgents
+from config.langgraph_config import langgraph_config as config
+from utils.deadline import Deadline, remaining_timeout, use_deadline
+
+TRAVEL_REQUEST = {"destination": "杭州", "duration": 3, "budget_range": "中等", "interests": ["美食"]}
+
+
+class CountingChatModel(BaseChatModel):
+    """记录调用次数的假模型"""
+
+    calls: List[int]
+
+    @property
+    def _llm_type(self) -> str:
+        return "counting-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls.append(1)
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="测试建议"))])
+
+
+class RecordingTool:
+    """记录调用及调用时可用超时的假工具（同步调用时 coroutine 为 None）"""
+
+    coroutine = None
+
+    def __init__(self):
+        self.timeouts: List[float] = []
+
+    def invoke(self, params):
+        self.timeouts.append(remaining_timeout(cap=1000))
+        return "西湖"
+
+    async def ainvoke(self, params):
+        return self.invoke(params)
+
+
+@pytest.fixture
+def agents(monkeypatch):
+    agents = LangGraphTravelAgents(execution_mode="sequential")
+    agents.llm = CountingChatModel(calls=[])
+    tool = RecordingTool()
+    monkeypatch.setattr(agents, "_select_tool", lambda state, query: ("fake_search", tool, {}))
+    agents.tool = tool
+    return agents
+
+
+def state_with(agents, deadline: Deadline, **fields):
+    return {**agents._initial_state(TRAVEL_REQUEST, deadline), **fields}
+
+
+def test_deadline_arithmetic():
+    deadline = Deadline.after(10)
+    assert 9 < deadline.remaining() <= 10 and not deadline.expired
+    assert deadline.timeout(cap=3) == 3
+    assert 4 < deadline.timeout(reserve=5) <= 5
+    assert deadline.sooner(2).remaining() <= 2
+    assert deadline.sooner(60) == deadline
+
+    expired = Deadline(time.monotonic() - 1)
+    assert expired.expired and expired.remaining() == 0 and expired.timeout(cap=3) == 0
+
+    assert remaining_timeout(30) == 30  # 没有截止时间时使用上限
+    with use_deadline(Deadline.after(5)):
+        assert remaining_timeout(30) <= 5
+    assert remaining_timeout(30) == 30
+
+
+def test_expired_deadline_raises_before_any_tool_call(agents):
+    state = state_with(agents, Deadline(time.monotonic() - 1))
+    with pytest.raises(TimeoutError):
+        agents._tool_deadline(state)
+
+    assert agents._execute_tool(state, "杭州景点") == "工具执行超时，未获取到搜索结果"
+    assert asyncio.run(agents._aexecute_tool(state, "杭州景点")) == "工具执行超时，未获取到搜索结果"
+    assert agents.tool.timeouts == []
+
+
+def test_tool_sees_remaining_time_as_its_timeout(agents):
+    agents._execute_tool(state_with(agents, Deadline.after(5)), "杭州景点")
+    asyncio.run(agents._aexecute_tool(state_with(agents, Deadline.after(1000)), "杭州景点"))
+    first, second = agents.tool.timeouts
+    assert first <= 5
+    assert second <= config.AGENT_TOOL_TIMEOUT_SECONDS
+
+
+def test_expired_deadline_skips_model_call(agents):
+    state = state_with(agents, Deadline(time.monotonic() - 1))
+    with pytest.raises(TimeoutError):
+        agents._llm_timeout(state)
+
+    for update in (agents._run_specialist("travel_advisor", state),
+                   asyncio.run(agents._arun_specialist("travel_advisor", state))):
+        assert update["agent_outputs"]["travel_advisor"]["status"] == "timeout"
+    assert agents.llm.calls == []
+
+
+def test_short_on_time_runs_only_required_agents(agents):
+    short = Deadline.after(config.AGENT_OPTIONAL_MIN_SECONDS / 2)
+    state = state_with(agents, short, agent_outputs={"travel_advisor": {"response": "..."}},
+                       messages=[AIMessage(content="旅行顾问的建议")])
+    # 剩余时间不足：跳过天气、预算、当地专家，直接完成必需的行程规划师
+    assert agents._coordinator_router(state) == "itinerary_planner"
+    state["agent_outputs"]["itinerary_planner"] = {"response": "..."}
+    assert agents._coordinator_router(state) == "end"
+    # 剩余时间不足时也不再搜索
+    assert agents._agent_router({**state, "messages": [AIMessage(content="NEED_SEARCH: 杭州天气")]}) == "coordinator"
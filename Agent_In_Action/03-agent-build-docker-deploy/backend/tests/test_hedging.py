@@ -0,0 +1,98 @@
+"""
+对冲降级测试：LatencyTracker 的阈值计算与 hedged_call 的启动时机、胜负与取消
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_hedging.py
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from utils.hedging import LatencyTracker, hedged_call
+
+DELAY = 0.2
+
+
+class Branch:
+    """一个可控的分支：sleep 秒后返回 value（或抛出 error），记录开始时间与是否被取消"""
+
+    def __init__(self, seconds: float, value=None, error: Exception = None):
+        self.seconds = seconds
+        self.value = value
+        self.error = error
+        self.started_at = None
+        self.cancelled = False
+
+    async def __call__(self):
+        self.started_at = time.monotonic()
+        try:
+            await asyncio.sleep(self.seconds)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def run_hedged(primary: Branch, hedge: Branch, **kwargs):
+    async def main():
+        started = time.monotonic()
+        result = await hedged_call(primary(), hedge, DELAY, **kwargs)
+        return result, started
+    return asyncio.run(main())
+
+
+def test_fast_primary_never_starts_hedge():
+    primary, hedge = Branch(0.01, "完整方案"), Branch(0, "简化方案")
+    (result, hedged), _ = run_hedged(primary, hedge)
+    assert (result, hedged) == ("完整方案", False)
+    assert hedge.started_at is None
+
+
+def test_hedge_starts_only_after_delay_and_cancels_slow_primary():
+    primary, hedge = Branch(10, "完整方案"), Branch(0.01, "简化方案")
+    on_hedge = []
+    (result, hedged), started = run_hedged(primary, hedge, on_hedge=lambda: on_hedge.append(time.monotonic()))
+
+    assert (result, hedged) == ("简化方案", True)
+    assert hedge.started_at - started >= DELAY * 0.9
+    assert on_hedge and on_hedge[0] <= hedge.started_at
+    assert primary.cancelled
+
+
+def test_primary_finishing_first_after_hedge_cancels_hedge():
+    primary, hedge = Branch(DELAY + 0.05, "完整方案"), Branch(10, "简化方案")
+    (result, hedged), _ = run_hedged(primary, hedge)
+    assert (result, hedged) == ("完整方案", False)
+    assert hedge.started_at is not None and hedge.cancelled
+
+
+def test_rejected_hedge_result_waits_for_primary():
+    primary, hedge = Branch(DELAY + 0.1, {"success": True}), Branch(0.01, {"success": False})
+    (result, hedged), _ = run_hedged(primary, hedge, accept=lambda value: value["success"])
+    assert (result, hedged) == ({"success": True}, False)
+
+
+def test_both_failing_raises_primary_error():
+    primary, hedge = Branch(DELAY + 0.05, error=RuntimeError("多智能体失败")), Branch(0.01, error=ValueError("简化失败"))
+    with pytest.raises(RuntimeError, match="多智能体失败"):
+        run_hedged(primary, hedge)
+
+
+def test_threshold_uses_default_until_enough_samples_then_percentile():
+    tracker = LatencyTracker(window=100, percentile=95, min_samples=20, default_seconds=120, min_seconds=30)
+    for seconds in range(1, 20):
+        tracker.record(seconds * 10)
+    assert tracker.threshold() == 120
+
+    tracker.record(200)
+    # 20 个样本 10..190 与 200，第 ceil(0.95 * 20) = 19 个为 190
+    assert tracker.threshold() == 190
+    # 结果不低于下限、不高于上限
+    assert LatencyTracker(min_samples=1, min_seconds=30, max_seconds=60).threshold() == 60
+    fast = LatencyTracker(min_samples=1, min_seconds=30)
+    fast.record(1)
+    assert fast.threshold() == 30
@@ -0,0 +1,47 @@
+"""
+启动导入耗时测试：api_server 的导入耗时不超过 IMPORT_TIME_BUDGET_SECONDS，且不加载智能体依赖
+
+同一测试进程中其他测试已经导入过 api_server 与 LangGraph，这里在新的 Python 进程中导入，
+测到的才是服务冷启动时的真实情况。
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_import_time.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+from config.app_config import IMPORT_TIME_BUDGET_SECONDS
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# 这些模块导入较慢，只应在第一次创建规划任务（或预热）时导入
+HEAVY_MODULES = ["langgraph", "langchain_openai"]
+
+IMPORT_SCRIPT = f"""
+import json, sys
+sys.path.insert(0, {str(BACKEND_DIR)!r})
+import api_server
+print(json.dumps({{
+    "seconds": api_server.IMPORT_DURATION_SECONDS,
+    "loaded": [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+}}))
+"""
+
+
+def test_api_server_import_is_within_budget_and_skips_agent_dependencies(tmp_path):
+    # 在临时目录中导入：任务数据库、日志等写到临时目录
+    env = {**os.environ, "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "test-key"}
+    completed = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT], cwd=tmp_path, env=env,
+        capture_output=True, text=True, timeout=60, check=True
+    )
+    measured = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    assert measured["loaded"] == []
+    assert measured["seconds"] <= IMPORT_TIME_BUDGET_SECONDS, (
+        f"导入耗时 {measured['seconds']:.3f} 秒，超出预算 {IMPORT_TIME_BUDGET_SECONDS} 秒"
+    )
@@ -0,0 +1,129 @@
+"""
+持久化作业队列测试：作业领取/取消与运行成员，以及相同请求在运行收尾阶段提交时不会丢失
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_job_queue.py
+"""
+
+from datetime import datetime
+
+import pytest
+
+from data.job_queue import SQLiteJobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"))
+    queue.load()
+    yield queue
+    queue.close()
+
+
+def test_identical_requests_share_one_job(queue):
+    assert queue.submit("a", "langgraph", {"destination": "杭州"}, fingerprint="fp") == "a"
+    assert queue.submit("b", "langgraph", {"destination": "杭州"}, fingerprint="fp") == "a"
+
+    assert queue.members("a") == ["a", "b"]
+    assert queue.run_of("b") == "a"
+    assert queue.pending_count() == 1
+    assert queue.stats() == {"queued": 1, "running": 0, "runs": 1, "followers": 1}
+
+
+def test_claim_renew_release_and_finish(queue):
+    queue.submit("a", "langgraph", {"destination": "杭州"})
+    job = queue.claim("worker-1", lease_seconds=30)
+    assert (job.task_id, job.kind, job.payload, job.attempts) == ("a", "langgraph", {"destination": "杭州"}, 1)
+    assert queue.claim("worker-2", lease_seconds=30) is None
+    assert queue.renew("a", "worker-1", 30) and not queue.renew("a", "worker-2", 30)
+
+    queue.release("a", "worker-1")
+    assert queue.claim("worker-2", lease_seconds=30).attempts == 2
+
+    queue.finish("a")
+    assert queue.task_ids() == [] and queue.members("a") == ["a"]
+
+
+def test_cancel_removes_job_and_members(queue):
+    queue.submit("a", "langgraph", {}, fingerprint="fp")
+    queue.submit("b", "langgraph", {}, fingerprint="fp")
+
+    assert queue.cancel("a")
+    assert queue.task_ids() == []
+    assert queue.run_of("b") == "b"
+    assert not queue.cancel("a")
+
+
+def test_discard_members_keeps_members_of_existing_job(queue):
+    queue.submit("a", "langgraph", {}, fingerprint="fp")
+    queue.submit("b", "langgraph", {}, fingerprint="fp")
+
+    queue.discard_members("a")  # 作业仍存在（例如被其他 worker 接管）
+    assert queue.members("a") == ["a", "b"]
+
+
+def test_sealed_run_accepts_no_new_members(queue):
+    queue.submit("a", "langgraph", {}, fingerprint="fp")
+    queue.submit("b", "langgraph", {}, fingerprint="fp")
+    queue.seal("a")
+
+    assert queue.attach("fp", "c") is None
+    assert queue.submit("d", "langgraph", {}, fingerprint="fp") == "d"
+    assert queue.members("a") == ["a", "b"]
+
+
+def test_duplicate_request_during_final_update_is_planned_again(api_server, client, queue, monkeypatch):
+    """
+    worker 写入最终状态（update_run）之后、删除作业（finish）之前，另一个 API 进程提交了相同的请求：
+    它不能再加入即将结束的运行，而是作为新作业排队，最终由 worker 重新执行
+    """
+    monkeypatch.setattr(api_server, "job_queue", queue)
+    monkeypatch.setattr(api_server, "single_flight", queue)
+    request = {"destination": "收尾竞争测试", "interests": ["美食"]}
+
+    def new_task(task_id):
+        return {
+            "task_id": task_id, "current_agent": "", "message": "",
+            "created_at": datetime.now().isoformat(), "request": request, "result": None
+        }
+
+    assert api_server.enqueue_planning_task(new_task("race-a"), "langgraph", request, "race-fp") == ("race-a", 1)
+    assert api_server.enqueue_planning_task(new_task("race-b"), "langgraph", request, "race-fp") == ("race-a", 1)
+    assert queue.claim("worker-1", lease_seconds=30).task_id == "race-a"
+
+    api_server.update_run("race-a", status="completed", progress=100, message="旅行规划完成！")
+    run_id, position = api_server.enqueue_planning_task(new_task("race-c"), "langgraph", request, "race-fp")
+    queue.finish("race-a")
+
+    assert (run_id, position) == ("race-c", 1)
+    assert [api_server.task_repo.get(task_id)["status"] for task_id in ("race-a", "race-b", "race-c")] == [
+        "completed", "completed", "queued"
+    ]
+    assert queue.claim("worker-1", lease_seconds=30).task_id == "race-c"
+
+
+def test_full_queue_returns_429_with_retry_after_from_pending_jobs(api_server, client, queue, monkeypatch):
+    """
+    worker 模式下本进程的调度器是空闲的，Retry-After 应按作业队列中等待的作业数与所有 worker 的并发数估算：
+    4 个等待作业、上限 3，需要领取 2 个作业才有空位；2 个进程 × 每进程 2 个并发，每 60 / 4 = 15 秒领取一个
+    """
+    monkeypatch.setattr(api_server, "job_queue", queue)
+    monkeypatch.setattr(api_server, "single_flight", queue)
+    monkeypatch.setattr(api_server, "PLANNING_QUEUE_MAX_SIZE", 3)
+    monkeypatch.setattr(api_server, "PLANNING_MAX_CONCURRENCY", 2)
+    monkeypatch.setattr(api_server, "PLANNING_WORKER_PROCESSES", 2)
+    monkeypatch.setattr(api_server, "PLANNING_ESTIMATED_TASK_SECONDS", 60)
+    for i in range(4):
+        queue.submit(f"pending-{i}", "langgraph", {})
+
+    response = client.post("/plan", json={
+        "destination": "队列已满测试", "start_date": "2025-08-14", "end_date": "2025-08-16",
+        "budget_range": "中等", "group_size": 1, "interests": ["美食"]
+    })
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
+    assert client.get("/tasks", params={"destination": "队列已满测试"}).json()["tasks"] == []
+
+    response = client.post("/chat", json={"message": "我想去杭州玩3天"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "30"
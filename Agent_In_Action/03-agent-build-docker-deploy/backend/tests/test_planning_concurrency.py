@@ -0,0 +1,148 @@
+"""
+规划并发测试：多个规划任务执行期间，/health 与 /status 仍然快速响应
+
+多智能体规划中最慢的是模型调用。这里用一个同步阻塞的假模型代替 ChatOpenAI：
+每次调用都卡住，直到测试放行为止，保证测量期间 N 个规划都处于执行中。
+如果规划流程在事件循环里同步等待（例如 future.result()），事件循环会被冻结，
+/health 与 /status 要等到模型返回才能响应；正确 await 时它们的耗时与规划无关。
+并行模式（智能体并发执行）与顺序模式（协调员逐个调度）走不同的图，两种模式都要测试。
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_planning_concurrency.py
+"""
+
+import threading
+import time
+from typing import Any, List, Optional
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+PLANS_IN_FLIGHT = 4           # 同时执行的规划数（小于规划线程池大小，全部立即开始执行）
+LATENCY_BOUND_SECONDS = 0.5   # /health 与 /status 单次响应时间上限
+POLL_ROUNDS = 20              # 规划执行期间测量的轮数
+WAIT_TIMEOUT_SECONDS = 30     # 等待状态变化的最长时间
+# 假模型最多阻塞这么久就自动放行：事件循环被冻结时测试客户端的请求也无法返回，
+# 自动放行保证这种情况下测试在几秒内以断言失败结束，而不是一直卡住
+MAX_BLOCK_SECONDS = 10
+
+PLAN_REQUEST = {
+    "destination": "杭州",
+    "start_date": "2025-08-14",
+    "end_date": "2025-08-16",
+    "budget_range": "中等",
+    "group_size": 1,
+    "interests": ["美食"]
+}
+
+
+class BlockingChatModel(BaseChatModel):
+    """
+    同步阻塞的假模型
+
+    只实现同步的 _generate：同步的 invoke 在规划线程池中直接调用它，ainvoke 则由 LangChain 放到线程池中调用，
+    因此阻塞只占用线程池中的线程，不应该影响事件循环。
+    """
+
+    released: Any       # threading.Event，设置后放行所有阻塞中的调用
+    calls: List[int]    # 已开始的调用（列表只用于在线程间计数）
+
+    @property
+    def _llm_type(self) -> str:
+        return "blocking-fake"
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.calls.append(1)
+        self.released.wait()
+        message = AIMessage(content="测试建议：西湖游船。\n- 龙井虾仁\n- 灵隐寺")
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def wait_until(condition, timeout: float = WAIT_TIMEOUT_SECONDS, interval: float = 0.05) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
+
+
+@pytest.fixture(params=["parallel", "sequential"])
+def blocking_llm(request, api_server, monkeypatch):
+    """让规划以指定的执行模式、使用阻塞的假模型运行；测试结束时无论成败都放行，避免线程一直卡住"""
+    from agents.langgraph_agents import LangGraphTravelAgents
+
+    llm = BlockingChatModel(released=threading.Event(), calls=[])
+    # 所有任务共享运行时中的同一个多智能体系统，替换为指定模式的实例并换上假模型；
+    # 先等服务启动时的预热创建完实例，否则预热线程可能在替换之后覆盖它
+    api_server.agent_runtime.langgraph_agents()
+    agents = LangGraphTravelAgents(execution_mode=request.param)
+    agents.llm = llm
+    monkeypatch.setattr(api_server.agent_runtime, "_langgraph_agents", agents)
+    watchdog = threading.Timer(MAX_BLOCK_SECONDS, llm.released.set)
+    watchdog.start()
+    yield llm
+    llm.released.set()
+    watchdog.cancel()
+
+
+def test_health_and_status_stay_fast_with_plans_in_flight(api_server, client, blocking_llm):
+    # 每种模式使用不同的目的地，按目的地查询任务列表时互不干扰
+    destination = f"杭州-{api_server.agent_runtime.langgraph_agents().execution_mode}"
+    # 每个请求在单独的线程中提交，即使 /plan 的响应被阻塞，测试也能继续测量；
+    # 兴趣不同的请求互不相同，每个请求都是一次独立的规划
+    posters = [
+        threading.Thread(
+            target=client.post,
+            args=("/plan",),
+            kwargs={"json": {**PLAN_REQUEST, "destination": destination, "interests": ["美食", f"兴趣{i}"]}},
+            daemon=True
+        )
+        for i in range(PLANS_IN_FLIGHT)
+    ]
+    try:
+        for poster in posters:
+            poster.start()
+
+        def task_ids():
+            tasks = client.get("/tasks", params={"destination": destination}).json()["tasks"]
+            return [task["task_id"] for task in tasks]
+
+        def statuses():
+            return [client.get(f"/status/{task_id}").json()["status"] for task_id in task_ids()]
+
+        # 所有规划都已开始执行，并且至少有一次模型调用卡在假模型中
+        assert wait_until(lambda: statuses() == ["processing"] * PLANS_IN_FLIGHT and blocking_llm.calls)
+        ids = task_ids()
+
+        latencies = []
+        for round_index in range(POLL_ROUNDS):
+            started = time.perf_counter()
+            health = client.get("/health")
+            latencies.append(time.perf_counter() - started)
+            assert health.status_code == 200
+
+            started = time.perf_counter()
+            status = client.get(f"/status/{ids[round_index % PLANS_IN_FLIGHT]}")
+            latencies.append(time.perf_counter() - started)
+            assert status.status_code == 200
+
+        # 测量期间规划一直在执行：模型调用仍被阻塞，没有等到自动放行（事件循环被冻结时只能等到自动放行）
+        assert not blocking_llm.released.is_set(), f"{MAX_BLOCK_SECONDS} 秒内没有完成测量，事件循环可能被阻塞"
+        assert statuses() == ["processing"] * PLANS_IN_FLIGHT
+        assert max(latencies) < LATENCY_BOUND_SECONDS, f"最慢一次响应 {max(latencies):.3f} 秒"
+
+        # 放行模型调用后，所有规划都正常完成
+        blocking_llm.released.set()
+        assert wait_until(lambda: statuses() == ["completed"] * PLANS_IN_FLIGHT)
+        for task_id in ids:
+            result = client.get(f"/result/{task_id}").json()["result"]
+            assert result["travel_plan"]["planning_method"] == "LangGraph多智能体协作"
+    finally:
+        # 无论断言成败都在关闭服务前放行模型调用，否则关闭时要等被阻塞的规划全部跑完
+        blocking_llm.released.set()
+        for poster in posters:
+            poster.join(WAIT_TIMEOUT_SECONDS)
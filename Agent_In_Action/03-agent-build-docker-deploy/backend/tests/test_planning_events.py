@@ -0,0 +1,174 @@
+"""
+规划事件分发测试：快照只在有订阅者时累积，运行结束（包括 worker 进程中的各种结束方式）后释放
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_planning_events.py
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from config.app_config import PLANNING_JOB_MAX_ATTEMPTS
+from planning_worker import PlanningWorker
+from utils.planning_events import PlanningEventBroker
+
+
+def token(text: str, node: str = "travel_advisor", message_id: str = "m1"):
+    return {"type": "token", "node": node, "agent": "旅行顾问", "message_id": message_id, "text": text}
+
+
+def test_publish_without_subscribers_keeps_nothing():
+    broker = PlanningEventBroker()
+    for i in range(100):
+        broker.publish("run", token(f"片段{i}"))
+
+    assert broker.stats()["buffered_runs"] == 0
+    queue, snapshot = broker.subscribe("run")
+    assert snapshot == []
+    assert queue.empty()
+
+
+def test_snapshot_accumulates_while_subscribed_and_is_released_with_last_subscriber():
+    broker = PlanningEventBroker()
+    first, _ = broker.subscribe("run")
+    broker.publish("run", token("西湖"))
+    broker.publish("run", token("游船"))
+
+    second, snapshot = broker.subscribe("run")
+    assert [partial["text"] for partial in snapshot] == ["西湖游船"]
+    assert first.qsize() == 2 and second.empty()
+
+    broker.unsubscribe("run", first)
+    assert broker.stats()["buffered_runs"] == 1
+    broker.unsubscribe("run", second)
+    assert broker.stats() == {"streaming_runs": 0, "buffered_runs": 0, "subscribers": 0, "dropped_events": 0}
+
+
+def test_new_model_call_replaces_node_snapshot():
+    broker = PlanningEventBroker()
+    broker.subscribe("run")
+    broker.publish("run", token("NEED_SEARCH: 杭州", message_id="m1"))
+    broker.publish("run", token("搜索后的回答", message_id="m2"))
+
+    _, snapshot = broker.subscribe("run")
+    assert [partial["text"] for partial in snapshot] == ["搜索后的回答"]
+
+
+def test_close_notifies_subscribers_and_releases_snapshot():
+    broker = PlanningEventBroker(queue_size=1)
+    queue, _ = broker.subscribe("run")
+    broker.publish("run", token("a"))
+    broker.publish("run", token("b"))  # 队列已满，丢弃
+
+    broker.close("run")
+    assert queue.get_nowait() is None
+    assert broker.stats()["buffered_runs"] == 0
+    assert broker.stats()["dropped_events"] == 2  # 队列满时丢弃的 token + close 为结束标记腾出的位置
+
+
+class FakeJobQueue:
+    """只记录调用的作业队列；renew 返回 renew_result"""
+
+    def __init__(self, renew_result: bool = True):
+        self.renew_result = renew_result
+        self.finished = []
+        self.released = []
+        self.discarded = []
+
+    def renew(self, task_id, worker_id, lease_seconds):
+        return self.renew_result
+
+    def finish(self, task_id):
+        self.finished.append(task_id)
+
+    def release(self, task_id, worker_id):
+        self.released.append(task_id)
+
+    def discard_members(self, run_id):
+        self.discarded.append(run_id)
+
+
+def make_worker(runner, queue: FakeJobQueue):
+    server = SimpleNamespace(
+        job_queue=queue,
+        planning_events=PlanningEventBroker(),
+        PLANNING_JOB_RUNNERS={"plan": runner},
+        update_run=lambda task_id, **fields: None
+    )
+    return PlanningWorker(server, concurrency=1)
+
+
+def job(attempts: int = 1, kind: str = "plan"):
+    return SimpleNamespace(task_id="run", kind=kind, payload={}, attempts=attempts)
+
+
+async def run_and_check_closed(worker: PlanningWorker, planning_job):
+    """执行作业前订阅运行，执行后订阅者应收到结束标记，快照已释放"""
+    events = worker.server.planning_events
+    queue, _ = events.subscribe("run")
+    await worker.execute(planning_job)
+    received = [queue.get_nowait() for _ in range(queue.qsize())]
+    assert received[-1] is None
+    assert events.stats()["buffered_runs"] == 0
+    return received
+
+
+@pytest.mark.parametrize("outcome", ["success", "error"])
+def test_worker_closes_run_when_job_finishes(outcome):
+    holder = []
+
+    async def runner(task_id, payload):
+        holder[0].server.planning_events.publish(task_id, token("内容"))
+        if outcome == "error":
+            raise RuntimeError("规划失败")
+
+    queue = FakeJobQueue()
+    holder.append(make_worker(runner, queue))
+    received = asyncio.run(run_and_check_closed(holder[0], job()))
+    assert received[0]["text"] == "内容"
+    assert queue.finished == ["run"]
+
+
+@pytest.mark.parametrize("planning_job", [job(attempts=PLANNING_JOB_MAX_ATTEMPTS + 1), job(kind="unknown")])
+def test_worker_closes_run_when_job_is_rejected(planning_job):
+    async def runner(task_id, payload):
+        raise AssertionError("不应执行")
+
+    queue = FakeJobQueue()
+    asyncio.run(run_and_check_closed(make_worker(runner, queue), planning_job))
+    assert queue.finished == ["run"]
+
+
+def test_worker_closes_run_when_lease_is_lost(monkeypatch):
+    import planning_worker
+    monkeypatch.setattr(planning_worker, "PLANNING_JOB_LEASE_SECONDS", 0.03)
+
+    async def runner(task_id, payload):
+        await asyncio.sleep(10)
+
+    queue = FakeJobQueue(renew_result=False)
+    asyncio.run(run_and_check_closed(make_worker(runner, queue), job()))
+    assert queue.discarded == ["run"] and queue.finished == []
+
+
+def test_worker_closes_run_when_worker_stops():
+    async def runner(task_id, payload):
+        await asyncio.sleep(10)
+
+    queue = FakeJobQueue()
+    worker = make_worker(runner, queue)
+
+    async def main():
+        events = worker.server.planning_events
+        subscriber, _ = events.subscribe("run")
+        running = asyncio.create_task(worker.execute(job()))
+        await asyncio.sleep(0.01)
+        running.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await running
+        assert subscriber.get_nowait() is None
+
+    asyncio.run(main())
+    assert queue.released == ["run"]
@@ -0,0 +1,163 @@
+"""
+结果接口测试：轻量的 `/status` 与完整的 `/result` 分离，结果文件的 gzip 存储与下载时的编码协商
+
+直接在任务仓库中创建任务、用 `save_planning_result` 保存结果文件，不执行规划。
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_results.py
+"""
+
+import asyncio
+import gzip
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import quote
+
+import pytest
+
+from data.result_store import ResultStore
+
+REQUEST = {"destination": "结果接口测试", "interests": ["美食"]}
+
+# 足够大的结果：几百 KB 的智能体输出
+LARGE_RESULT = {
+    "success": True,
+    "travel_plan": {"destination": "杭州", "summary": "西湖一日游"},
+    "agent_outputs": {f"agent_{i}": {"response": "详细的行程建议。" * 2000} for i in range(5)}
+}
+
+
+def create_task(api_server, **fields) -> str:
+    task_id = str(uuid.uuid4())
+    api_server.task_repo.create({
+        "task_id": task_id,
+        "status": "processing",
+        "progress": 50,
+        "current_agent": "行程规划师",
+        "message": "正在规划",
+        "created_at": datetime.now().isoformat(),
+        "request": REQUEST,
+        "result": None,
+        **fields
+    })
+    return task_id
+
+
+def complete_task(api_server, task_id: str, result=LARGE_RESULT):
+    """像规划任务结束时一样保存结果文件，并把结果字段写入任务记录"""
+    fields = asyncio.run(api_server.save_planning_result(task_id, result, REQUEST))
+    api_server.task_repo.update(task_id, status="completed", progress=100, message="旅行规划完成！", **fields)
+    return fields
+
+
+@pytest.fixture
+def completed_task(api_server):
+    task_id = create_task(api_server)
+    return task_id, complete_task(api_server, task_id)
+
+
+def test_status_stays_small_and_only_describes_the_result(client, completed_task):
+    task_id, fields = completed_task
+    status = client.get(f"/status/{task_id}")
+
+    assert status.status_code == 200
+    assert len(status.content) < 1000
+    body = status.json()
+    assert "result" not in body
+    assert body["result_available"] is True
+    assert body["result_size"] == fields["result_size"] > 100_000
+    assert body["result_hash"] == fields["result_hash"]
+
+
+def test_result_endpoint_returns_the_stored_file_with_caching_headers(client, completed_task):
+    task_id, fields = completed_task
+    response = client.get(f"/result/{task_id}")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["task_id"] == task_id and body["request"] == REQUEST
+    assert body["result"] == LARGE_RESULT
+    assert response.headers["ETag"].strip('"').startswith(fields["result_hash"])
+    assert "max-age=" in response.headers["Cache-Control"]
+
+    cached = client.get(f"/result/{task_id}", headers={"If-None-Match": response.headers["ETag"]})
+    assert cached.status_code == 304
+
+
+def test_result_without_file_and_missing_result(api_server, client):
+    # 结果内联保存在任务记录中（旧数据，或保存结果文件失败）
+    inline_id = create_task(api_server, status="completed", result={"success": True})
+    assert client.get(f"/result/{inline_id}").json() == {"task_id": inline_id, "result": {"success": True}}
+
+    running_id = create_task(api_server)
+    assert client.get(f"/status/{running_id}").json()["result_available"] is False
+    assert client.get(f"/result/{running_id}").status_code == 404
+    assert client.get(f"/result/{uuid.uuid4()}").status_code == 404
+
+
+def read_raw(client, url: str, **headers):
+    """读取未经客户端解码的原始响应体（TestClient 默认会自动解压 gzip）"""
+    with client.stream("GET", url, headers=headers) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_result_store_saves_gzip_with_digest_of_the_json(tmp_path):
+    store = ResultStore(str(tmp_path))
+    stored = store.save("task-1", LARGE_RESULT, REQUEST)
+
+    assert stored.filename.endswith(".json.gz")
+    compressed = (tmp_path / stored.filename).read_bytes()
+    payload = gzip.decompress(compressed)
+    assert stored.size == len(payload) and stored.stored_size == len(compressed)
+    assert stored.sha256 == hashlib.sha256(payload).hexdigest()
+    assert stored.stored_size * 10 < stored.size  # 重复度高的智能体输出压缩后小得多
+    assert store.load(stored.filename) == LARGE_RESULT
+    # 压缩文件不含时间戳，相同内容得到相同的文件
+    assert gzip.compress(payload, compresslevel=store.compress_level, mtime=0) == compressed
+
+
+def test_download_sends_stored_gzip_file_as_is(api_server, client, completed_task):
+    task_id, fields = completed_task
+    stored = Path(api_server.result_store.path(fields["result_file"])).read_bytes()
+
+    response, raw = read_raw(client, f"/download/{task_id}", **{"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == f'"{fields["result_hash"]}-gzip"'
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert raw == stored
+    # 下载得到的文件名不带 .gz 后缀
+    assert quote(fields["result_file"][:-len(".gz")]) in response.headers["Content-Disposition"]
+
+    # 断点续传：Range 针对压缩后的文件
+    response, raw = read_raw(client, f"/download/{task_id}", **{"Accept-Encoding": "gzip", "Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert raw == stored[:10]
+
+
+def test_download_decompresses_for_clients_without_gzip(client, completed_task):
+    task_id, fields = completed_task
+    response, raw = read_raw(client, f"/download/{task_id}", **{"Accept-Encoding": "identity"})
+
+    assert response.status_code == 200
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["ETag"] == f'"{fields["result_hash"]}"'
+    assert len(raw) == fields["result_size"]
+    assert hashlib.sha256(raw).hexdigest() == fields["result_hash"]
+    assert json.loads(raw)["result"] == LARGE_RESULT
+
+    # 明确拒绝 gzip（q=0）时同样解压
+    response, _ = read_raw(client, f"/download/{task_id}", **{"Accept-Encoding": "gzip;q=0, identity"})
+    assert "Content-Encoding" not in response.headers
+
+
+def test_etag_is_per_representation(client, completed_task):
+    task_id, fields = completed_task
+    gzip_etag = f'"{fields["result_hash"]}-gzip"'
+    assert client.get(f"/download/{task_id}", headers={"Accept-Encoding": "gzip", "If-None-Match": gzip_etag}).status_code == 304
+    # 解压后的表示 ETag 不同，缓存的 gzip 版本不能用于不接受 gzip 的客户端
+    response = client.get(f"/download/{task_id}", headers={"Accept-Encoding": "identity", "If-None-Match": gzip_etag})
+    assert response.status_code == 200
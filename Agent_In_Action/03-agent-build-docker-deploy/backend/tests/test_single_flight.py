@@ -0,0 +1,77 @@
+"""
+相同规划请求合并执行（single-flight）测试：请求指纹、运行登记表，以及合并运行中成员的取消
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_single_flight.py
+"""
+
+import time
+
+from utils.single_flight import SingleFlightGroup, request_fingerprint
+
+REQUEST = {"destination": "杭州", "duration": 3, "budget_range": "中等", "interests": ["美食", "历史"]}
+
+
+def wait_until(condition, timeout: float = 5, interval: float = 0.02) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(interval)
+    return condition()
+
+
+def test_fingerprint_ignores_formatting_but_not_content():
+    same = {**REQUEST, "destination": " 杭州 ", "interests": ["历史", "美食"]}
+    assert request_fingerprint(same) == request_fingerprint(REQUEST)
+    assert request_fingerprint({**REQUEST, "budget_range": "豪华"}) != request_fingerprint(REQUEST)
+
+
+def test_group_tracks_members_until_run_closes():
+    group = SingleFlightGroup()
+    group.open("fp", "run")
+    assert group.attach("fp", "dup-1") == "run"
+    assert group.attach("fp", "dup-2") == "run"
+    assert group.members("run") == ["run", "dup-1", "dup-2"]
+    assert group.run_of("dup-1") == "run"
+
+    assert group.detach("run") == ("run", 2)
+    assert group.members("run") == ["dup-1", "dup-2"]
+
+    # 封闭后不再接受新成员，已有成员不变
+    group.seal("run")
+    assert group.attach("fp", "late") is None
+    assert group.members("run") == ["dup-1", "dup-2"]
+
+    group.close("run")
+    assert group.run_of("dup-1") == "dup-1"
+    assert group.stats() == {"runs": 0, "followers": 0}
+    # 未登记的任务视为只有自己一个成员的运行
+    assert group.members("other") == ["other"]
+
+
+def test_cancelling_one_member_keeps_shared_run_alive(api_server, client, blocking_jobs):
+    leader = blocking_jobs.submit(fingerprint="shared-run")
+    follower = blocking_jobs.submit(fingerprint="shared-run")
+    assert wait_until(lambda: leader in blocking_jobs.started)
+    # 相同的请求只执行一次，重复请求加入第一个请求的运行
+    assert blocking_jobs.started == {leader}
+    assert client.get(f"/status/{follower}").status_code == 200
+
+    # 取消发起运行的任务：它退出运行，运行继续为另一个成员执行
+    assert client.delete(f"/tasks/{leader}").json()["status"] == "cancelled"
+    time.sleep(0.1)
+    assert leader not in blocking_jobs.cancelled
+    assert leader in client.portal.call(api_server.planning_scheduler.task_ids)
+    # 之后的进度只写入仍在等待的成员
+    client.portal.call(lambda: api_server.update_run(leader, progress=40, message="仍在规划"))
+    assert client.get(f"/status/{follower}").json()["progress"] == 40
+    assert client.get(f"/status/{leader}").json()["status"] == "cancelled"
+
+    # 最后一个成员退出后运行才停止
+    assert client.delete(f"/tasks/{follower}").json()["status"] == "cancelled"
+    assert wait_until(lambda: leader in blocking_jobs.cancelled)
+    assert leader not in client.portal.call(api_server.planning_scheduler.task_ids)
+    # 运行结束后相同的请求重新规划
+    again = blocking_jobs.submit(fingerprint="shared-run")
+    assert wait_until(lambda: again in blocking_jobs.started)
@@ -0,0 +1,91 @@
+"""
+状态轮询测试：ETag / If-None-Match 条件请求与 `?since=<version>` 增量查询
+
+直接在任务仓库中创建并更新任务，不执行规划，检查 `/status/{task_id}` 的响应。
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_status_polling.py
+"""
+
+import uuid
+from datetime import datetime
+
+import pytest
+
+
+@pytest.fixture
+def task_id(api_server):
+    """一个正在执行中的任务（版本 2：创建后写入了 processing 状态）"""
+    task_id = str(uuid.uuid4())
+    api_server.task_repo.create({
+        "task_id": task_id,
+        "status": "queued",
+        "progress": 0,
+        "current_agent": "系统初始化",
+        "message": "任务已创建",
+        "created_at": datetime.now().isoformat(),
+        "request": {"destination": "状态轮询测试"},
+        "result": None
+    })
+    api_server.task_repo.update(task_id, status="processing", progress=10, current_agent="旅行顾问")
+    return task_id
+
+
+def test_if_none_match_returns_304_until_status_changes(api_server, client, task_id):
+    first = client.get(f"/status/{task_id}")
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.json()["version"] == 2
+
+    unchanged = client.get(f"/status/{task_id}", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["ETag"] == etag
+    assert unchanged.content == b""
+    # 弱校验前缀与多个候选值同样命中
+    assert client.get(f"/status/{task_id}", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+
+    # 写入相同的值不改变版本号，ETag 仍然有效
+    api_server.task_repo.update(task_id, progress=10)
+    assert client.get(f"/status/{task_id}", headers={"If-None-Match": etag}).status_code == 304
+
+    api_server.task_repo.update(task_id, progress=40)
+    changed = client.get(f"/status/{task_id}", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()["progress"] == 40 and changed.json()["version"] == 3
+
+
+def test_since_returns_only_fields_changed_after_that_version(api_server, client, task_id):
+    assert client.get(f"/status/{task_id}", params={"since": 2}).status_code == 304
+
+    api_server.task_repo.update(task_id, progress=60, message="天气分析师正在分析")
+    delta = client.get(f"/status/{task_id}", params={"since": 2})
+    assert delta.status_code == 200
+    assert delta.json() == {
+        "task_id": task_id, "version": 3, "delta": True, "progress": 60, "message": "天气分析师正在分析"
+    }
+
+    api_server.task_repo.update(task_id, current_agent="天气分析师")
+    # 从更早的版本开始查询时，两次更新中变化过的字段都会返回
+    delta = client.get(f"/status/{task_id}", params={"since": 1}).json()
+    assert delta["version"] == 4
+    assert {"status", "progress", "current_agent", "message"} <= set(delta)
+    assert "result_available" not in delta
+    assert client.get(f"/status/{task_id}", params={"since": 3}).json() == {
+        "task_id": task_id, "version": 4, "delta": True, "current_agent": "天气分析师"
+    }
+
+
+def test_result_fields_are_reported_together_when_result_is_saved(api_server, client, task_id):
+    api_server.task_repo.update(task_id, status="completed", progress=100, result_file="result.json.gz",
+                                result_size=1234, result_hash="abc123")
+    delta = client.get(f"/status/{task_id}", params={"since": 2}).json()
+    assert delta["status"] == "completed"
+    assert delta["result_available"] is True
+    assert delta["result_size"] == 1234 and delta["result_hash"] == "abc123"
+    # 状态变化时带上空的排队位置，清除客户端合并状态中的旧值
+    assert "queue_position" in delta and delta["queue_position"] is None
+
+
+def test_unknown_task_returns_404(client):
+    assert client.get(f"/status/{uuid.uuid4()}").status_code == 404
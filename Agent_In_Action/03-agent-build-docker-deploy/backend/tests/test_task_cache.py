@@ -0,0 +1,167 @@
+"""
+任务热缓存测试：LRU 淘汰顺序、TTL 过期、待写记录（dirty）与 shared / executes_tasks 两种多进程模式
+
+底层使用临时目录中的 SQLite 仓库；两个 CachedTaskRepository 共用同一个数据库文件，模拟两个 worker 进程。
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_task_cache.py
+"""
+
+import time
+from datetime import datetime
+
+import pytest
+
+from data.persistence import PersistenceWriter
+from data.result_store import ResultStore
+from data.task_store import CachedTaskRepository, SQLiteTaskRepository, TaskQuery
+
+
+def make_task(task_id: str, status: str = "processing", **fields):
+    return {
+        "task_id": task_id,
+        "status": status,
+        "progress": 0,
+        "message": "任务已创建",
+        "created_at": datetime.now().isoformat(),
+        "request": {"destination": "缓存测试"},
+        "result": None,
+        **fields
+    }
+
+
+@pytest.fixture
+def make_repo(tmp_path):
+    """创建共用同一个数据库文件与结果目录的缓存仓库，测试结束时全部关闭"""
+    repos = []
+
+    def factory(**kwargs):
+        backend = SQLiteTaskRepository(str(tmp_path / "tasks.db"))
+        repo = CachedTaskRepository(backend, ResultStore(str(tmp_path / "results")), **kwargs)
+        repo.load()
+        repos.append(repo)
+        return repo
+
+    yield factory
+    for repo in repos:
+        repo.close()
+
+
+def test_evicts_least_recently_used_first(make_repo):
+    repo = make_repo(max_size=3)
+    for task_id in ("a", "b", "c"):
+        repo.create(make_task(task_id))
+    repo.get("a")
+
+    repo.create(make_task("d"))
+    # a 刚被访问过，最久未访问的是 b
+    assert list(repo._cache) == ["c", "a", "d"]
+    # 被淘汰的任务仍能从底层仓库读到，并重新进入缓存
+    assert repo.get("b")["task_id"] == "b"
+    assert list(repo._cache) == ["a", "d", "b"]
+
+
+def test_expired_entries_are_dropped_on_access_and_on_write(make_repo):
+    repo = make_repo(max_size=10, ttl_seconds=0.05)
+    repo.create(make_task("a"))
+    repo.create(make_task("b"))
+    time.sleep(0.1)
+
+    assert repo._lookup("a") is None
+    assert list(repo._cache) == ["b"]
+    # 写入时顺带清理排在最前面的过期条目
+    repo.create(make_task("c"))
+    assert list(repo._cache) == ["c"]
+    # 过期只影响缓存，任务仍在底层仓库中
+    assert repo.get("a")["task_id"] == "a"
+
+
+def test_result_is_loaded_lazily_and_evicted_with_its_entry(make_repo, monkeypatch):
+    repo = make_repo(max_size=1)
+    stored = repo.result_store.save("a", {"success": True}, {"destination": "缓存测试"})
+    repo.create(make_task("a", status="completed", result_file=stored.filename))
+
+    loads = []
+    original_load = repo.result_store.load
+    monkeypatch.setattr(repo.result_store, "load", lambda filename: loads.append(filename) or original_load(filename))
+
+    assert repo.get_result("a") == {"success": True}
+    assert repo.get_result("a") == {"success": True}
+    assert loads == [stored.filename]
+
+    # 条目被淘汰后结果随之释放，再次访问重新从文件读取
+    repo.create(make_task("b"))
+    assert "a" not in repo._cache
+    assert repo.get_result("a") == {"success": True}
+    assert len(loads) == 2
+
+
+def test_dirty_records_are_visible_before_the_writer_flushes(make_repo):
+    writer = PersistenceWriter(flush_interval=60)
+    repo = make_repo(max_size=1, writer=writer)
+    repo.create(make_task("a"))
+    repo.update("a", status="completed", progress=100)
+
+    # 写线程还在等待合并，新建与更新都还没有写入底层仓库
+    assert repo.backend.get("a") is None
+    assert repo._dirty["a"]["status"] == "completed"
+    # 条目被淘汰后，读取仍优先使用待写记录而不是底层仓库的旧记录
+    repo.create(make_task("b"))
+    assert "a" not in repo._cache
+    assert repo.get("a")["status"] == "completed"
+
+    # 列表查询前先写入待写记录，状态过滤看到的是最新状态
+    tasks, _ = repo.query_summaries(TaskQuery(status="completed"))
+    assert [task["task_id"] for task in tasks] == ["a"]
+
+    assert writer.flush(timeout=5)
+    assert repo._dirty == {}
+    assert repo.backend.get("a")["progress"] == 100
+    writer.close()
+
+
+def test_shared_mode_only_caches_other_workers_tasks_once_terminal(make_repo):
+    owner = make_repo(shared=True)
+    other = make_repo(shared=True)
+    owner.create(make_task("a"))
+
+    # 新建任务同步落盘，另一个 worker 立即能查到；运行中的任务不缓存，每次都读取最新状态
+    assert other.get("a")["status"] == "processing"
+    assert "a" not in other._cache
+    owner.update("a", progress=50)
+    assert other.get("a")["progress"] == 50
+
+    owner.update("a", status="completed", progress=100)
+    assert other.get("a")["status"] == "completed"
+    assert "a" in other._cache
+
+
+def test_shared_mode_cancellation_reaches_the_executing_worker(make_repo):
+    writer = PersistenceWriter(flush_interval=60)
+    owner = make_repo(shared=True, writer=writer)
+    other = make_repo(shared=True)
+    owner.create(make_task("a"))
+    owner.update("a", progress=30)
+    assert not owner.cancellation_requested("a")
+
+    other.mark_cancelled("a", "用户取消")
+    assert owner.cancellation_requested("a")
+    # 执行进程尚未落盘的旧进度被丢弃，缓存换成取消状态
+    assert "a" not in owner._dirty
+    assert owner.get("a")["status"] == "cancelled"
+
+    writer.flush(timeout=5)
+    assert other.get("a")["status"] == "cancelled"
+    writer.close()
+
+
+def test_api_process_without_execution_always_reads_the_executor_state(make_repo):
+    api = make_repo(shared=True, executes_tasks=False)
+    executor = make_repo(shared=True)
+    api.create(make_task("a", status="queued"))
+
+    assert "a" not in api._cache
+    assert executor.get("a")["status"] == "queued"
+    executor.update("a", status="processing", progress=20)
+    assert api.get("a")["progress"] == 20
+    assert "a" not in api._cache
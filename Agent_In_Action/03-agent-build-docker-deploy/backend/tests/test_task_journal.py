@@ -0,0 +1,142 @@
+"""
+"快照 + 追加日志" 任务仓库测试：重启后恢复、崩溃留下的不完整尾行、后台压缩与旧版快照导入
+
+每个测试在临时目录中打开仓库，关闭后再用新的仓库对象加载同一组文件，模拟服务重启。
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_task_journal.py
+"""
+
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from data.task_store import JournaledTaskRepository, TaskQuery
+
+START = datetime(2025, 8, 1, 9, 0, 0)
+
+
+def make_task(n: int, status: str = "processing"):
+    return {
+        "task_id": f"task-{n}",
+        "status": status,
+        "progress": 0,
+        "created_at": (START + timedelta(minutes=n)).isoformat(),
+        "request": {"destination": "杭州" if n % 2 else "苏州"},
+        "result": None
+    }
+
+
+@pytest.fixture
+def open_repo(tmp_path):
+    """按同一组文件路径打开仓库（每次调用相当于一次服务启动），测试结束时全部关闭"""
+    repos = []
+
+    def factory(compact_threshold: int = 500):
+        repo = JournaledTaskRepository(
+            str(tmp_path / "tasks_state.json"), str(tmp_path / "tasks_journal.jsonl"), compact_threshold
+        )
+        repo.load()
+        repos.append(repo)
+        return repo
+
+    yield factory
+    for repo in repos:
+        repo.close()
+
+
+def test_tasks_survive_restart(open_repo):
+    repo = open_repo()
+    for n in range(3):
+        repo.create(make_task(n))
+    repo.update("task-1", status="completed", progress=100)
+    repo.close()
+
+    reopened = open_repo()
+    assert reopened.count() == 3
+    assert reopened.get("task-1")["status"] == "completed"
+    assert reopened.get("task-1")["progress"] == 100
+    assert reopened.get("task-2") == make_task(2)
+    tasks, _ = reopened.query_summaries(TaskQuery(status="completed"))
+    assert [task["task_id"] for task in tasks] == ["task-1"]
+
+
+def test_torn_tail_is_ignored_and_later_writes_survive(open_repo):
+    repo = open_repo()
+    repo.create(make_task(0))
+    repo.update("task-0", progress=50)
+    repo.close()
+    # 进程在写入日志的过程中崩溃，最后一行只写了一半
+    with open(repo.journal_path, 'a', encoding='utf-8') as f:
+        f.write('{"task_id": "task-0", "task": {"task_id": "tas')
+
+    recovered = open_repo()
+    assert recovered.get("task-0")["progress"] == 50
+    # 崩溃恢复后的新写入不能和残留的半行拼在一起，否则下一次重启时会丢失
+    recovered.create(make_task(1))
+    recovered.close()
+
+    reopened = open_repo()
+    assert reopened.count() == 2
+    assert reopened.get("task-1") == make_task(1)
+
+
+def test_compaction_moves_tasks_into_the_snapshot(open_repo):
+    repo = open_repo(compact_threshold=4)
+    for n in range(5):
+        repo.create(make_task(n))
+    repo._compaction_thread.join()
+
+    assert os.path.exists(repo.index_path)
+    assert not os.path.exists(repo.compacting_path)
+    # 压缩前的 4 条日志已合并进快照，只剩压缩开始之后的第 5 条
+    with open(repo.journal_path, 'r', encoding='utf-8') as f:
+        assert [json.loads(line)["task_id"] for line in f] == ["task-4"]
+    assert set(repo._live) == {"task-4"}
+    assert repo.get("task-0") == make_task(0)
+    repo.update("task-0", status="completed")
+    repo.close()
+
+    reopened = open_repo()
+    assert reopened.count() == 5
+    assert reopened.get("task-0")["status"] == "completed"
+    assert reopened.get("task-3") == make_task(3)
+    # 启动时只有日志中的任务进入内存，快照中的任务按需读取
+    assert set(reopened._live) == {"task-0", "task-4"}
+
+
+def test_restart_after_interrupted_compaction_replays_both_journals(open_repo):
+    repo = open_repo()
+    repo.create(make_task(0))
+    repo.close()
+    # 压缩轮换出旧日志后进程崩溃：旧日志留在 .compacting 中，新的更新写在新日志里
+    os.replace(repo.journal_path, repo.compacting_path)
+    updated = {**make_task(0), "status": "completed"}
+    with open(repo.journal_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({"task_id": "task-0", "task": updated}) + "\n")
+
+    reopened = open_repo()
+    assert reopened.get("task-0")["status"] == "completed"
+    reopened.compact_in_background()
+    reopened._compaction_thread.join()
+    assert not os.path.exists(reopened.compacting_path)
+    reopened.close()
+
+    assert open_repo().get("task-0")["status"] == "completed"
+
+
+def test_legacy_snapshot_is_imported_and_converted(open_repo, tmp_path):
+    legacy = {f"task-{n}": make_task(n) for n in range(3)}
+    (tmp_path / "tasks_state.json").write_text(json.dumps(legacy), encoding='utf-8')
+
+    repo = open_repo()
+    repo._compaction_thread.join()
+    assert os.path.exists(repo.index_path)
+    repo.close()
+
+    reopened = open_repo()
+    assert reopened.count() == 3
+    assert reopened._live == {}
+    assert reopened.get("task-2") == make_task(2)
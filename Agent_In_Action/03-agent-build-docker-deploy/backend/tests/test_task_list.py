@@ -0,0 +1,141 @@
+"""
+任务列表测试：游标分页的边界、排序与各种过滤条件
+
+SQLite 与 "快照 + 日志" 两种仓库用同一组数据检查，结果应完全一致；
+最后通过 `/tasks` 接口检查参数校验与接口层的分页。
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_task_list.py
+"""
+
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+from data.task_store import TaskQuery, create_task_repository
+
+START = datetime(2025, 8, 1, 9, 0, 0)
+
+# (编号, 创建时间偏移分钟, 状态, 目的地, 来源)；task-3 与 task-4 创建时间相同，按 task_id 排序
+ROWS = [
+    (0, 0, "completed", "杭州", None),
+    (1, 1, "failed", "苏州", "chat"),
+    (2, 2, "completed", "杭州", "chat"),
+    (3, 3, "processing", "杭州", None),
+    (4, 3, "completed", "苏州", None),
+    (5, 5, "cancelled", "杭州", "chat"),
+    (6, 6, "completed", "杭州", None),
+]
+
+
+def make_task(n: int, minutes: int, status: str, destination: str, source):
+    return {
+        "task_id": f"task-{n}",
+        "status": status,
+        "created_at": (START + timedelta(minutes=minutes)).isoformat(),
+        "request": {"destination": destination},
+        "source": source,
+        "result": None
+    }
+
+
+@pytest.fixture(params=["sqlite", "journal"])
+def repo(request, tmp_path):
+    repo = create_task_repository(
+        request.param, db_path=str(tmp_path / "tasks.db"), snapshot_path=str(tmp_path / "tasks_state.json"),
+        journal_path=str(tmp_path / "tasks_journal.jsonl")
+    )
+    repo.load()
+    for row in ROWS:
+        repo.create(make_task(*row))
+    yield repo
+    repo.close()
+
+
+def walk(repo, **query) -> list:
+    """从第一页开始沿着 next_cursor 读完所有页，返回每一页的 task_id 列表"""
+    pages, cursor = [], None
+    while True:
+        tasks, cursor = repo.query_summaries(TaskQuery(cursor=cursor, **query))
+        pages.append([task["task_id"] for task in tasks])
+        if cursor is None:
+            return pages
+
+
+NEWEST_FIRST = ["task-6", "task-5", "task-4", "task-3", "task-2", "task-1", "task-0"]
+
+
+def test_pages_cover_every_task_once_in_order(repo):
+    assert walk(repo, limit=3) == [NEWEST_FIRST[:3], NEWEST_FIRST[3:6], NEWEST_FIRST[6:]]
+    assert walk(repo, limit=3, order="asc") == [
+        ["task-0", "task-1", "task-2"], ["task-3", "task-4", "task-5"], ["task-6"]
+    ]
+
+
+@pytest.mark.parametrize("limit, pages", [
+    (7, [NEWEST_FIRST]),                       # 恰好一页装下：没有下一页
+    (6, [NEWEST_FIRST[:6], NEWEST_FIRST[6:]]),  # 只剩一条
+    (100, [NEWEST_FIRST]),
+])
+def test_next_cursor_boundaries(repo, limit, pages):
+    assert walk(repo, limit=limit) == pages
+
+
+def test_cursor_between_tasks_with_the_same_created_at(repo):
+    # 第一页在 task-4 处结束，下一页必须从同一时间的 task-3 继续
+    assert walk(repo, limit=3)[1][0] == "task-3"
+    assert walk(repo, limit=4, order="asc")[1][0] == "task-4"
+
+
+def test_summary_fields(repo):
+    tasks, _ = repo.query_summaries(TaskQuery(limit=1))
+    assert tasks == [{
+        "task_id": "task-6", "status": "completed", "created_at": (START + timedelta(minutes=6)).isoformat(),
+        "destination": "杭州", "source": None
+    }]
+
+
+@pytest.mark.parametrize("query, expected", [
+    ({"status": "completed"}, ["task-6", "task-4", "task-2", "task-0"]),
+    ({"destination": "苏州"}, ["task-4", "task-1"]),
+    ({"source": "chat"}, ["task-5", "task-2", "task-1"]),
+    ({"status": "completed", "destination": "杭州"}, ["task-6", "task-2", "task-0"]),
+    ({"status": "running"}, []),
+    # 时间范围前闭后开
+    ({"created_after": (START + timedelta(minutes=2)).isoformat(),
+      "created_before": (START + timedelta(minutes=5)).isoformat()}, ["task-4", "task-3", "task-2"]),
+    ({"created_after": (START + timedelta(minutes=3)).isoformat(), "status": "completed"}, ["task-6", "task-4"]),
+])
+def test_filters(repo, query, expected):
+    assert sum(walk(repo, limit=2, **query), []) == expected
+
+
+def test_status_change_moves_task_between_filters(repo):
+    repo.update("task-3", status="completed")
+    assert "task-3" in sum(walk(repo, status="completed"), [])
+    assert walk(repo, status="processing") == [[]]
+
+
+def test_invalid_cursor_raises_value_error(repo):
+    with pytest.raises(ValueError):
+        repo.query_summaries(TaskQuery(cursor="不是游标"))
+
+
+def test_tasks_endpoint_pages_and_validates(api_server, client):
+    destination = f"列表测试-{uuid.uuid4()}"
+    for n in range(5):
+        api_server.task_repo.create({**make_task(n, n, "completed", destination, None), "task_id": str(uuid.uuid4())})
+
+    first = client.get("/tasks", params={"destination": destination, "limit": 3}).json()
+    assert len(first["tasks"]) == 3 and first["next_cursor"]
+    second = client.get("/tasks", params={"destination": destination, "limit": 3,
+                                          "cursor": first["next_cursor"]}).json()
+    assert len(second["tasks"]) == 2 and second["next_cursor"] is None
+    created = [task["created_at"] for task in first["tasks"] + second["tasks"]]
+    assert created == sorted(created, reverse=True)
+
+    assert client.get("/tasks", params={"cursor": "不是游标"}).status_code == 400
+    assert client.get("/tasks", params={"limit": 0}).status_code == 422
+    assert client.get("/tasks", params={"limit": 201}).status_code == 422
+    assert client.get("/tasks", params={"order": "random"}).status_code == 422
@@ -0,0 +1,123 @@
+"""
+SQLite 任务仓库测试：保存与重新打开后读取、部分字段更新、取消状态不被覆盖、旧版快照导入
+
+运行（在 backend 目录下）：
+    python -m pytest -q tests/test_task_sqlite.py
+"""
+
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from data.task_store import SQLiteTaskRepository, create_task_repository
+
+START = datetime(2025, 8, 1, 9, 0, 0)
+
+
+def make_task(n: int, status: str = "processing", **fields):
+    return {
+        "task_id": f"task-{n}",
+        "status": status,
+        "progress": 0,
+        "created_at": (START + timedelta(minutes=n)).isoformat(),
+        "request": {"destination": "杭州", "interests": ["美食"]},
+        "source": "chat",
+        "result": None,
+        **fields
+    }
+
+
+@pytest.fixture
+def open_repo(tmp_path):
+    """打开同一个数据库文件（每次调用相当于一个新进程），测试结束时全部关闭"""
+    repos = []
+
+    def factory():
+        repo = SQLiteTaskRepository(str(tmp_path / "tasks.db"), str(tmp_path / "tasks_state.json"))
+        repo.load()
+        repos.append(repo)
+        return repo
+
+    yield factory
+    for repo in repos:
+        repo.close()
+
+
+def test_round_trip_keeps_every_field(open_repo):
+    repo = open_repo()
+    task = make_task(0, status="completed", result={"success": True, "travel_plan": {"summary": "西湖"}})
+    repo.create(task)
+    repo.close()
+
+    reopened = open_repo()
+    assert reopened.get("task-0") == task
+    assert reopened.get_result("task-0") == task["result"]
+    assert reopened.exists("task-0") and not reopened.exists("task-404")
+    assert reopened.get("task-404") is None
+    assert reopened.count() == 1
+
+
+def test_update_changes_fields_and_keeps_result(open_repo):
+    repo = open_repo()
+    repo.create(make_task(0, result={"success": True}))
+
+    updated = repo.update("task-0", status="completed", progress=100)
+    assert updated["version"] == 2
+    stored = open_repo().get("task-0")
+    assert stored["status"] == "completed" and stored["progress"] == 100
+    assert stored["result"] == {"success": True}
+    assert repo.update("task-404", progress=1) is None
+
+
+def test_save_does_not_overwrite_cancelled_task(open_repo):
+    repo = open_repo()
+    repo.create(make_task(0))
+    other = open_repo()
+    other.save(make_task(0, status="cancelled"))
+
+    # 执行进程晚到的旧进度不能把取消状态改回运行中
+    repo.save(make_task(0, progress=80))
+    assert repo.get("task-0")["status"] == "cancelled"
+
+
+def test_connections_are_per_thread(open_repo):
+    repo = open_repo()
+    errors = []
+
+    def write(n):
+        try:
+            repo.create(make_task(n))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert repo.count() == 8
+
+
+def test_legacy_snapshot_is_imported_once(open_repo, tmp_path):
+    legacy = {f"task-{n}": make_task(n) for n in range(3)}
+    (tmp_path / "tasks_state.json").write_text(json.dumps(legacy), encoding='utf-8')
+
+    repo = open_repo()
+    assert repo.count() == 3
+    assert repo.get("task-1") == legacy["task-1"]
+
+    # 数据库已有数据时不再导入：快照中的旧状态不会覆盖之后的更新
+    repo.update("task-1", status="completed")
+    assert open_repo().get("task-1")["status"] == "completed"
+    assert repo.count() == 3
+
+
+def test_factory_selects_backend(tmp_path):
+    paths = dict(db_path=str(tmp_path / "tasks.db"), snapshot_path=str(tmp_path / "tasks_state.json"),
+                 journal_path=str(tmp_path / "tasks_journal.jsonl"))
+    assert isinstance(create_task_repository("sqlite", **paths), SQLiteTaskRepository)
+    with pytest.raises(ValueError):
+        create_task_repository("redis", **paths)
@@ -18,6 +18,7 @@ LangGraph智能体工具集
 
 import asyncio
 import logging
+import math
 from typing import List, Dict, Any, Optional
 from pathlib import Path
 from langchain_core.tools import tool
@@ -25,6 +26,8 @@ from duckduckgo_search import DDGS
 import json
 import re
 from datetime import datetime
+from config.langgraph_config import langgraph_config as config
+from utils.deadline import remaining_timeout
 from .weather_client_mcp import fetch_forecast_via_mcp
 
 # 配置详细日志记录器
@@ -56,6 +59,14 @@ def setup_travel_logger():
 # 创建全局日志记录器
 travel_logger = setup_travel_logger()
 
+# 天气工具优先使用 MCP 天气服务，最多等待这么久（秒）；同时会给 DuckDuckGo 兜底搜索留出一次请求的时间
+WEATHER_MCP_TIMEOUT_SECONDS = 20
+
+
+def _ddgs_timeout() -> int:
+    """DuckDuckGo 单次请求的超时（秒）：不超过 DUCKDUCKGO_TIMEOUT，也不超过本次工具调用剩余的时间"""
+    return max(1, math.ceil(remaining_timeout(config.DUCKDUCKGO_TIMEOUT)))
+
 # 直接定义工具函数，不使用类包装
 @tool
 def search_destination_info(query: str) -> str:
@@ -83,7 +94,7 @@ def search_destination_info(query: str) -> str:
         search_query = query + " 旅游目的地指南景点"
         travel_logger.info(f"构建搜索查询: {search_query}")
         
-        with DDGS() as ddgs:
+        with DDGS(timeout=_ddgs_timeout()) as ddgs:
             # 构建搜索查询，添加旅游相关关键词
             results = list(ddgs.text(
                 search_query,  # 中文搜索关键词
@@ -158,7 +169,9 @@ async def search_weather_info(destination: str, dates: str = "") -> str:
 
         travel_logger.info(f"MCP 调用参数 - 位置: {destination}, 天数: {days}")
 
-        forecast = await fetch_forecast_via_mcp(location=destination, days=days)
+        mcp_timeout = remaining_timeout(WEATHER_MCP_TIMEOUT_SECONDS, reserve=config.DUCKDUCKGO_TIMEOUT)
+        forecast = await asyncio.wait_for(fetch_forecast_via_mcp(location=destination, days=days),
+                                          timeout=mcp_timeout)
         if forecast and isinstance(forecast, str) and forecast.strip():
             travel_logger.info(f"MCP 天气服务器调用成功，返回数据长度: {len(forecast)} 字符")
             result = f"{destination}的天气预报（MCP）：\n{forecast}"
@@ -167,6 +180,8 @@ async def search_weather_info(destination: str, dates: str = "") -> str:
         else:
             travel_logger.warning("MCP 返回数据为空，回退到 DuckDuckGo 搜索")
             
+    except asyncio.TimeoutError:
+        travel_logger.warning("MCP 天气服务器调用超时，回退到 DuckDuckGo 搜索")
     except Exception as e:
         travel_logger.warning(f"MCP 天气服务器调用失败: {str(e)}，回退到 DuckDuckGo 搜索")
 
@@ -176,7 +191,7 @@ async def search_weather_info(destination: str, dates: str = "") -> str:
         weather_query = f"{destination} 天气预报 {dates} 旅行气候"
         travel_logger.info(f"DuckDuckGo 搜索查询: {weather_query}")
         
-        with DDGS() as ddgs:
+        with DDGS(timeout=_ddgs_timeout()) as ddgs:
             results = list(ddgs.text(
                 weather_query,
                 max_results=5,
@@ -232,7 +247,7 @@ def search_attractions(destination: str, interests: str = "") -> str:
         attraction_query = f"{destination} 热门景点 活动 {interests} 必游之地"
         travel_logger.info(f"景点搜索查询: {attraction_query}")
         
-        with DDGS() as ddgs:
+        with DDGS(timeout=_ddgs_timeout()) as ddgs:
             results = list(ddgs.text(
                 attraction_query,
                 max_results=8,
@@ -288,7 +303,7 @@ def search_hotels(destination: str, budget: str = "中等预算") -> str:
         hotel_query = f"{destination} 酒店 {budget} 最佳住宿 住宿推荐"
         travel_logger.info(f"酒店搜索查询: {hotel_query}")
         
-        with DDGS() as ddgs:
+        with DDGS(timeout=_ddgs_timeout()) as ddgs:
             results = list(ddgs.text(
                 hotel_query,
                 max_results=6,
@@ -344,7 +359,7 @@ def search_restaurants(destination: str, cuisine: str = "") -> str:
         restaurant_query = f"{destination} 最佳餐厅 {cuisine} 当地美食 用餐推荐"
         travel_logger.info(f"餐厅搜索查询: {restaurant_query}")
         
-        with DDGS() as ddgs:
+        with DDGS(timeout=_ddgs_timeout()) as ddgs:
             results = list(ddgs.text(
                 restaurant_query,
                 max_results=6,
@@ -399,7 +414,7 @@ def search_local_tips(destination: str) -> str:
         tips_query = f"{destination} 当地贴士 旅行指南 文化礼仪 注意事项"
         travel_logger.info(f"当地贴士搜索查询: {tips_query}")
         
-        with DDGS() as ddgs:
+        with DDGS(timeout=_ddgs_timeout()) as ddgs:
             results = list(ddgs.text(
                 tips_query,
                 max_results=5,
@@ -455,7 +470,7 @@ def search_budget_info(destination: str, duration: str = "") -> str:
         budget_query = f"{destination} 旅行预算 费用 日常开销 {duration} 花费"
         travel_logger.info(f"预算信息搜索查询: {budget_query}")
         
-        with DDGS() as ddgs:
+        with DDGS(timeout=_ddgs_timeout()) as ddgs:
             results = list(ddgs.text(
                 budget_query,
                 max_results=5,
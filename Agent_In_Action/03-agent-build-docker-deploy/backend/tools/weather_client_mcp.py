@@ -176,6 +176,9 @@ class MCPServer:
                 
             except Exception as e:
                 logger.error(f"第 {attempt + 1}/{max_retries} 次尝试失败: {str(e)}")
+                # 关闭本次尝试已启动的服务器子进程，重试时重新创建，避免残留子进程
+                await self.cleanup()
+                self.exit_stack = AsyncExitStack()
                 if attempt < max_retries - 1:
                     await asyncio.sleep(retry_delay)
                 else:
@@ -261,7 +264,13 @@ class MCPWeatherClient:
         self.server: Optional[MCPServer] = None
 
     async def __aenter__(self) -> "MCPWeatherClient":
-        await self.connect()
+        try:
+            await self.connect()
+        except BaseException:
+            # __aenter__ 失败或被取消（例如规划任务被取消）时 __aexit__ 不会执行，
+            # 需要在这里关闭已经启动的服务器子进程
+            await self.close()
+            raise
         return self
 
     async def __aexit__(self, exc_type, exc, tb) -> None:
@@ -0,0 +1,82 @@
+"""
+规划任务的截止时间（deadline）
+
+原先的超时是分层各自设定的：线程池 240 秒、asyncio.wait_for 300 秒、天气接口 30 秒，
+而单次模型调用和 DuckDuckGo 搜索没有超时。某一步卡住时，整个任务只能等到外层超时被直接取消，
+已经完成的智能体分析也一并丢弃。
+
+这里改为每个任务创建一个 Deadline，随 TravelPlanState 传给图中的每个节点：
+- 节点调用模型 / 工具时，用"剩余时间"和该类调用自身上限中较小的一个作为超时
+- 协调员发现剩余时间不多时跳过可选的专业智能体，直接完成必需的步骤
+- 工具函数不在图的状态中，通过 use_deadline / remaining_timeout 读取当前调用的剩余时间
+
+这样任务会在截止时间之前给出（可能不完整的）结果，而不是在截止时间到达时被一刀切断。
+
+适用于大模型技术初级用户：
+"截止时间传递"（deadline propagation）是 gRPC 等分布式系统的常用做法：
+与其让每一层各自设置固定超时，不如把"这个请求最晚什么时候必须完成"一路传下去，
+每一层只使用剩下的时间。
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """
+    任务的截止时间点（基于 time.monotonic，不受系统时间调整影响，只在本进程内有效）
+
+    - Deadline.after(seconds): 从现在起 seconds 秒后截止
+    - remaining(): 剩余秒数（已过期时为 0）
+    - sooner(seconds): 截止时间与"从现在起 seconds 秒"中较早的一个，用于给子步骤划分更短的时限
+    - timeout(cap): 某次调用可用的超时时间：不超过 cap，也不超过剩余时间
+    """
+
+    expires_at: float
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def sooner(self, seconds: float) -> "Deadline":
+        return Deadline(min(self.expires_at, time.monotonic() + seconds))
+
+    def timeout(self, cap: Optional[float] = None, reserve: float = 0.0) -> float:
+        """可用的超时时间（秒）：剩余时间减去 reserve（留给后续步骤），且不超过 cap"""
+        budget = max(0.0, self.remaining() - reserve)
+        return budget if cap is None else min(cap, budget)
+
+
+# 当前调用链上的截止时间；asyncio 任务和 LangChain 放入线程池执行的同步工具都会继承它
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("planning_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def use_deadline(deadline: Optional[Deadline]) -> Iterator[None]:
+    """在 with 块内把 deadline 设为当前截止时间（工具函数通过 remaining_timeout 读取）"""
+    token = _current_deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _current_deadline.reset(token)
+
+
+def remaining_timeout(cap: float, reserve: float = 0.0) -> float:
+    """当前截止时间下可用的超时时间；没有设置截止时间（例如直接调用工具）时返回 cap"""
+    deadline = current_deadline()
+    return cap if deadline is None else deadline.timeout(cap, reserve)
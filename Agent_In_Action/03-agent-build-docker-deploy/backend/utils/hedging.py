@@ -0,0 +1,111 @@
+"""
+对冲降级（hedged request）
+
+原先只有 LangGraph 多智能体规划超时（LANGGRAPH_TIMEOUT_SECONDS）或抛出异常后才降级到简化智能体，
+少数特别慢的运行会让用户白白等满整个超时时间。
+
+对冲策略：多智能体规划超过"正常耗时的 p95"仍未完成时，不取消它，而是同时启动简化智能体，
+两者谁先成功就采用谁的结果，另一个随即取消（或丢弃）。这样绝大多数请求仍得到完整的多智能体方案，
+长尾请求的等待时间则被限制在 p95 附近，而不是硬超时。
+
+- LatencyTracker: 记录最近若干次多智能体规划的耗时，按分位数计算对冲等待时间
+- hedged_call: 执行主任务，超过等待时间后启动备选任务并返回先成功的结果
+
+适用于大模型技术初级用户：
+"对冲请求"来自 Google 的《The Tail at Scale》：与其等待最慢的那次调用，不如在它明显偏慢时再发一次请求。
+只在超过 p95 时才对冲，额外的简化智能体调用大约只占 5%。
+"""
+
+import asyncio
+import math
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class LatencyTracker:
+    """
+    最近 window 次运行耗时的滑动窗口
+
+    - record(seconds): 记录一次成功运行的耗时
+    - threshold(): 对冲等待时间——样本不足 min_samples 时使用 default_seconds，
+      否则取第 percentile 百分位耗时，并限制在 [min_seconds, max_seconds] 范围内
+
+    只记录主任务（多智能体规划）自己完成的耗时；被对冲结果取代而取消的运行没有完整耗时，不计入窗口。
+    """
+
+    def __init__(self, window: int = 100, percentile: float = 95, min_samples: int = 20,
+                 default_seconds: float = 120.0, min_seconds: float = 30.0, max_seconds: Optional[float] = None):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.default_seconds = default_seconds
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self._samples: "deque[float]" = deque(maxlen=window)
+        self.hedged = 0      # 启动了备选任务的次数
+        self.hedge_wins = 0  # 采用备选任务结果的次数
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def threshold(self) -> float:
+        if len(self._samples) < self.min_samples:
+            value = self.default_seconds
+        else:
+            # 最近邻分位数：排序后取第 ceil(p% * n) 个样本，窗口不大，每次排序的开销可以忽略
+            ordered = sorted(self._samples)
+            value = ordered[max(0, math.ceil(self.percentile / 100 * len(ordered)) - 1)]
+        value = max(self.min_seconds, value)
+        return min(value, self.max_seconds) if self.max_seconds is not None else value
+
+    def stats(self) -> Dict[str, Any]:
+        """当前对冲阈值与统计，用于健康检查"""
+        return {
+            "threshold_seconds": round(self.threshold(), 1),
+            "samples": len(self._samples),
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins
+        }
+
+
+async def hedged_call(primary: Awaitable[Any], start_hedge: Callable[[], Awaitable[Any]], delay: float,
+                      accept: Callable[[Any], bool] = lambda result: True,
+                      on_hedge: Optional[Callable[[], None]] = None) -> Tuple[Any, bool]:
+    """
+    执行主任务，超过 delay 秒仍未完成时启动备选任务，返回 (结果, 是否采用了备选任务的结果)
+
+    - delay 秒内主任务完成（无论成功还是异常）时直接返回或抛出，与不对冲完全相同
+    - 启动备选任务后，先完成且结果被 accept 认可的一方胜出，另一方被取消；
+      一方失败（异常或结果不被认可）时继续等待另一方
+    - 两者都失败时以主任务的结果为准（返回其结果或抛出其异常），由调用方按原有逻辑降级
+    - 主任务被取消（例如所有等待结果的任务都已取消）时 CancelledError 照常向上传递
+
+    on_hedge 在启动备选任务前调用，可用于更新任务进度提示。
+    """
+    primary_task = asyncio.ensure_future(primary)
+    hedge_task: Optional[asyncio.Future] = None
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            return primary_task.result(), False
+
+        if on_hedge is not None:
+            on_hedge()
+        hedge_task = asyncio.ensure_future(start_hedge())
+        pending = {primary_task, hedge_task}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            # 同时完成时优先采用主任务（多智能体）的结果
+            for task in (primary_task, hedge_task):
+                if task not in done:
+                    continue
+                if task.cancelled():
+                    if task is primary_task:
+                        raise asyncio.CancelledError()
+                    continue
+                if task.exception() is None and accept(task.result()):
+                    return task.result(), task is hedge_task
+        return primary_task.result(), False
+    finally:
+        for task in (primary_task, hedge_task):
+            if task is not None and not task.done():
+                task.cancel()
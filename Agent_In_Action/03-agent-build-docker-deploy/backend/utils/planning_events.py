@@ -0,0 +1,100 @@
+"""
+规划事件的实时推送（SSE / WebSocket 的进程内分发）
+
+原先前端只能轮询 `/status`：规划要几分钟，期间只看到进度条，所有智能体的分析在最后一次性返回。
+多智能体图通过 astream_events 可以逐个拿到节点开始/结束事件和模型生成的每个 token，
+这里把这些事件按运行（run_id）分发给正在订阅的客户端：
+
+- publish(run_id, event): 规划协程发布事件（node_start / node_end / token）
+- subscribe(run_id): 客户端订阅，得到自己的事件队列，以及各智能体"到目前为止已生成的文本"快照，
+  中途连接的客户端先显示快照，再接着接收新的 token
+- close(run_id): 运行结束，通知所有订阅者并释放快照（执行规划的一方在运行结束时必须调用，无论成败）
+
+快照只在运行有订阅者时累积：没有任何客户端订阅的运行（例如 worker 进程中执行的运行，订阅者在 API 进程）
+不在内存中保存已生成的文本，最后一个订阅者离开时快照也随之释放。因此第一个订阅者只能看到订阅之后生成的内容，
+之前的内容以最终结果为准。
+
+每个订阅者的队列有上限（PLANNING_STREAM_QUEUE_SIZE），客户端读取太慢导致队列满时丢弃新事件，
+规划本身永远不会因为推送而变慢；最终结果仍以 `/result` 为准。
+
+适用于大模型技术初级用户：
+流式输出不会让模型算得更快，但用户几秒内就能看到第一段内容，体感等待时间从"几分钟"变成"几秒"。
+事件只在本进程内存中分发：多 worker 部署或 PLANNING_EXECUTION_MODE=worker 时，
+订阅请求可能落到没有执行该运行的进程，此时只能收到从任务仓库读取的状态变化（见 api_server 的流式接口）。
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+class PlanningEventBroker:
+    """
+    按 run_id 分发规划事件（只在事件循环线程中使用，不需要加锁）
+
+    token 事件在发布时同时累加到该运行的快照中（仅当该运行有订阅者时）：每个节点保留最近一次模型调用
+    （message_id）已生成的文本，同一节点开始新的模型调用时（例如搜索后重新回答）快照以新内容替换。
+    """
+
+    def __init__(self, queue_size: int = 1000):
+        self.queue_size = queue_size
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = {}
+        self._partial: Dict[str, Dict[str, Dict[str, Any]]] = {}  # run_id -> 节点 -> 已生成的文本
+        self.dropped = 0  # 因订阅者队列已满被丢弃的事件数
+
+    def publish(self, run_id: str, event: Dict[str, Any]):
+        queues = self._subscribers.get(run_id)
+        if not queues:
+            return
+        if event.get("type") == "token":
+            nodes = self._partial.setdefault(run_id, {})
+            partial = nodes.get(event["node"])
+            if partial is None or partial["message_id"] != event["message_id"]:
+                partial = nodes[event["node"]] = {
+                    "node": event["node"], "agent": event["agent"], "message_id": event["message_id"], "text": ""
+                }
+            partial["text"] += event["text"]
+        for queue in queues:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                self.dropped += 1
+
+    def subscribe(self, run_id: str) -> Tuple[asyncio.Queue, List[Dict[str, Any]]]:
+        """订阅运行的事件，返回 (事件队列, 各节点已生成文本的快照)；队列中的 None 表示运行已结束"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(run_id, set()).add(queue)
+        snapshot = [dict(partial) for partial in self._partial.get(run_id, {}).values()]
+        return queue, snapshot
+
+    def unsubscribe(self, run_id: str, queue: asyncio.Queue):
+        queues = self._subscribers.get(run_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                del self._subscribers[run_id]
+                self._partial.pop(run_id, None)
+
+    def close(self, run_id: str):
+        """运行结束：释放快照，并向每个订阅者发送结束标记 None（队列已满时先丢弃一个旧事件）"""
+        self._partial.pop(run_id, None)
+        for queue in self._subscribers.get(run_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "streaming_runs": len(self._subscribers),
+            "buffered_runs": len(self._partial),
+            "subscribers": sum(len(queues) for queues in self._subscribers.values()),
+            "dropped_events": self.dropped
+        }
+
+
+async def next_event(queue: asyncio.Queue, timeout: float) -> Optional[Dict[str, Any]]:
+    """等待下一个事件，timeout 秒内没有事件或运行已结束时返回 None"""
+    try:
+        return await asyncio.wait_for(queue.get(), timeout=max(0.0, timeout))
+    except asyncio.TimeoutError:
+        return None
@@ -0,0 +1,174 @@
+"""
+规划任务调度器
+
+进程内所有规划任务（/plan、/simple-plan、/chat 自动创建的任务）统一交给一个调度器执行：
+
+1. 固定数量的 worker 协程：同一时刻最多运行 `workers` 个规划任务，突发流量不会无限制地
+   并发调用大模型、触发上游限流
+2. 有界等待队列：排队任务超过 `max_queue` 时拒绝新任务（`PlanningQueueFull`），
+   API 层据此返回 HTTP 429 + `Retry-After`，而不是无限堆积、让所有任务一起变慢
+3. 排队位置查询：`position(task_id)` 返回任务在队列中的位置（从 1 开始），供 `/status` 展示
+
+适用于大模型技术初级用户：
+这就是常说的"准入控制"（admission control）与"背压"（backpressure）——
+系统繁忙时尽早、明确地告诉调用方"稍后再试"，比接收所有请求后全部超时更友好，延迟也更可预期。
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+scheduler_logger = logging.getLogger('api_server')
+
+
+class PlanningQueueFull(Exception):
+    """规划队列已满，`retry_after` 为建议客户端等待的秒数"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"规划队列已满，请 {retry_after} 秒后重试")
+        self.retry_after = retry_after
+
+
+class PlanningScheduler:
+    """
+    有界的异步规划任务调度器
+
+    - submit(task_id, job): 把任务加入队列，返回排队位置；队列已满时抛出 PlanningQueueFull
+    - position(task_id): 任务的排队位置，已开始执行或不在本进程队列中时返回 None
+    - discard(task_id): 从队列中移除尚未开始的任务
+    - cancel(task_id): 取消任务，排队中的移出队列，执行中的取消其协程
+    - stop(): 停止 worker，返回被丢弃的排队任务与被取消的运行中任务
+
+    job 是无参数、返回协程的函数（例如 `lambda: run_planning_task(task_id, request)`），
+    由 worker 协程在事件循环中 await 执行。
+    """
+
+    def __init__(self, workers: int = 4, max_queue: int = 50, estimated_job_seconds: float = 60.0):
+        self.workers = max(1, workers)
+        self.max_queue = max(0, max_queue)
+        # 任务平均耗时（指数移动平均），用于估算 Retry-After；没有历史数据时使用配置的估计值
+        self._avg_job_seconds = estimated_job_seconds
+        self._queue: "OrderedDict[str, Callable[[], Awaitable[Any]]]" = OrderedDict()
+        self._running: Dict[str, asyncio.Task] = {}
+        self._worker_tasks: List[asyncio.Task] = []
+        self._available: Optional[asyncio.Semaphore] = None
+        self._stopping = False
+
+    def start(self):
+        """在当前事件循环中启动 worker 协程（重复调用无副作用）"""
+        if self._worker_tasks:
+            return
+        # 信号量计数 = 队列中可取的任务数；在事件循环内创建，保证绑定到服务运行的循环
+        self._available = asyncio.Semaphore(len(self._queue))
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"planning-worker-{i}")
+            for i in range(self.workers)
+        ]
+        scheduler_logger.info(f"规划调度器已启动：{self.workers} 个 worker，队列上限 {self.max_queue}")
+
+    def submit(self, task_id: str, job: Callable[[], Awaitable[Any]]) -> int:
+        """
+        提交规划任务，返回排队位置（1 表示下一个执行）
+
+        submit 本身不 await，调用方可以在同一段同步代码中提交任务并写入任务记录，
+        worker 不会在任务记录创建之前开始执行它。
+        """
+        self.start()
+        if len(self._queue) >= self.max_queue:
+            raise PlanningQueueFull(self.retry_after())
+        self._queue[task_id] = job
+        self._available.release()
+        return len(self._queue)
+
+    def is_full(self) -> bool:
+        """队列是否已满（用于在执行耗时的预处理之前提前拒绝请求）"""
+        return len(self._queue) >= self.max_queue
+
+    def position(self, task_id: str) -> Optional[int]:
+        """任务在队列中的位置（从 1 开始）；队列长度有上限，线性查找的开销可以忽略"""
+        for index, queued_id in enumerate(self._queue, start=1):
+            if queued_id == task_id:
+                return index
+        return None
+
+    def discard(self, task_id: str) -> bool:
+        """移除尚未开始执行的任务，返回是否移除成功"""
+        return self._queue.pop(task_id, None) is not None
+
+    def cancel(self, task_id: str) -> bool:
+        """
+        取消任务，返回本进程中是否存在该任务
+
+        执行中的任务通过 `asyncio.Task.cancel()` 取消：CancelledError 会在任务当前的 await 处抛出，
+        沿调用链传到正在等待的 LLM HTTP 请求、工具调用与 MCP 子进程，各层的 async with 负责关闭连接与子进程。
+        """
+        if self.discard(task_id):
+            return True
+        running = self._running.get(task_id)
+        if running is None:
+            return False
+        running.cancel()
+        return True
+
+    def task_ids(self) -> List[str]:
+        """本进程中执行中与排队中的任务 ID"""
+        return list(self._running) + list(self._queue)
+
+    def retry_after(self) -> int:
+        """估算队列腾出一个空位所需的秒数：所有 worker 都忙时，平均每 (平均耗时 / worker 数) 秒完成一个任务"""
+        return max(1, math.ceil(self._avg_job_seconds / self.workers))
+
+    def stats(self) -> Dict[str, Any]:
+        """调度器当前状态，用于健康检查"""
+        return {
+            "workers": self.workers,
+            "running": len(self._running),
+            "queued": len(self._queue),
+            "max_queue": self.max_queue,
+            "avg_task_seconds": round(self._avg_job_seconds, 1)
+        }
+
+    async def _worker(self):
+        while True:
+            await self._available.acquire()
+            if not self._queue:
+                # 任务在排队期间被 discard，信号量计数多于队列长度，跳过即可
+                continue
+            task_id, job = self._queue.popitem(last=False)
+            started = time.monotonic()
+            running = asyncio.create_task(job(), name=f"planning-{task_id}")
+            self._running[task_id] = running
+            try:
+                await running
+            except asyncio.CancelledError:
+                # worker 被取消时 asyncio 会连带取消它正在 await 的任务，running.cancelled() 同样为 True，
+                # 因此用 _stopping 区分"服务关闭"与"单个任务被 cancel(task_id) 取消"
+                if self._stopping or not running.cancelled():
+                    # worker 自身被取消（服务关闭），同时取消正在执行的任务
+                    running.cancel()
+                    raise
+                scheduler_logger.info(f"规划任务 {task_id} 已取消")
+            except Exception as e:
+                scheduler_logger.error(f"规划任务 {task_id} 执行异常: {e}")
+            finally:
+                self._running.pop(task_id, None)
+            if not running.cancelled():
+                # 被取消的任务耗时不代表正常执行时间，不计入平均值
+                self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * (time.monotonic() - started)
+
+    async def stop(self) -> List[str]:
+        """停止所有 worker，返回未能完成的任务 ID（排队中被丢弃的与运行中被取消的）"""
+        unfinished = list(self._running) + list(self._queue)
+        self._queue.clear()
+        self._stopping = True
+        try:
+            for worker in self._worker_tasks:
+                worker.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        finally:
+            self._stopping = False
+        self._worker_tasks = []
+        return unfinished
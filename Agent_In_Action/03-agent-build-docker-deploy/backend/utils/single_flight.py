@@ -0,0 +1,103 @@
+"""
+相同规划请求的合并执行（single-flight）
+
+用户经常重复提交完全相同的旅行需求（表单连点、刷新后重新提交、/chat 再说一遍），
+每次都完整运行一遍多智能体图既浪费大模型调用，也会占满规划队列。
+
+这个模块按请求指纹把进行中的相同请求归到同一次"运行"（run）：
+- 第一个请求的任务 ID 作为 run_id，真正提交给调度器执行
+- 之后的相同请求各自得到新的任务 ID，但只加入这次运行，不再重复执行
+- 运行期间的进度和最终结果同步写入所有成员任务；某个成员被取消只会让它退出，
+  所有成员都退出后运行本身才会被取消
+
+适用于大模型技术初级用户：
+single-flight 是缓存系统里常见的"请求合并"技巧——同一时刻对同一份数据的多次请求只真正计算一次。
+它只合并"正在进行"的请求，运行结束后相同的新请求会重新规划。
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def request_fingerprint(request: Dict[str, Any]) -> str:
+    """
+    计算规划请求的指纹
+
+    对字段做简单规范化（去掉首尾空白、兴趣列表排序）后按键排序序列化，取 SHA-256；
+    只要影响规划结果的字段相同，指纹就相同。
+    """
+    normalized = dict(request)
+    if isinstance(normalized.get("destination"), str):
+        normalized["destination"] = normalized["destination"].strip()
+    if isinstance(normalized.get("interests"), list):
+        normalized["interests"] = sorted(normalized["interests"])
+    payload = json.dumps(normalized, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlightGroup:
+    """
+    进程内进行中运行的登记表（只在事件循环线程中使用，不需要加锁）
+
+    - open(fingerprint, run_id): 登记一次新的运行，run_id 同时是第一个成员的任务 ID
+    - attach(fingerprint, task_id): 相同指纹的运行正在进行时加入它，返回 run_id；否则返回 None
+    - members(run_id): 运行当前的成员任务 ID（未登记的运行视为只有自己一个成员）
+    - detach(task_id): 成员退出，返回 (run_id, 剩余成员数)
+    - seal(run_id): 运行即将写入最终状态，不再接受相同请求加入（成员保持不变）
+    - close(run_id): 运行结束，之后相同的请求会重新规划
+    """
+
+    def __init__(self):
+        self._run_by_fingerprint: Dict[str, str] = {}
+        self._fingerprint_by_run: Dict[str, str] = {}
+        self._members: Dict[str, List[str]] = {}
+        self._run_of: Dict[str, str] = {}
+
+    def open(self, fingerprint: str, run_id: str):
+        self._run_by_fingerprint[fingerprint] = run_id
+        self._fingerprint_by_run[run_id] = fingerprint
+        self._members[run_id] = [run_id]
+        self._run_of[run_id] = run_id
+
+    def attach(self, fingerprint: str, task_id: str) -> Optional[str]:
+        run_id = self._run_by_fingerprint.get(fingerprint)
+        if run_id is None:
+            return None
+        self._members[run_id].append(task_id)
+        self._run_of[task_id] = run_id
+        return run_id
+
+    def run_of(self, task_id: str) -> str:
+        """任务所属运行的 run_id；不属于任何合并运行时就是任务自己"""
+        return self._run_of.get(task_id, task_id)
+
+    def members(self, run_id: str) -> List[str]:
+        return list(self._members.get(run_id, [run_id]))
+
+    def detach(self, task_id: str) -> Tuple[str, int]:
+        run_id = self._run_of.pop(task_id, task_id)
+        members = self._members.get(run_id)
+        if members is None:
+            return run_id, 0
+        if task_id in members:
+            members.remove(task_id)
+        return run_id, len(members)
+
+    def seal(self, run_id: str):
+        fingerprint = self._fingerprint_by_run.pop(run_id, None)
+        if fingerprint is not None and self._run_by_fingerprint.get(fingerprint) == run_id:
+            del self._run_by_fingerprint[fingerprint]
+
+    def close(self, run_id: str):
+        self.seal(run_id)
+        for task_id in self._members.pop(run_id, []):
+            self._run_of.pop(task_id, None)
+        self._run_of.pop(run_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        """当前合并中的运行数与搭便车的重复任务数，用于健康检查"""
+        return {
+            "runs": len(self._members),
+            "followers": sum(max(len(members) - 1, 0) for members in self._members.values())
+        }
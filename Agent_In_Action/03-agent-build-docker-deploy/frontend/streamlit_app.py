@@ -443,13 +443,38 @@ def check_api_health():
     except Exception as e:
         return False, {"error": f"连接错误: {str(e)}"}
 
+def cancel_planning_task(task_id: str):
+    """取消后端仍在排队或执行的规划任务（任务已结束或请求失败时忽略）"""
+    try:
+        requests.delete(f"{API_BASE_URL}/tasks/{task_id}", timeout=10)
+    except requests.exceptions.RequestException:
+        pass
+
+def replace_active_task(task_id: Optional[str]):
+    """
+    记录当前正在跟踪的规划任务
+
+    用户重复提交时，上一个尚未结束的任务会被取消，避免两个相同的规划同时占用后端名额。
+    """
+    previous = st.session_state.get("active_task_id")
+    if previous and previous != task_id:
+        cancel_planning_task(previous)
+    st.session_state.active_task_id = task_id
+
 def create_travel_plan(travel_data: Dict[str, Any]) -> Optional[str]:
     """创建旅行规划任务"""
     try:
         # 增加超时时间到60秒
         response = requests.post(f"{API_BASE_URL}/plan", json=travel_data, timeout=60)
         if response.status_code == 200:
-            return response.json()["task_id"]
+            task_id = response.json()["task_id"]
+            replace_active_task(task_id)
+            return task_id
+        elif response.status_code == 429:
+            # 后端规划队列已满，按 Retry-After 提示用户稍后重试
+            retry_after = response.headers.get("Retry-After", "几十")
+            st.warning(f"⏳ 当前规划任务较多，请约 {retry_after} 秒后重试")
+            return None
         else:
             st.error(f"创建任务失败: {response.text}")
             return None
@@ -712,7 +737,7 @@ def display_planning_progress(task_id: str):
             # 检查是否完成
             if current_status == "completed":
                 st.success("🎉 旅行规划完成！")
-                return status.get("result")
+                return get_planning_result(task_id)
             elif current_status == "failed":
                 st.error(f"❌ 规划失败: {message}")
                 return None
@@ -764,7 +789,7 @@ def display_planning_progress(task_id: str):
             if final_status:
                 if final_status.get("status") == "completed":
                     st.success("🎉 任务已完成！")
-                    return final_status.get("result")
+                    return get_planning_result(task_id)
                 else:
                     st.info(f"任务状态: {final_status.get('status')} - {final_status.get('message')}")
             else:
@@ -872,14 +897,33 @@ def generate_markdown_report(result: Dict[str, Any], task_id: str) -> str:
 
 
 def get_planning_status(task_id: str) -> Optional[Dict[str, Any]]:
-    """获取规划状态"""
+    """
+    获取规划状态
+
+    使用条件请求减少轮询开销：把上次拿到的状态和 ETag 保存在 session_state 中，
+    带上 `If-None-Match` 与 `?since=<version>` 请求，状态未变化时后端返回 304，
+    有变化时只返回变化的字段，合并到上次的状态上。
+    """
+    status_cache = st.session_state.setdefault("status_cache", {})
+    cached = status_cache.get(task_id)
     max_retries = 2  # 减少重试次数，避免过长等待
     for retry in range(max_retries):
         try:
+            headers, params = {}, {}
+            if cached:
+                headers["If-None-Match"] = cached["etag"]
+                params["since"] = cached["status"].get("version", 0)
             # 增加超时时间到30秒
-            response = requests.get(f"{API_BASE_URL}/status/{task_id}", timeout=30)
+            response = requests.get(f"{API_BASE_URL}/status/{task_id}", params=params, headers=headers, timeout=30)
+            if response.status_code == 304 and cached:
+                return dict(cached["status"])
             if response.status_code == 200:
-                return response.json()
+                data = response.json()
+                status = {**cached["status"], **data} if cached and data.get("delta") else data
+                status.pop("delta", None)
+                if response.headers.get("ETag"):
+                    status_cache[task_id] = {"etag": response.headers["ETag"], "status": status}
+                return dict(status)
             elif response.status_code == 404:
                 st.warning(f"任务 {task_id} 不存在")
                 return None
@@ -910,15 +954,25 @@ def get_planning_status(task_id: str) -> Optional[Dict[str, Any]]:
     return None
 
 def get_planning_result(task_id: str) -> Optional[Dict[str, Any]]:
-    """获取规划结果 - 从状态查询中获取结果"""
+    """
+    获取规划结果 - 调用 /result 接口
+
+    结果按 ETag 缓存在 session_state 中，页面重新运行时带上 `If-None-Match`，
+    结果未变化时后端返回 304，不必重复下载整个结果。
+    """
+    result_cache = st.session_state.setdefault("result_cache", {})
+    cached = result_cache.get(task_id)
     try:
-        # 从状态查询中获取结果
-        status_info = get_planning_status(task_id)
-        if status_info and status_info.get("result"):
-            return status_info["result"]
-        else:
-            st.warning("结果尚未准备好或任务未完成")
-            return None
+        headers = {"If-None-Match": cached["etag"]} if cached and cached.get("etag") else {}
+        response = requests.get(f"{API_BASE_URL}/result/{task_id}", headers=headers, timeout=30)
+        if response.status_code == 304 and cached:
+            return cached["result"]
+        if response.status_code == 200:
+            result = response.json().get("result")
+            result_cache[task_id] = {"etag": response.headers.get("ETag"), "result": result}
+            return result
+        st.warning("结果尚未准备好或任务未完成")
+        return None
     except Exception as e:
         st.error(f"获取结果失败: {str(e)}")
         return None
@@ -1025,6 +1079,7 @@ def display_chat_interface():
                     # 如果可以直接创建任务
                     if chat_response["can_proceed"] and chat_response.get("task_id"):
                         task_id = chat_response["task_id"]
+                        replace_active_task(task_id)
                         st.success(f"✅ 任务已创建！任务ID: {task_id}")
                         
                         # 保存任务ID到session state
@@ -1043,6 +1098,9 @@ def display_chat_interface():
                         with st.expander("❓ 还需要补充的信息"):
                             for item in chat_response["missing_info"]:
                                 st.write(f"- {item}")
+                elif response.status_code == 429:
+                    retry_after = response.headers.get("Retry-After", "几十")
+                    st.warning(f"⏳ 当前规划任务较多，请约 {retry_after} 秒后重试")
                 else:
                     st.error(f"请求失败: {response.status_code}")
                     
@@ -1566,7 +1624,10 @@ def main():
                     progress_placeholder.progress(progress / 100, text=f"进度: {progress}%")
 
                     # 更新状态信息
-                    if current_agent:
+                    queue_position = status_info.get("queue_position")
+                    if queue_position:
+                        status_placeholder.info(f"⏳ 排队中，前面还有 {queue_position - 1} 个任务")
+                    elif current_agent:
                         status_placeholder.info(f"🤖 当前智能体: {current_agent} | {message}")
                     else:
                         status_placeholder.info(f"📋 状态: {message}")
@@ -1576,12 +1637,16 @@ def main():
                         last_progress = progress
                         attempt = 0  # 重置计数器
 
+                    if status in ("completed", "failed", "cancelled") and st.session_state.get("active_task_id") == task_id:
+                        # 任务已结束，不再需要在重复提交时取消它
+                        st.session_state.active_task_id = None
+
                     if status == "completed":
                         progress_placeholder.progress(1.0, text="进度: 100% - 完成!")
                         status_placeholder.success("🎉 规划完成！")
 
-                        # 从状态信息中直接获取结果
-                        result = status_info.get("result")
+                        # 状态接口只返回进度，完整结果单独从 /result 获取
+                        result = get_planning_result(task_id)
                         if result:
                             # 显示结果
                             display_planning_result(result)
@@ -1636,7 +1701,12 @@ def main():
                         st.error("规划过程中出现错误，请重新尝试")
                         break
 
-                    elif status in ["processing", "running", "pending"]:
+                    elif status == "cancelled":
+                        progress_placeholder.empty()
+                        status_placeholder.warning(f"🛑 {message}")
+                        break
+
+                    elif status in ["queued", "processing", "running", "pending"]:
                         # 继续等待
                         time.sleep(5)
                         attempt += 1